@@ -0,0 +1,234 @@
+"""Bounded pool of database connections shared by the threads of a process.
+
+Django opens one connection per thread and, with ``CONN_MAX_AGE = 0``, closes
+it at the end of every request. The pooled backend
+(``apps.common.db.postgresql_pool``) hands those connections back here
+instead, so the next request skips the connection setup.
+
+A pool keeps up to ``size`` idle connections and opens up to ``max_overflow``
+more under bursts; overflow connections are closed when released. Past that,
+``acquire`` waits up to ``timeout`` seconds for a release. Connections older
+than ``recycle`` seconds are replaced, and with ``health_check`` a connection
+idle for more than ``ping_after`` seconds is pinged before being reused.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+from apps.common.metrics import registry
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+        self, *, ping=None, close=None, size=10, max_overflow=5, timeout=10.0, recycle=1800,
+        health_check=True, ping_after=30.0, alias='default', database=None,
+    ):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check = health_check and ping is not None
+        self.ping_after = ping_after
+        self.alias = alias
+        self.database = database
+        self._ping = ping
+        self._close = close or (lambda conn: conn.close())
+        self._cond = threading.Condition()
+        # (connection, opened_at, released_at), most recently released last
+        self._idle = deque()
+        self._opened_at = {}
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._counters = dict.fromkeys(
+            ('checkouts', 'waits', 'timeouts', 'connects', 'discarded', 'health_check_failures'), 0
+        )
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self, connect):
+        """A connection from the pool, or a new one made by ``connect()``."""
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, opened_at, released_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    conn = None
+                    break
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"Aucune connexion libre dans le pool '{self.alias}' après {self.timeout} s "
+                        f"({self._open} ouvertes)."
+                    )
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            self._counters['checkouts'] += 1
+            if waited:
+                elapsed = time.monotonic() - start
+                self._counters['waits'] += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+
+        if conn is not None and not self._reusable(conn, opened_at, released_at):
+            self._discard(conn)
+            conn = None
+        if conn is None:
+            try:
+                conn = connect()
+            except BaseException:
+                with self._cond:
+                    self._open -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opened_at[id(conn)] = time.monotonic()
+                self._counters['connects'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Give back a connection; ``discard`` closes it (broken or mid-transaction)."""
+        with self._cond:
+            self._in_use -= 1
+            opened_at = self._opened_at.get(id(conn), 0.0)
+            keep = (
+                not discard and self._open <= self.size
+                and (not self.recycle or time.monotonic() - opened_at < self.recycle)
+            )
+            if keep:
+                self._idle.append((conn, opened_at, time.monotonic()))
+            else:
+                self._open -= 1
+                self._opened_at.pop(id(conn), None)
+                self._counters['discarded'] += 1
+            self._cond.notify()
+        if not keep:
+            self._safe_close(conn)
+
+    def close_idle(self):
+        """Close every idle connection (e.g. before dropping the database)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            for conn, _, _ in idle:
+                self._opened_at.pop(id(conn), None)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._safe_close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'alias': self.alias,
+                'database': self.database,
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                **self._counters,
+                'wait_time_total_ms': round(self._wait_total * 1000, 2),
+                'wait_time_max_ms': round(self._wait_max * 1000, 2),
+            }
+
+    def _reusable(self, conn, opened_at, released_at):
+        now = time.monotonic()
+        if self.recycle and now - opened_at >= self.recycle:
+            return False
+        if self.health_check and now - released_at >= self.ping_after:
+            try:
+                self._ping(conn)
+            except Exception:
+                with self._cond:
+                    self._counters['health_check_failures'] += 1
+                return False
+        return True
+
+    def _discard(self, conn):
+        # The slot stays reserved: acquire() opens a replacement in it
+        with self._cond:
+            self._opened_at.pop(id(conn), None)
+            self._counters['discarded'] += 1
+        self._safe_close(conn)
+
+    def _safe_close(self, conn):
+        try:
+            self._close(conn)
+        except Exception:
+            pass
+
+
+# (alias, database, user, host, port) -> pool, for the current process only
+_pools = {}
+_pid = None
+_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """The process's pool for ``key``, created by ``factory()`` on first use."""
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            # Forked worker: the parent's sockets are not ours to reuse or close
+            _pools.clear()
+            _pid = os.getpid()
+        if key not in _pools:
+            _pools[key] = factory()
+        return _pools[key]
+
+
+def close_pools(alias):
+    with _lock:
+        pools = [pool for key, pool in _pools.items() if key[0] == alias]
+    for pool in pools:
+        pool.close_idle()
+
+
+def stats():
+    with _lock:
+        pools = list(_pools.values()) if _pid == os.getpid() else []
+    return [pool.stats() for pool in pools]
+
+
+# (metric, kind, stats key, help), exported for every pool of the process
+POOL_METRICS = (
+    ('db_pool_connections_open', 'gauge', 'open', 'Connections opened by the pool.'),
+    ('db_pool_connections_in_use', 'gauge', 'in_use', 'Connections checked out.'),
+    ('db_pool_connections_idle', 'gauge', 'idle', 'Connections waiting in the pool.'),
+    ('db_pool_waiting', 'gauge', 'waiting', 'Threads waiting for a connection.'),
+    ('db_pool_checkouts_total', 'counter', 'checkouts', 'Connections handed out.'),
+    ('db_pool_waits_total', 'counter', 'waits', 'Checkouts that had to wait.'),
+    ('db_pool_timeouts_total', 'counter', 'timeouts', 'Checkouts that gave up waiting.'),
+    ('db_pool_discarded_total', 'counter', 'discarded', 'Connections closed as broken, aged or overflow.'),
+    ('db_pool_wait_time_ms_total', 'counter', 'wait_time_total_ms', 'Milliseconds spent waiting for a connection.'),
+)
+
+
+@registry.collector
+def _pool_samples():
+    pools = stats()
+    if not pools:
+        return []
+    return [
+        (name, kind, help_text, [({'alias': pool['alias'], 'database': pool['database']}, pool[key]) for pool in pools])
+        for name, kind, key, help_text in POOL_METRICS
+    ]
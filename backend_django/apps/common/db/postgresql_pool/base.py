@@ -0,0 +1,66 @@
+"""PostgreSQL backend whose connections come from a per-process pool.
+
+Set ``ENGINE`` to ``'apps.common.db.postgresql_pool'``, keep ``CONN_MAX_AGE``
+at 0 so each request hands its connection back, and tune the pool with the
+database's ``POOL`` dict (see ``apps.common.db.pool.ConnectionPool``).
+"""
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from apps.common.db import pool
+
+
+def _ping(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not conn.autocommit:
+        conn.rollback()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # CREATE/DROP DATABASE fail while pooled connections are still attached
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        pool.close_pools(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        pool.close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def _pool_key(self):
+        # The test runner renames NAME: connections to the real database must not be handed out
+        settings_dict = self.settings_dict
+        return (self.alias, settings_dict['NAME'], settings_dict['USER'], settings_dict['HOST'], settings_dict['PORT'])
+
+    def _pool(self):
+        return pool.get_pool(self._pool_key(), lambda: pool.ConnectionPool(
+            ping=_ping, alias=self.alias, database=self.settings_dict['NAME'], **self.settings_dict.get('POOL', {}),
+        ))
+
+    def get_new_connection(self, conn_params):
+        connection = self._pool().acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Set by the parent on a fresh connection; a pooled one kept the configured level
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self._pool().release(self.connection, discard=not self._reset(self.connection))
+
+    def _reset(self, connection):
+        """Roll back what the connection left open; False when it can't be reused."""
+        if connection.closed:
+            return False
+        if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except self.Database.Error:
+                return False
+        return connection.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
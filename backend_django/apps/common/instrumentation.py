@@ -0,0 +1,194 @@
+"""Per-request SQL and timing instrumentation.
+
+``RequestInstrumentationMiddleware`` opens a ``RequestMetrics`` for each
+request in a context variable. Every database connection carries an execute
+wrapper (installed on ``connection_created``) that adds its queries to the
+current request, including queries run on the fan-out threads. Rendering
+time comes from ``TimedJSONRenderer`` and ``serialization()``.
+
+At the end of the request the middleware:
+
+- sets a ``Server-Timing`` header (db, serialize, app, total);
+- feeds the per-route histograms exported by ``apps.common.metrics``;
+- logs slow requests, and SQL statements repeated at least
+  ``DUPLICATE_QUERY_THRESHOLD`` times (N+1 signatures) with the project
+  code that issued them.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+LABELS = ('method', 'route')
+REQUESTS = registry.counter('http_requests_total', 'HTTP requests handled.', (*LABELS, 'status'))
+DURATION = registry.histogram('http_request_duration_seconds', 'Time to produce the response.', LABELS)
+SQL_DURATION = registry.histogram('http_request_db_duration_seconds', 'Time spent in SQL queries.', LABELS)
+SERIALIZATION_DURATION = registry.histogram(
+    'http_request_serialization_duration_seconds', 'Time spent rendering the response body.', LABELS
+)
+QUERIES = registry.histogram('http_request_db_queries', 'SQL queries per request.', LABELS, buckets=COUNT_BUCKETS)
+DUPLICATES = registry.counter(
+    'http_request_duplicate_queries_total', 'SQL statements repeated past the N+1 threshold.', LABELS
+)
+
+
+def _duplicate_threshold():
+    return getattr(settings, 'DUPLICATE_QUERY_THRESHOLD', 10)
+
+
+def _origin():
+    """The innermost project frames (outside site-packages) running the query."""
+    root = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(root) and 'site-packages' not in frame.filename and frame.filename != __file__
+    ]
+    return ' <- '.join(
+        f'{os.path.relpath(frame.filename, root)}:{frame.lineno} in {frame.name}' for frame in reversed(frames[-3:])
+    ) or 'inconnue'
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialization_time = 0.0
+        # SQL text (parameters apart) -> executions, and where the repetition was spotted
+        self.statements = {}
+        self.origins = {}
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, elapsed):
+        with self._lock:
+            self.queries += 1
+            self.sql_time += elapsed
+            count = self.statements[sql] = self.statements.get(sql, 0) + 1
+        if count == _duplicate_threshold():
+            self.origins[sql] = _origin()
+
+    def duplicates(self):
+        threshold = _duplicate_threshold()
+        return [(sql, count) for sql, count in self.statements.items() if count >= threshold]
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serialization():
+    """Count the enclosed block as serialization time of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.serialization_time += time.perf_counter() - start
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class RequestInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    def _finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.start
+        app = max(total - metrics.sql_time - metrics.serialization_time, 0.0)
+        response['Server-Timing'] = (
+            f'db;dur={_ms(metrics.sql_time)};desc="{metrics.queries} queries", '
+            f'serialize;dur={_ms(metrics.serialization_time)}, app;dur={_ms(app)}, total;dur={_ms(total)}'
+        )
+
+        labels = (request.method, _route(request))
+        REQUESTS.inc((*labels, str(response.status_code)))
+        DURATION.observe(labels, total)
+        SQL_DURATION.observe(labels, metrics.sql_time)
+        SERIALIZATION_DURATION.observe(labels, metrics.serialization_time)
+        QUERIES.observe(labels, metrics.queries)
+
+        if _ms(total) >= getattr(settings, 'SLOW_REQUEST_MS', 500):
+            logger.warning(
+                "Requête lente %s %s (%s): %.1f ms dont SQL %.1f ms (%d requêtes), sérialisation %.1f ms",
+                request.method, request.get_full_path(), labels[1], _ms(total), _ms(metrics.sql_time),
+                metrics.queries, _ms(metrics.serialization_time),
+            )
+        for sql, count in metrics.duplicates():
+            DUPLICATES.inc(labels)
+            logger.warning(
+                "Requête SQL répétée %d fois pendant %s %s, depuis %s: %s",
+                count, request.method, request.get_full_path(), metrics.origins.get(sql, 'inconnue'), sql[:500],
+            )
+        return response
@@ -1,5 +1,6 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
 
@@ -19,8 +20,20 @@ class TimeStampedModel(models.Model):
 
 
 class SoftDeleteQuerySet(models.QuerySet):
+    """Set-based soft delete.
+
+    ``delete()`` and ``restore()`` cascade along the model's
+    ``soft_delete_cascade`` relations with one UPDATE per table and level.
+    A cascade stamps every row with the same ``deleted_at``, and a restore
+    only brings back descendants carrying their parent's stamp, so rows that
+    were deleted on their own earlier stay deleted.
+    """
+
     def delete(self):
-        return super().update(is_deleted=True, deleted_at=timezone.now())
+        stamp = timezone.now()
+        with transaction.atomic(using=self.db):
+            self.soft_delete_children(stamp)
+            return self.filter(is_deleted=False).update(is_deleted=True, deleted_at=stamp)
 
     def hard_delete(self):
         return super().delete()
@@ -32,7 +45,31 @@ class SoftDeleteQuerySet(models.QuerySet):
         return self.filter(is_deleted=True)
 
     def restore(self):
-        return self.update(is_deleted=False, deleted_at=None)
+        with transaction.atomic(using=self.db):
+            self.restore_children()
+            return self.filter(is_deleted=True).update(is_deleted=False, deleted_at=None)
+
+    def _child_querysets(self):
+        for name in self.model.soft_delete_cascade:
+            relation = self.model._meta.get_field(name)
+            yield relation.related_model.all_objects, relation.field
+
+    def soft_delete_children(self, stamp):
+        # Children first: their filter reads the parents, which must still be alive
+        parents = self.filter(is_deleted=False).values('pk')
+        for children, field in self._child_querysets():
+            alive = children.filter(is_deleted=False, **{f'{field.name}__in': parents})
+            alive.soft_delete_children(stamp)
+            alive.update(is_deleted=True, deleted_at=stamp)
+
+    def restore_children(self):
+        for children, field in self._child_querysets():
+            cascaded = children.filter(
+                Exists(self.filter(is_deleted=True, pk=OuterRef(field.attname), deleted_at=OuterRef('deleted_at'))),
+                is_deleted=True,
+            )
+            cascaded.restore_children()
+            cascaded.update(is_deleted=False, deleted_at=None)
 
 
 class SoftDeleteManager(models.Manager):
@@ -55,6 +92,9 @@ class SoftDeleteModel(models.Model):
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    # Reverse relations (accessor names) soft-deleted and restored with the row
+    soft_delete_cascade = ()
+
     objects = SoftDeleteManager()
     all_objects = SoftDeleteManager(alive_only=False)
 
@@ -62,17 +102,23 @@ class SoftDeleteModel(models.Model):
         abstract = True
 
     def delete(self, using=None, keep_parents=False):
-        self.is_deleted = True
-        self.deleted_at = timezone.now()
-        self.save(using=using)
+        # The row itself goes through save() so its signals still fire
+        stamp = timezone.now()
+        with transaction.atomic(using=using):
+            type(self).all_objects.using(using).filter(pk=self.pk).soft_delete_children(stamp)
+            self.is_deleted = True
+            self.deleted_at = stamp
+            self.save(using=using)
 
     def hard_delete(self, using=None, keep_parents=False):
         return super().delete(using=using, keep_parents=keep_parents)
 
     def restore(self, using=None):
-        self.is_deleted = False
-        self.deleted_at = None
-        self.save(using=using)
+        with transaction.atomic(using=using):
+            type(self).all_objects.using(using).filter(pk=self.pk).restore_children()
+            self.is_deleted = False
+            self.deleted_at = None
+            self.save(using=using)
 
 
 class BaseModel(UUIDModel, TimeStampedModel, SoftDeleteModel):
@@ -0,0 +1,191 @@
+"""Vectorised lot performance analytics.
+
+Daily records of a set of lots are loaded once as column arrays sorted by lot
+then date, and every per-lot figure is computed with NumPy segment operations
+(``reduceat`` and offset ``cumsum``) instead of a Python loop per lot.
+
+Headcount on a day is the lot's initial count minus the mortality recorded on
+earlier days. A weight of 0 means "not weighed" and is ignored for growth.
+"""
+import numpy as np
+from django.db import connections
+from django.db.models import FloatField, Func, IntegerField
+from django.db.models.functions import Cast
+
+from . import fanout
+from .models import Lot, LotDailyRecord
+
+CHUNK_SIZE = 20000
+
+
+class EpochDay(Func):
+    """Days since 1970-01-01, so dates reach NumPy as integers instead of parsed objects."""
+
+    template = "(%(expressions)s - DATE '1970-01-01')"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)', **extra_context
+        )
+
+
+def load(lot_ids):
+    """Column arrays for the alive records of ``lot_ids`` (ids or a values('pk') queryset).
+
+    The compiled query is run on a raw cursor: per-row field converters (UUID,
+    date, Decimal) cost more than all the NumPy work, so measures are cast to
+    floats and dates to day numbers in SQL, and lot ids are only converted at
+    segment boundaries.
+    """
+    queryset = (
+        LotDailyRecord.objects.filter(lot_id__in=lot_ids)
+        .annotate(
+            day=EpochDay('date'),
+            feed=Cast('feed_intake_kg', FloatField()),
+            milk=Cast('milk_production_l', FloatField()),
+            weight=Cast('avg_weight_kg', FloatField()),
+        )
+        .order_by('lot_id', 'date')
+        .values_list('lot_id', 'day', 'mortality', 'eggs_count', 'feed', 'milk', 'weight')
+    )
+    sql, params = queryset.query.sql_with_params()
+    chunks = []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        # SQL puts annotations after model fields; map the columns by name
+        names = [column[0] for column in cursor.description]
+        # Convert chunk by chunk so row tuples never pile up (they make the GC crawl)
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            chunks.append([np.array(values) for values in zip(*rows)])
+    if not chunks:
+        return None
+    columns = {name: np.concatenate(arrays) for name, arrays in zip(names, zip(*chunks))}
+    return {
+        'lot': columns['lot_id'],
+        'date': columns['day'].astype(np.int64).astype('datetime64[D]'),
+        'mortality': columns['mortality'].astype(np.float64),
+        'eggs': columns['eggs_count'].astype(np.float64),
+        'feed': columns['feed'].astype(np.float64),
+        'milk': columns['milk'].astype(np.float64),
+        'weight': columns['weight'].astype(np.float64),
+    }
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def _edges(segment, mask, segment_count):
+    """Index of the first and last row of each segment where ``mask`` holds (-1 when none)."""
+    rows = np.flatnonzero(mask)
+    first = np.full(segment_count, -1)
+    last = np.full(segment_count, -1)
+    if rows.size:
+        found, first_pos = np.unique(segment[rows], return_index=True)
+        first[found] = rows[first_pos]
+        found, last_pos = np.unique(segment[rows][::-1], return_index=True)
+        last[found] = rows[rows.size - 1 - last_pos]
+    return first, last
+
+
+def compute(columns, initial_counts, curves=False):
+    """Per-lot metrics keyed by lot id.
+
+    ``initial_counts`` maps lot id to its initial headcount. With ``curves`` each
+    lot also gets its cumulative mortality rate per recorded day.
+    """
+    if columns is None:
+        return {}
+    size = columns['lot'].size
+    starts = np.flatnonzero(np.r_[True, columns['lot'][1:] != columns['lot'][:-1]])
+    lengths = np.diff(np.r_[starts, size])
+    segment = np.repeat(np.arange(starts.size), lengths)
+    lot_ids = [Lot._meta.pk.to_python(value) for value in columns['lot'][starts].tolist()]
+    initial = np.array([initial_counts.get(lot_id, 0) for lot_id in lot_ids], dtype=np.float64)
+
+    def per_lot(values):
+        return np.add.reduceat(values, starts)
+
+    def running(values):
+        total = np.cumsum(values)
+        return total - (total[starts] - values[starts])[segment]
+
+    dead_to_date = running(columns['mortality'])
+    head_start = np.maximum(initial[segment] - (dead_to_date - columns['mortality']), 0)
+    head_end = np.maximum(initial[segment] - dead_to_date, 0)
+    head_days = per_lot(head_start)
+    mortality = per_lot(columns['mortality'])
+
+    weight = columns['weight']
+    first, last = _edges(segment, weight > 0, starts.size)
+    weighed = (first >= 0) & (last > first)
+    first_w, last_w = np.where(weighed, first, 0), np.where(weighed, last, 0)
+    weigh_days = (columns['date'][last_w] - columns['date'][first_w]).astype(np.int64)
+    adg = np.where(weighed, _ratio(weight[last_w] - weight[first_w], weigh_days), np.nan)
+    feed_to_date = running(columns['feed'])
+    biomass_gain = weight[last_w] * head_end[last_w] - weight[first_w] * head_end[first_w]
+    fcr = np.where(weighed, _ratio(feed_to_date[last_w] - feed_to_date[first_w], biomass_gain), np.nan)
+
+    metrics = {
+        'record_days': lengths,
+        'first_date': columns['date'][starts],
+        'last_date': columns['date'][starts + lengths - 1],
+        'mortality': mortality,
+        'mortality_rate_percent': _ratio(mortality * 100, initial),
+        'current_headcount': head_end[starts + lengths - 1],
+        'feed_intake_kg': per_lot(columns['feed']),
+        'adg_kg': adg,
+        'fcr': fcr,
+        'laying_rate_percent': _ratio(per_lot(columns['eggs']) * 100, head_days),
+        'milk_per_head_l': _ratio(per_lot(columns['milk']), head_days),
+    }
+    results = {}
+    for index, lot_id in enumerate(lot_ids):
+        results[lot_id] = {name: _scalar(values[index]) for name, values in metrics.items()}
+    if curves:
+        rate = _ratio(dead_to_date * 100, initial[segment])
+        for index, lot_id in enumerate(lot_ids):
+            rows = slice(starts[index], starts[index] + lengths[index])
+            results[lot_id]['mortality_curve'] = {
+                'dates': columns['date'][rows].astype(str).tolist(),
+                'rate_percent': np.round(rate[rows], 3).tolist(),
+            }
+    return results
+
+
+def _scalar(value):
+    if isinstance(value, np.datetime64):
+        return value.astype(object)
+    if isinstance(value, np.integer):
+        return int(value)
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def _queries(lots):
+    # Lot rows and record columns are independent: fetch them concurrently
+    return lambda: list(lots.values_list('id', 'code', 'initial_count')), lambda: load(lots.values('pk'))
+
+
+def _results(lot_rows, columns, curves):
+    initial_counts = {lot_id: initial_count for lot_id, _, initial_count in lot_rows}
+    metrics = compute(columns, initial_counts, curves=curves)
+    return [
+        {'lot_id': str(lot_id), 'lot_code': code, 'initial_count': initial_count, **metrics.get(lot_id, {'record_days': 0})}
+        for lot_id, code, initial_count in lot_rows
+    ]
+
+
+def lot_analytics(lots, curves=False):
+    """Metrics for a Lot queryset, in the queryset's order; lots without records get empty figures."""
+    lot_rows, columns = fanout.gather(*_queries(lots))
+    return _results(lot_rows, columns, curves)
+
+
+async def alot_analytics(lots, curves=False):
+    lot_rows, columns = await fanout.agather(*_queries(lots))
+    # NumPy work stays off the event loop
+    (results,) = await fanout.agather(lambda: _results(lot_rows, columns, curves))
+    return results
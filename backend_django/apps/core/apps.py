@@ -5,3 +5,11 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     verbose_name = 'Core'
+
+    def ready(self):
+        from django.core.checks import register
+
+        from . import signals  # noqa: F401
+        from .checks import caches_shared
+
+        register(caches_shared)
@@ -0,0 +1,118 @@
+"""Cold storage for the history of closed lots.
+
+``archive_lot`` moves a lot's daily records and events out of the hot tables
+into one LotArchive row: a zlib-compressed JSON document laid out column by
+column (``{table: {field: [values]}}``) so repeated values compress well. The
+lot's list endpoints and the rollups read archived rows back with ``decode``.
+
+Stock movements stay in the hot table: they are the stock item's ledger, and
+balances and checkpoints are replayed from them.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import HealthEvent, Lot, LotArchive, LotDailyRecord, ReproductionEvent
+from .pagination import KEYSET_ORDERING
+
+ARCHIVED_MODELS = {
+    'daily_records': LotDailyRecord,
+    'health_events': HealthEvent,
+    'reproduction_events': ReproductionEvent,
+}
+SKIPPED_FIELDS = ('is_deleted', 'deleted_at')
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts datetimes to milliseconds, which would reorder same-day rows
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _fields(model):
+    return [field for field in model._meta.concrete_fields if field.name not in SKIPPED_FIELDS]
+
+
+def _columns(model, queryset):
+    fields = _fields(model)
+    rows = list(queryset.values_list(*[field.attname for field in fields]))
+    return {field.attname: [row[index] for row in rows] for index, field in enumerate(fields)}
+
+
+def pack(tables):
+    return zlib.compress(json.dumps(tables, cls=ArchiveEncoder, separators=(',', ':')).encode(), 9)
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def decode(data, name):
+    """Unsaved ``name`` rows (e.g. ``'daily_records'``) of an archive, newest first."""
+    model = ARCHIVED_MODELS[name]
+    columns = unpack(data).get(name, {})
+    fields = [field for field in _fields(model) if field.attname in columns]
+    values = [[field.to_python(value) for value in columns[field.attname]] for field in fields]
+    return [model(**dict(zip((field.attname for field in fields), row))) for row in zip(*values)]
+
+
+def _total(values):
+    return round(float(sum(values, Decimal('0'))), 3)
+
+
+def summarize(lot, tables):
+    """KPIs kept readable on the archive without decoding it."""
+    records = tables['daily_records']
+    weights = [weight for weight in records['avg_weight_kg'] if weight]
+    mortality = sum(records['mortality'])
+    return {
+        'record_count': len(records['id']),
+        'first_date': min(records['date']).isoformat() if records['date'] else None,
+        'last_date': max(records['date']).isoformat() if records['date'] else None,
+        'mortality': mortality,
+        'mortality_rate': round(mortality / lot.initial_count * 100, 2) if lot.initial_count else None,
+        'feed_intake_kg': _total(records['feed_intake_kg']),
+        'milk_production_l': _total(records['milk_production_l']),
+        'eggs_count': sum(records['eggs_count']),
+        # Rows are stored newest first
+        'final_avg_weight_kg': round(float(weights[0]), 3) if weights else None,
+        'health_event_count': len(tables['health_events']['id']),
+        'reproduction_event_count': len(tables['reproduction_events']['id']),
+        'born_alive': sum(tables['reproduction_events']['born_alive']),
+    }
+
+
+def archive_lot(lot):
+    """Move the lot's alive history into a LotArchive and purge the hot rows."""
+    with transaction.atomic():
+        tables = {
+            name: _columns(model, model.objects.filter(lot=lot).order_by(*KEYSET_ORDERING))
+            for name, model in ARCHIVED_MODELS.items()
+        }
+        archive = LotArchive.objects.create(
+            lot=lot,
+            data=pack(tables),
+            row_counts={name: len(columns['id']) for name, columns in tables.items()},
+            summary=summarize(lot, tables),
+        )
+        for model in ARCHIVED_MODELS.values():
+            purged = model.all_objects.filter(lot=lot)
+            # No per-row delete signals: the rollups read archived records instead
+            purged._raw_delete(purged.db)
+        # The lot's payload gains archive_summary: move its ETag / Last-Modified
+        lot.updated_at = timezone.now()
+        Lot.all_objects.filter(pk=lot.pk).update(updated_at=lot.updated_at)
+    return archive
+
+
+def eligible_lots(months):
+    """Closed lots, not archived yet, closed more than ``months`` months ago."""
+    cutoff = timezone.now() - timedelta(days=30 * months)
+    return Lot.objects.filter(status='closed', closed_at__lt=cutoff, archive__isnull=True).order_by('closed_at')
@@ -0,0 +1,122 @@
+"""Async variants of the dashboard and analytics endpoints, for ASGI deployments.
+
+They answer like their sync counterparts in ``views`` but await the
+independent aggregate queries together on the fan-out pool
+(``apps.core.fanout``), so a request waiting on the database holds no thread.
+Under WSGI Django still serves them, through a per-request event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.common.instrumentation import serialization
+
+from . import analytics, dashboard_cache
+from .scoping import get_enterprise_scope
+from .views import (
+    LotViewSet, accessible_farm, enterprise_farms, enterprise_payload, etag_matches, visible_enterprise,
+)
+
+
+def _authenticate(request):
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    if not drf_request.user.is_authenticated:
+        raise NotAuthenticated()
+    return drf_request
+
+
+def _json(data, status_code=status.HTTP_200_OK, etag=None):
+    with serialization():
+        response = JsonResponse(
+            data, status=status_code, encoder=JSONEncoder,
+            json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+        )
+    if etag:
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+async def _cached_response(request, etag, payload):
+    if etag_matches(request, etag):
+        await sync_to_async(dashboard_cache.record_hit)()
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    return _json(await payload(), etag=etag)
+
+
+class AsyncAPIView(View):
+    """Read-only async view authenticated by the DRF authenticators.
+
+    DRF 3.15 has no async handlers: authentication runs on the request's sync
+    thread and the handler receives the DRF ``Request``.
+    """
+
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request = await sync_to_async(_authenticate)(request)
+        except APIException as exc:
+            response = _json({'detail': exc.detail}, exc.status_code)
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                authenticators = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+                if authenticators:
+                    response['WWW-Authenticate'] = authenticators[0]().authenticate_header(request)
+            return response
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncDashboardSummaryView(AsyncAPIView):
+    async def get(self, request):
+        farm_id = request.query_params.get('farm_id')
+        if not farm_id:
+            return _json({'detail': 'farm_id requis'}, status.HTTP_400_BAD_REQUEST)
+        if not await accessible_farm(farm_id, get_enterprise_scope(request).enterprise_ids).aexists():
+            return _json({'detail': 'Accès refusé'}, status.HTTP_403_FORBIDDEN)
+
+        today = timezone.now().date()
+        version = await sync_to_async(dashboard_cache.farm_version)(farm_id)
+        etag = dashboard_cache.summary_etag(farm_id, today, version)
+        return await _cached_response(request, etag, lambda: dashboard_cache.afarm_summary(farm_id, today, version))
+
+
+class AsyncDashboardEnterpriseSummaryView(AsyncAPIView):
+    async def get(self, request):
+        enterprise_id = request.query_params.get('enterprise_id')
+        if not enterprise_id:
+            return _json({'detail': 'enterprise_id requis'}, status.HTTP_400_BAD_REQUEST)
+
+        enterprise_ids = get_enterprise_scope(request).enterprise_ids
+        farms = [farm async for farm in enterprise_farms(enterprise_id, enterprise_ids)]
+        if not farms and not await visible_enterprise(enterprise_id, enterprise_ids).aexists():
+            return _json({'detail': 'Accès refusé'}, status.HTTP_403_FORBIDDEN)
+
+        today = timezone.now().date()
+        versions = await sync_to_async(dashboard_cache.farm_versions)([farm_id for farm_id, _ in farms])
+        etag = dashboard_cache.enterprise_etag(enterprise_id, today, versions)
+
+        async def payload():
+            data = await dashboard_cache.aenterprise_summary(enterprise_id, today, versions)
+            return enterprise_payload(enterprise_id, farms, data)
+
+        return await _cached_response(request, etag, payload)
+
+
+class AsyncLotAnalyticsView(AsyncAPIView):
+    async def get(self, request):
+        # Same filters and scoping as the lots/analytics/ action
+        viewset = LotViewSet(request=request, action='analytics', detail=False, args=(), kwargs={}, format_kwarg=None)
+        lots = viewset.analytics_lots()
+        if lots is None:
+            return _json({'detail': viewset.analytics_scope_error}, status.HTTP_400_BAD_REQUEST)
+        curves = request.query_params.get('curves') in ('1', 'true')
+        return _json({'lots': await analytics.alot_analytics(lots, curves=curves)})
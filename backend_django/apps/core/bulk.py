@@ -0,0 +1,120 @@
+"""Bulk ingestion paths.
+
+Rows are validated one by one so errors can be reported per row, but lots,
+roles and existing rows are resolved with one query each and writes go through
+``bulk_create`` with an upsert on the ``(lot, date)`` unique constraint.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from . import dashboard_cache, headcount, rollups
+from .models import Lot, LotDailyRecord
+from .serializers import LotDailyRecordBulkItemSerializer
+
+RECORD_FIELDS = ('mortality', 'feed_intake_kg', 'milk_production_l', 'eggs_count', 'avg_weight_kg', 'notes')
+WRITE_ROLES = ('owner', 'admin')
+BATCH_SIZE = 500
+
+
+def upsert_daily_records(rows, scope):
+    """Validate and upsert daily records; each row replaces the record of its (lot, date).
+
+    Returns a report with created/updated counts, per-row results and per-row errors.
+    """
+    errors = {}
+    valid = {}
+    child = LotDailyRecordBulkItemSerializer()
+    for index, row in enumerate(rows):
+        try:
+            valid[index] = child.run_validation(row)
+        except ValidationError as exc:
+            errors[index] = exc.detail
+
+    # Later rows win when the same (lot, date) appears twice in the payload
+    index_by_key = {}
+    for index, data in valid.items():
+        key = (data['lot'], data['date'])
+        if key in index_by_key:
+            errors[index_by_key[key]] = {'non_field_errors': ['Doublon (lot, date) remplacé par une ligne suivante.']}
+        index_by_key[key] = index
+
+    lot_ids = {lot_id for lot_id, _ in index_by_key}
+    lot_scopes = {
+        pk: (farm_id, enterprise_id)
+        for pk, farm_id, enterprise_id in Lot.objects.filter(pk__in=lot_ids).values_list(
+            'pk', 'unit__farm_id', 'unit__farm__enterprise_id'
+        )
+    }
+    roles = {enterprise_id: scope.role(enterprise_id) for _, enterprise_id in set(lot_scopes.values())}
+
+    writable = {}
+    for key, index in index_by_key.items():
+        farm_id, enterprise_id = lot_scopes.get(key[0], (None, None))
+        role = roles.get(enterprise_id)
+        if role is None:
+            errors[index] = {'lot': ['Lot introuvable.']}
+        elif role not in WRITE_ROLES:
+            errors[index] = {'non_field_errors': ['Permission requise: owner ou admin']}
+        else:
+            writable[key] = (index, farm_id, enterprise_id)
+
+    results = []
+    if writable:
+        results = _write(writable, valid)
+    return {
+        'created': sum(1 for row in results if row['status'] == 'created'),
+        'updated': sum(1 for row in results if row['status'] == 'updated'),
+        'results': sorted(results, key=lambda row: row['index']),
+        'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+    }
+
+
+def _write(writable, valid):
+    lot_ids = {lot_id for lot_id, _ in writable}
+    dates = [day for _, day in writable]
+    date_range = (min(dates), max(dates))
+
+    with transaction.atomic():
+        # Every headcount writer holds the lot rows before reading previous mortality, so the deltas
+        # below stay exact while other upserts or saves target the same (lot, date), created ones included
+        headcount.lock(Q(pk__in=lot_ids))
+        existing = {
+            (lot_id, day): (pk, mortality, is_deleted)
+            for lot_id, day, pk, mortality, is_deleted in LotDailyRecord.all_objects.select_for_update().filter(
+                lot_id__in=lot_ids, date__range=date_range
+            ).values_list('lot_id', 'date', 'id', 'mortality', 'is_deleted')
+        }
+
+        objs = []
+        results = []
+        # Mortality replaced per lot, for the headcount
+        deltas = dict.fromkeys(lot_ids, 0)
+        for key, (index, farm_id, enterprise_id) in writable.items():
+            data = valid[index]
+            pk, previous_mortality, previous_deleted = existing.get(key, (None, 0, True))
+            results.append({'index': index, 'id': str(pk or ''), 'status': 'updated' if pk else 'created'})
+            obj = LotDailyRecord(
+                id=uuid.uuid4(), lot_id=key[0], date=key[1], farm_id=farm_id, enterprise_id=enterprise_id,
+                is_deleted=False, deleted_at=None, **{field: data[field] for field in RECORD_FIELDS if field in data},
+            )
+            objs.append(obj)
+            deltas[key[0]] += obj.mortality - (0 if previous_deleted else previous_mortality)
+
+        LotDailyRecord.objects.bulk_create(
+            objs,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['lot', 'date'],
+            update_fields=[*RECORD_FIELDS, 'is_deleted', 'deleted_at', 'updated_at', 'farm', 'enterprise'],
+        )
+        rollups.rebuild(lot_ids=lot_ids, date_range=date_range)
+        headcount.adjust(deltas)
+        dashboard_cache.invalidate_farms(farm_id for _, farm_id, _ in writable.values())
+
+    for result, obj in zip(results, objs):
+        if not result['id']:
+            result['id'] = str(obj.id)
+    return results
@@ -0,0 +1,31 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Warning
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+# (cache alias, prefix of its environment variables, setting bounding stale reads, check id)
+SHARED_CACHES = (
+    ('dashboard', 'DASHBOARD_CACHE', 'DASHBOARD_CACHE_VERSION_TTL', 'core.W001'),
+    ('auth', 'AUTH_CACHE', 'AUTH_USER_CACHE_TTL', 'core.W002'),
+)
+
+
+def caches_shared(app_configs, **kwargs):
+    # uvicorn and gunicorn read their default worker count from WEB_CONCURRENCY
+    workers = int(os.getenv('WEB_CONCURRENCY', '1') or 1)
+    if workers <= 1:
+        return []
+    warnings = []
+    for alias, prefix, ttl_setting, check_id in SHARED_CACHES:
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend not in PROCESS_LOCAL_CACHES:
+            continue
+        warnings.append(Warning(
+            f"Le cache '{alias}' ({backend}) est propre à chaque processus alors que WEB_CONCURRENCY={workers}: "
+            "une écriture n'invalide que le worker qui l'a traitée.",
+            hint=f"Pointez {prefix}_BACKEND/{prefix}_LOCATION vers Redis ou Memcached; "
+                 f"sinon {ttl_setting} borne la durée des réponses périmées.",
+            id=check_id,
+        ))
+    return warnings
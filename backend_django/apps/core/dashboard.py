@@ -0,0 +1,225 @@
+"""Dashboard KPI aggregation.
+
+Farm summaries are computed in a fixed number of queries whatever the data
+size or the number of farms: one conditional aggregate over lots grouped by
+farm, one GROUP BY farm/lot over the rollup window (production sums,
+first/last weights and margins) and one query for stock alerts. The three are
+independent and run concurrently through ``apps.core.fanout``; the ``a*``
+variants await them from async views.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import fanout
+from .models import DailyRollup, Farm, Lot, StockItem
+
+PRODUCTION_DAYS = 7
+FINANCE_DAYS = 30
+
+
+def _window_edge(window_qs, field, order):
+    """Value of ``field`` on the first row of the lot's window in ``order``."""
+    return Subquery(window_qs.filter(lot_id=OuterRef('lot_id'), record_count__gt=0).order_by(order).values(field)[:1])
+
+
+def lot_totals(farm_ids):
+    rows = (
+        Lot.objects.filter(unit__farm_id__in=farm_ids, is_deleted=False)
+        .values('unit__farm_id')
+        .annotate(
+            total_lots=Count('id'),
+            active_lots=Count('id', filter=Q(status='active')),
+            # Live headcount of the lots still running
+            population=Coalesce(Sum('current_count', filter=Q(status='active')), 0),
+        )
+        .order_by()
+    )
+    return {row.pop('unit__farm_id'): row for row in rows}
+
+
+def rollup_rows(farm_ids, today):
+    last_7 = today - timedelta(days=PRODUCTION_DAYS)
+    last_30 = today - timedelta(days=FINANCE_DAYS)
+    window_qs = DailyRollup.objects.filter(farm_id__in=farm_ids, date__gte=last_7)
+    week = Q(date__gte=last_7, record_count__gt=0)
+    zero = Value(0, output_field=DecimalField())
+
+    return (
+        DailyRollup.objects.filter(farm_id__in=farm_ids, date__gte=last_30)
+        .values('farm_id', 'lot_id', 'lot__code', 'lot__current_count', 'lot__status', 'lot__is_deleted')
+        .annotate(
+            mortality=Coalesce(Sum('mortality', filter=week), 0),
+            feed_intake=Coalesce(Sum('feed_intake_kg', filter=week), zero),
+            milk=Coalesce(Sum('milk_production_l', filter=week), zero),
+            eggs=Coalesce(Sum('eggs_count', filter=week), 0),
+            record_days=Count('id', filter=week),
+            entry_count=Coalesce(Sum('entry_count'), 0),
+            margin=Coalesce(Sum(F('revenue') - F('cost')), zero),
+            first_date=_window_edge(window_qs, 'date', 'date'),
+            last_date=_window_edge(window_qs, 'date', '-date'),
+            first_weight=_window_edge(window_qs, 'avg_weight_kg', 'date'),
+            last_weight=_window_edge(window_qs, 'avg_weight_kg', '-date'),
+        )
+        .order_by('lot__code')
+    )
+
+
+def stock_alerts(farm_ids):
+    alerts = {}
+    rows = (
+        StockItem.objects.filter(farm_id__in=farm_ids, is_deleted=False, quantity__lt=F('alert_threshold'))
+        .values('farm_id', 'id', 'name', 'quantity', 'unit', 'alert_threshold')
+        .order_by('name')
+    )
+    for row in rows:
+        alerts.setdefault(row.pop('farm_id'), []).append(row)
+    return alerts
+
+
+def _totals():
+    return {
+        'total_lots': 0,
+        'active_lots': 0,
+        'population': 0,
+        'mortality': 0,
+        'eggs': 0,
+        'feed_intake': Decimal('0'),
+        'milk': Decimal('0'),
+        'margin_30d': Decimal('0'),
+        'avg_daily_gain_sum': 0.0,
+        'gain_lot_count': 0,
+        'total_weight_gain': 0.0,
+        'lot_margins_30d': [],
+        'stock_alerts': [],
+    }
+
+
+def _add_rollup_row(totals, row):
+    if row['record_days'] and (row['lot__status'] != 'active' or row['lot__is_deleted']):
+        # The window's deaths and eggs of a lot closed since count against its survivors too
+        totals['population'] += max(row['lot__current_count'] or 0, 0)
+    totals['mortality'] += row['mortality']
+    totals['eggs'] += row['eggs']
+    totals['feed_intake'] += row['feed_intake']
+    totals['milk'] += row['milk']
+    if row['entry_count']:
+        totals['margin_30d'] += row['margin']
+        if row['lot_id']:
+            totals['lot_margins_30d'].append(
+                {'lot_id': str(row['lot_id']), 'lot_code': row['lot__code'], 'margin': float(row['margin'])}
+            )
+    if row['record_days'] < 2:
+        return
+    days = max((row['last_date'] - row['first_date']).days, 1)
+    gain_per_animal = float(row['last_weight'] - row['first_weight'])
+    totals['avg_daily_gain_sum'] += gain_per_animal / days
+    totals['gain_lot_count'] += 1
+    headcount = row['lot__current_count'] or 0
+    if gain_per_animal > 0 and headcount > 0:
+        totals['total_weight_gain'] += gain_per_animal * headcount
+
+
+def _kpis(totals):
+    population = max(totals['population'], 0)
+    mortality = totals['mortality']
+    eggs = totals['eggs']
+    feed_intake = totals['feed_intake']
+    gain_lot_count = totals['gain_lot_count']
+    total_weight_gain = totals['total_weight_gain']
+    # Alive at the start of the window; the week's deaths lived half of it on average
+    start_population = population + mortality
+    hen_days = (population + mortality / 2) * PRODUCTION_DAYS
+    return {
+        'total_lots': totals['total_lots'],
+        'active_lots': totals['active_lots'],
+        'mortality_7d': mortality,
+        'mortality_rate_percent_7d': round((mortality / start_population) * 100, 2) if start_population else 0.0,
+        'feed_intake_kg_7d': float(feed_intake),
+        'milk_production_l_7d': float(totals['milk']),
+        'eggs_count_7d': eggs,
+        'eggs_per_hen_per_day': round(eggs / hen_days, 3) if hen_days else 0.0,
+        'avg_daily_gain_kg': round(totals['avg_daily_gain_sum'] / gain_lot_count, 3) if gain_lot_count else 0.0,
+        'feed_conversion_ratio': round(float(feed_intake) / total_weight_gain, 3) if total_weight_gain > 0 else None,
+        'farm_margin_30d': round(float(totals['margin_30d']), 2),
+        'lot_margins_30d': totals['lot_margins_30d'],
+        'stock_alerts': totals['stock_alerts'],
+    }
+
+
+def _farm_queries(farm_ids, today):
+    return (
+        lambda: lot_totals(farm_ids),
+        lambda: list(rollup_rows(farm_ids, today)),
+        lambda: stock_alerts(farm_ids),
+    )
+
+
+def _merge_totals(farm_ids, lots, rows, alerts):
+    totals = {farm_id: _totals() for farm_id in farm_ids}
+    for farm_id, values in lots.items():
+        totals[farm_id].update(values)
+    for row in rows:
+        _add_rollup_row(totals[row['farm_id']], row)
+    for farm_id, farm_alerts in alerts.items():
+        totals[farm_id]['stock_alerts'] = farm_alerts
+    return totals
+
+
+def _farm_ids(farm_ids):
+    return [Farm._meta.pk.to_python(farm_id) for farm_id in farm_ids]
+
+
+def _farm_totals(farm_ids, today):
+    farm_ids = _farm_ids(farm_ids)
+    return _merge_totals(farm_ids, *fanout.gather(*_farm_queries(farm_ids, today)))
+
+
+async def _afarm_totals(farm_ids, today):
+    farm_ids = _farm_ids(farm_ids)
+    return _merge_totals(farm_ids, *await fanout.agather(*_farm_queries(farm_ids, today)))
+
+
+def farm_summaries(farm_ids, today=None):
+    """KPIs of several farms, in the same three grouped queries as a single farm."""
+    today = today or timezone.now().date()
+    return {farm_id: _kpis(totals) for farm_id, totals in _farm_totals(farm_ids, today).items()}
+
+
+def farm_summary(farm_id, today=None):
+    (summary,) = farm_summaries([farm_id], today).values()
+    return summary
+
+
+async def afarm_summary(farm_id, today=None):
+    today = today or timezone.now().date()
+    (totals,) = (await _afarm_totals([farm_id], today)).values()
+    return _kpis(totals)
+
+
+def _enterprise_kpis(per_farm):
+    """Per-farm KPIs plus enterprise totals recomputed from the summed counters."""
+    combined = _totals()
+    for totals in per_farm.values():
+        for key, value in totals.items():
+            combined[key] = combined[key] + value
+    enterprise = _kpis(combined)
+    enterprise['stock_alerts_count'] = len(enterprise.pop('stock_alerts'))
+    enterprise.pop('lot_margins_30d')
+    return {
+        'farms': {farm_id: _kpis(totals) for farm_id, totals in per_farm.items()},
+        'totals': enterprise,
+    }
+
+
+def enterprise_summary(farm_ids, today=None):
+    today = today or timezone.now().date()
+    return _enterprise_kpis(_farm_totals(farm_ids, today))
+
+
+async def aenterprise_summary(farm_ids, today=None):
+    today = today or timezone.now().date()
+    return _enterprise_kpis(await _afarm_totals(farm_ids, today))
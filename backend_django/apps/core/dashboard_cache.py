@@ -0,0 +1,157 @@
+"""Versioned cache for dashboard payloads.
+
+Every farm has a version token in the ``dashboard`` cache. Writes that can
+change a farm's dashboard replace the token once their transaction commits,
+which orphans all cached payloads of that farm without tracking their keys.
+Payload keys also carry the day so the rolling windows move at midnight.
+
+Tokens expire after ``DASHBOARD_CACHE_VERSION_TTL`` seconds: with a
+per-process cache only the worker that handled a write replaces its token, so
+the TTL bounds how long the other workers keep serving the old payload.
+"""
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import dashboard
+
+CACHE_ALIAS = 'dashboard'
+STATS_KEYS = {'hits': 'dashboard:stats:hits', 'misses': 'dashboard:stats:misses'}
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(farm_id):
+    return f'dashboard:version:{farm_id}'
+
+
+def _version_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_VERSION_TTL', 60) or None
+
+
+def farm_version(farm_id):
+    cache = get_cache()
+    key = _version_key(farm_id)
+    version = cache.get(key)
+    if version is None:
+        # Another worker may set the token first; keep whichever won
+        cache.add(key, uuid.uuid4().hex, timeout=_version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def farm_versions(farm_ids):
+    cache = get_cache()
+    keys = {farm_id: _version_key(farm_id) for farm_id in farm_ids}
+    versions = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=_version_timeout())
+        versions.update(cache.get_many(missing))
+    return {farm_id: versions[key] for farm_id, key in keys.items()}
+
+
+def invalidate_farms(farm_ids):
+    farm_ids = {farm_id for farm_id in farm_ids if farm_id}
+    if not farm_ids:
+        return
+    transaction.on_commit(
+        lambda: get_cache().set_many(
+            {_version_key(farm_id): uuid.uuid4().hex for farm_id in farm_ids}, timeout=_version_timeout()
+        )
+    )
+
+
+def _digest(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def summary_etag(farm_id, today, version):
+    return f'"{_digest(farm_id, today, version)}"'
+
+
+def _enterprise_digest(enterprise_id, today, versions):
+    return _digest(enterprise_id, today, *sorted(f'{farm_id}={version}' for farm_id, version in versions.items()))
+
+
+def enterprise_etag(enterprise_id, today, versions):
+    return f'"{_enterprise_digest(enterprise_id, today, versions)}"'
+
+
+def _count(name):
+    cache = get_cache()
+    key = STATS_KEYS[name]
+    if not cache.add(key, 1, timeout=None):
+        cache.incr(key)
+
+
+def record_hit():
+    _count('hits')
+
+
+def stats():
+    values = get_cache().get_many(STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def _summary_key(farm_id, today, version):
+    return f'dashboard:summary:{farm_id}:{dashboard.PRODUCTION_DAYS}:{dashboard.FINANCE_DAYS}:{today}:{version}'
+
+
+def _enterprise_key(enterprise_id, today, versions):
+    digest = _enterprise_digest(enterprise_id, today, versions)
+    return f'dashboard:enterprise:{dashboard.PRODUCTION_DAYS}:{dashboard.FINANCE_DAYS}:{digest}'
+
+
+def _lookup(key):
+    data = get_cache().get(key)
+    _count('hits' if data is not None else 'misses')
+    return data
+
+
+def farm_summary(farm_id, today=None, version=None):
+    """Return the farm summary, computing and storing it on a miss."""
+    today = today or timezone.now().date()
+    version = version or farm_version(farm_id)
+    key = _summary_key(farm_id, today, version)
+    data = _lookup(key)
+    if data is None:
+        data = dashboard.farm_summary(farm_id, today=today)
+        get_cache().set(key, data)
+    return data
+
+
+async def afarm_summary(farm_id, today, version):
+    key = _summary_key(farm_id, today, version)
+    data = await sync_to_async(_lookup)(key)
+    if data is None:
+        data = await dashboard.afarm_summary(farm_id, today=today)
+        await get_cache().aset(key, data)
+    return data
+
+
+def enterprise_summary(enterprise_id, today, versions):
+    """Per-farm and total KPIs for the farms in ``versions``; any farm change yields a new key."""
+    key = _enterprise_key(enterprise_id, today, versions)
+    data = _lookup(key)
+    if data is None:
+        data = dashboard.enterprise_summary(list(versions), today=today)
+        get_cache().set(key, data)
+    return data
+
+
+async def aenterprise_summary(enterprise_id, today, versions):
+    key = _enterprise_key(enterprise_id, today, versions)
+    data = await sync_to_async(_lookup)(key)
+    if data is None:
+        data = await dashboard.aenterprise_summary(list(versions), today=today)
+        await get_cache().aset(key, data)
+    return data
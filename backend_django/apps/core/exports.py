@@ -0,0 +1,81 @@
+"""Streaming exports (CSV / NDJSON, optionally gzipped).
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL, and are written to the response as they are
+produced, so memory stays flat whatever the number of rows.
+"""
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _LineBuffer:
+    """File-like object handing back what csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(fields, rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(fields, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def _chunks(lines):
+    # Group small lines so each write to the socket carries a reasonable payload
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_rows(queryset, fields, output='csv', compress=False, chunk_size=CHUNK_SIZE):
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    lines = _csv_lines(fields, rows) if output == 'csv' else _ndjson_lines(fields, rows)
+    chunks = _chunks(lines)
+    return _gzip(chunks) if compress else chunks
+
+
+def export_response(queryset, fields, basename, output='csv', compress=False):
+    filename = f"{basename}-{timezone.now():%Y%m%d}.{output}"
+    content_type = FORMATS[output]
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(stream_rows(queryset, fields, output, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
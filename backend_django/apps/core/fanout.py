@@ -0,0 +1,70 @@
+"""Concurrent execution of independent read queries.
+
+Dashboard and analytics payloads are built from a few aggregate queries that
+do not depend on each other. ``gather`` runs them on a process-wide bounded
+thread pool so they overlap instead of queueing on one connection; ``agather``
+awaits the same pool from async views without holding a thread while waiting.
+
+Each worker thread has its own database connection, so ``QUERY_FANOUT_WORKERS``
+also bounds the extra connections a process opens. Inside a transaction the
+calls run inline: other connections would not see its uncommitted rows.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_executor = None
+_lock = threading.Lock()
+
+
+def workers():
+    return getattr(settings, 'QUERY_FANOUT_WORKERS', 4)
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix='query-fanout')
+    return _executor
+
+
+def _run(call):
+    try:
+        return call()
+    finally:
+        # Keeps the worker's connection only as long as CONN_MAX_AGE allows
+        close_old_connections()
+
+
+def _inline():
+    return workers() < 2 or connection.in_atomic_block
+
+
+def _call_all(calls):
+    return [call() for call in calls]
+
+
+def _submit(call):
+    # Carries the request's context (instrumentation) to the worker thread
+    return _pool().submit(contextvars.copy_context().run, _run, call)
+
+
+def gather(*calls):
+    """Results of the no-argument callables ``calls``, in order."""
+    if _inline():
+        return _call_all(calls)
+    futures = [_submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+async def agather(*calls):
+    """Async ``gather``; the transaction check runs on the request's sync thread."""
+    if await sync_to_async(_inline)():
+        return await sync_to_async(_call_all)(calls)
+    return await asyncio.gather(*(asyncio.wrap_future(_submit(call)) for call in calls))
@@ -0,0 +1,83 @@
+"""Live headcount of lots.
+
+``Lot.cumulative_mortality`` is the mortality of the lot's alive daily records
+plus the mortality kept in its archive summary, and ``Lot.current_count`` is
+``initial_count`` minus it. Record saves, soft deletes and bulk upserts move
+both counters with ``adjust`` (an SQL increment, so concurrent writers on the
+same lot add up); soft-delete cascades and the repair command recompute them
+with ``recount``.
+
+Writers moving the counters from a record's previous mortality ``lock`` the
+lots first, in pk order, so the value they read cannot go stale before their
+increment. Both functions touch ``updated_at`` so the lots' ETags follow.
+"""
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import Lot, LotArchive, LotDailyRecord
+
+
+def lock(lots):
+    """Lock the rows of the lots matching the ``lots`` Q until the transaction ends."""
+    return list(Lot.all_objects.select_for_update(of=('self',)).filter(lots).order_by('pk').values_list('pk', flat=True))
+
+
+def adjust(deltas):
+    """Apply ``{lot_id: mortality delta}`` to the lots' counters."""
+    now = timezone.now()
+    for lot_id, delta in deltas.items():
+        if lot_id and delta:
+            Lot.all_objects.filter(pk=lot_id).update(
+                cumulative_mortality=F('cumulative_mortality') + delta, current_count=F('current_count') - delta,
+                updated_at=now,
+            )
+
+
+def _lots(farm_ids=None, lot_ids=None):
+    lots = Lot.all_objects.all()
+    if farm_ids is not None:
+        lots = lots.filter(unit__farm_id__in=farm_ids)
+    if lot_ids is not None:
+        lots = lots.filter(pk__in=lot_ids)
+    return lots
+
+
+def _expected_mortality():
+    records = (
+        LotDailyRecord.objects.filter(lot_id=OuterRef('pk'))
+        .values('lot_id')
+        .annotate(total=Sum('mortality'))
+        .values('total')
+    )
+    archived = LotArchive.objects.filter(lot_id=OuterRef('pk')).values(
+        total=Cast(KT('summary__mortality'), IntegerField())
+    )
+    return Coalesce(Subquery(records), 0) + Coalesce(Subquery(archived), 0)
+
+
+def recount(farm_ids=None, lot_ids=None):
+    """Recompute the counters of the selected lots from their records; returns the number of lots."""
+    lots = _lots(farm_ids, lot_ids)
+    if farm_ids is not None:
+        # UPDATE cannot filter through the unit join
+        lots = Lot.all_objects.filter(pk__in=list(lots.values_list('pk', flat=True)))
+    mortality = _expected_mortality()
+    unchanged = Q(cumulative_mortality=mortality, current_count=F('initial_count') - mortality)
+    return lots.update(
+        cumulative_mortality=mortality,
+        current_count=F('initial_count') - mortality,
+        updated_at=Case(When(unchanged, then=F('updated_at')), default=timezone.now()),
+    )
+
+
+def diff(farm_ids=None, lot_ids=None):
+    """Lots whose stored counters disagree with their records: [(lot_id, stored, expected)]."""
+    rows = _lots(farm_ids, lot_ids).annotate(expected=_expected_mortality()).values_list(
+        'pk', 'cumulative_mortality', 'current_count', 'initial_count', 'expected'
+    )
+    return [
+        (lot_id, stored, expected) for lot_id, stored, current, initial, expected in rows
+        if stored != expected or current != initial - expected
+    ]
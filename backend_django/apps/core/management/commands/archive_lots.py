@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive l'historique (relevés journaliers, évènements sanitaires et de reproduction) des lots clôturés "
+        "depuis plus de N mois et le retire des tables actives"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=6, help="Ancienneté minimale de la clôture, en mois")
+        parser.add_argument('--farm-id', action='append', dest='farm_ids', help="Limiter à une ferme (répétable)")
+        parser.add_argument('--limit', type=int, help="Nombre maximal de lots archivés")
+        parser.add_argument('--dry-run', action='store_true', help="Lister les lots sans les archiver")
+
+    def handle(self, *args, **options):
+        lots = archive.eligible_lots(options['months'])
+        if options['farm_ids']:
+            lots = lots.filter(unit__farm_id__in=options['farm_ids'])
+        if options['limit']:
+            lots = lots[:options['limit']]
+
+        archived = rows = 0
+        for lot in lots:
+            if options['dry_run']:
+                self.stdout.write(f"À archiver: lot {lot.code} ({lot.pk}) clôturé le {lot.closed_at:%Y-%m-%d}")
+                archived += 1
+                continue
+            # One transaction per lot: an interrupted run leaves every lot whole
+            lot_archive = archive.archive_lot(lot)
+            archived += 1
+            rows += sum(lot_archive.row_counts.values())
+
+        if options['dry_run']:
+            self.stdout.write(f"{archived} lot(s) à archiver.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{archived} lot(s) archivé(s), {rows} ligne(s) retirée(s) des tables actives."))
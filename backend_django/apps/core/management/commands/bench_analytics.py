@@ -0,0 +1,137 @@
+import math
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.core import analytics, headcount
+from apps.core.models import BreedingType, Enterprise, Farm, Lot, LotDailyRecord, Species, Unit
+
+BENCH_EMAIL = 'bench-analytics@example.com'
+COMPARED = ('mortality', 'current_headcount', 'adg_kg', 'fcr', 'laying_rate_percent', 'milk_per_head_l')
+
+
+def loop_lot_metrics(lots):
+    """Reference implementation: one query and a Python loop over model instances per lot."""
+    results = {}
+    for lot in lots:
+        head = lot.initial_count
+        head_days = dead = 0
+        eggs = milk = feed = 0.0
+        first = last = None
+        for record in lot.daily_records.order_by('date'):
+            head_days += head
+            dead += record.mortality
+            head = max(lot.initial_count - dead, 0)
+            eggs += record.eggs_count
+            milk += float(record.milk_production_l)
+            feed += float(record.feed_intake_kg)
+            if record.avg_weight_kg > 0:
+                point = (record.date, float(record.avg_weight_kg), head, feed)
+                first = first or point
+                last = point
+        adg = fcr = None
+        if first and last and last[0] > first[0]:
+            adg = (last[1] - first[1]) / (last[0] - first[0]).days
+            gain = last[1] * last[2] - first[1] * first[2]
+            fcr = (last[3] - first[3]) / gain if gain > 0 else None
+        results[lot.id] = {
+            'mortality': dead,
+            'current_headcount': head,
+            'adg_kg': adg,
+            'fcr': fcr,
+            'laying_rate_percent': eggs * 100 / head_days if head_days else None,
+            'milk_per_head_l': milk / head_days if head_days else None,
+        }
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le calcul vectorisé (NumPy) des indicateurs de lots avec la boucle par lot. "
+        "À lancer sur une base de test."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lots', type=int, default=0, help="Nombre de lots à générer (0 = données existantes)")
+        parser.add_argument('--days', type=int, default=365, help="Jours d'historique par lot généré")
+        parser.add_argument('--farm-id', help="Ferme à analyser (par défaut la ferme générée ou la première trouvée)")
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--skip-loop', action='store_true', help="Ne pas mesurer la boucle par lot")
+
+    def handle(self, *args, **options):
+        farm_id = options['farm_id']
+        if options['lots']:
+            farm_id = self._seed(options['lots'], options['days'])
+        farm_id = farm_id or LotDailyRecord.objects.values_list('farm_id', flat=True).first()
+        if not farm_id:
+            self.stdout.write(self.style.ERROR("Aucun enregistrement: utilisez --lots pour générer des données."))
+            return
+
+        lots = Lot.objects.filter(unit__farm_id=farm_id).order_by('code')
+        rows = LotDailyRecord.objects.filter(farm_id=farm_id).count()
+        self.stdout.write(f"Ferme {farm_id}: {lots.count()} lots, {rows} enregistrements")
+
+        vectorised, results = self._time(lambda: analytics.lot_analytics(lots), options['repeat'])
+        self.stdout.write(f"  NumPy: {vectorised:.1f} ms (médiane)")
+        if options['skip_loop']:
+            return
+        looped, reference = self._time(lambda: loop_lot_metrics(lots), 1)
+        self.stdout.write(f"  Boucle par lot: {looped:.1f} ms (x{looped / vectorised:.1f})")
+
+        mismatches = 0
+        for row in results:
+            expected = reference[Lot._meta.pk.to_python(row['lot_id'])]
+            for name in COMPARED:
+                want, have = expected[name], row.get(name)
+                if (want is None) != (have is None) or (want is not None and not math.isclose(want, have, rel_tol=1e-3, abs_tol=1e-3)):
+                    mismatches += 1
+                    self.stdout.write(self.style.WARNING(f"Écart: lot {row['lot_code']} {name} boucle={want} numpy={have}"))
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"{mismatches} écart(s) entre les deux calculs."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Résultats identiques."))
+
+    def _time(self, func, repeat):
+        timings = []
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
+
+    def _seed(self, lot_count, days):
+        User = get_user_model()
+        user, created = User.objects.get_or_create(email=BENCH_EMAIL)
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        breeding_type, _ = BreedingType.objects.get_or_create(code='BENCH', defaults={'name': 'Benchmark'})
+        species, _ = Species.objects.get_or_create(code='BENCH', defaults={'name': 'Benchmark', 'breeding_type': breeding_type})
+        enterprise = Enterprise.objects.create(name='Bench analytics', owner=user)
+        farm = Farm.objects.create(name='Bench analytics', enterprise=enterprise)
+        unit = Unit.objects.create(name='Bench', farm=farm, breeding_type=breeding_type, capacity=lot_count)
+        lots = Lot.objects.bulk_create([
+            Lot(unit=unit, species=species, code=f'A{index:05}', entry_date=date(2020, 1, 1), initial_count=1000 + index)
+            for index in range(lot_count)
+        ])
+
+        first_day = date.today() - timedelta(days=days)
+        pending = []
+        for lot_index, lot in enumerate(lots):
+            for offset in range(days):
+                weighed = offset % 7 == 0
+                pending.append(LotDailyRecord(
+                    lot=lot, farm_id=farm.id, enterprise_id=enterprise.id, date=first_day + timedelta(days=offset),
+                    mortality=(offset + lot_index) % 3, feed_intake_kg=100 + offset % 10, eggs_count=(offset * 37) % 900,
+                    milk_production_l=(offset * 13) % 50, avg_weight_kg=0.05 + offset * 0.045 if weighed else 0,
+                ))
+            if len(pending) >= 20000:
+                LotDailyRecord.objects.bulk_create(pending, batch_size=5000)
+                pending = []
+        LotDailyRecord.objects.bulk_create(pending, batch_size=5000)
+        headcount.recount(farm_ids=[farm.id])
+        return farm.id
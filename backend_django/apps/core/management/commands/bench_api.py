@@ -0,0 +1,165 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.core import dashboard_cache
+from apps.core.management.commands.seed_scale import SCALE_EMAIL
+from apps.core.models import Enterprise, Farm, FinancialEntry, Lot, LotDailyRecord, StockItem, StockMovement
+
+COUNTED_MODELS = (Enterprise, Farm, Lot, LotDailyRecord, FinancialEntry, StockMovement)
+
+
+def percentile(sorted_timings, rank):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(int(round(rank / 100 * len(sorted_timings))) - 1, 0)
+    return sorted_timings[min(index, len(sorted_timings) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les latences p50/p95/p99 des endpoints de l'API sur le jeu de données de seed_scale "
+        "et écrit un rapport JSON comparable d'une exécution à l'autre."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default=SCALE_EMAIL, help="Utilisateur dont les données sont interrogées")
+        parser.add_argument('--requests', type=int, default=30, help="Requêtes mesurées par endpoint")
+        parser.add_argument('--warmup', type=int, default=3, help="Requêtes de chauffe non mesurées par endpoint")
+        parser.add_argument('--only', action='append', default=[], help="Ne mesurer que les endpoints contenant ce texte (répétable)")
+        parser.add_argument('--cold-cache', action='store_true', help="Vider le cache du tableau de bord avant chaque requête")
+        parser.add_argument('--output', default='bench_api.json', help="Fichier du rapport JSON")
+        parser.add_argument('--compare', help="Rapport précédent à comparer")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"Utilisateur introuvable: {options['email']} (lancez d'abord seed_scale).")
+        farm = Farm.objects.filter(enterprise__owner=user, is_deleted=False).order_by('enterprise__name', 'name').first()
+        if farm is None:
+            raise CommandError("Aucune ferme pour cet utilisateur (lancez d'abord seed_scale).")
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        endpoints = [
+            endpoint for endpoint in self._endpoints(farm)
+            if not options['only'] or any(text in endpoint[0] for text in options['only'])
+        ]
+        results = {}
+        for name, url, params in endpoints:
+            results[name] = self._measure(client, url, params, options)
+            self._report_line(name, results[name])
+
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'cold_cache': options['cold_cache'],
+                'rows': {model.__name__: model._default_manager.count() for model in COUNTED_MODELS},
+            },
+            'endpoints': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+        self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {options['output']}"))
+        if options['compare']:
+            self._compare(json.loads(Path(options['compare']).read_text()), report)
+
+    def _endpoints(self, farm):
+        lot = Lot.objects.filter(unit__farm=farm, is_deleted=False).order_by('-entry_date').first()
+        stock_item = StockItem.objects.filter(farm=farm, is_deleted=False).order_by('name').first()
+        record = LotDailyRecord.objects.filter(lot=lot).order_by('-date').first() if lot else None
+        today = timezone.now().date()
+        endpoints = [
+            ('enterprise-list', reverse('enterprise-list'), {}),
+            ('farm-list', reverse('farm-list'), {'enterprise_id': farm.enterprise_id}),
+            ('unit-list', reverse('unit-list'), {'farm_id': farm.id}),
+            ('lot-list', reverse('lot-list'), {'farm_id': farm.id}),
+            ('lot-record-list', reverse('lot-record-list'), {}),
+            ('lot-record-list-cursor', reverse('lot-record-list'), {'pagination': 'cursor'}),
+            ('health-event-list', reverse('health-event-list'), {}),
+            ('reproduction-event-list', reverse('reproduction-event-list'), {}),
+            ('financial-entry-list', reverse('financial-entry-list'), {'farm_id': farm.id}),
+            ('stock-item-list', reverse('stock-item-list'), {'farm_id': farm.id}),
+            ('stock-movement-list', reverse('stock-movement-list'), {'farm_id': farm.id}),
+            ('farm-detail', reverse('farm-detail', args=[farm.id]), {}),
+            ('lot-analytics', reverse('lot-analytics'), {'farm_id': farm.id}),
+            ('dashboard-summary', reverse('dashboard-summary'), {'farm_id': farm.id}),
+            ('dashboard-enterprise-summary', reverse('dashboard-enterprise-summary'), {'enterprise_id': farm.enterprise_id}),
+        ]
+        if lot:
+            endpoints += [
+                ('lot-detail', reverse('lot-detail', args=[lot.id]), {}),
+                ('lot-record-list-lot', reverse('lot-record-list'), {'lot_id': lot.id}),
+                ('lot-timeseries', reverse('lot-timeseries', args=[lot.id]), {}),
+            ]
+        if record:
+            endpoints.append(('lot-record-detail', reverse('lot-record-detail', args=[record.id]), {}))
+        if stock_item:
+            endpoints += [
+                ('stock-item-detail', reverse('stock-item-detail', args=[stock_item.id]), {}),
+                ('stock-item-as-of', reverse('stock-item-as-of', args=[stock_item.id]), {'date': today - timedelta(days=90)}),
+            ]
+        return endpoints
+
+    def _request(self, client, url, params, cold_cache):
+        if cold_cache:
+            dashboard_cache.get_cache().clear()
+        start = time.perf_counter()
+        response = client.get(url, params)
+        size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+        return response.status_code, size, (time.perf_counter() - start) * 1000
+
+    def _measure(self, client, url, params, options):
+        # A full query log (DEBUG) would make the captured count zero
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            status, size, _ = self._request(client, url, params, options['cold_cache'])
+        for _ in range(max(options['warmup'] - 1, 0)):
+            self._request(client, url, params, options['cold_cache'])
+        timings = sorted(
+            self._request(client, url, params, options['cold_cache'])[2] for _ in range(max(options['requests'], 1))
+        )
+        return {
+            'status': status,
+            'bytes': size,
+            'queries': len(queries),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'max_ms': round(timings[-1], 2),
+        }
+
+    def _report_line(self, name, result):
+        line = (
+            f"{name:32} p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+            f"{result['queries']:3} requêtes SQL"
+        )
+        self.stdout.write(line if result['status'] == 200 else self.style.WARNING(f"{line}  (HTTP {result['status']})"))
+
+    def _compare(self, baseline, report):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Comparaison avec le rapport du {baseline['meta']['date']}"))
+        for name, result in report['endpoints'].items():
+            before = baseline['endpoints'].get(name)
+            if not before:
+                self.stdout.write(f"{name:32} nouveau")
+                continue
+            deltas = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0
+                deltas.append(f"{key[:3]} {before[key]:.1f} -> {result[key]:.1f} ms ({change:+.0f} %)")
+            line = f"{name:32} " + '  '.join(deltas)
+            if result['queries'] != before['queries']:
+                line += f"  requêtes {before['queries']} -> {result['queries']}"
+            self.stdout.write(line)
@@ -0,0 +1,82 @@
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.core.management.commands.bench_api import percentile
+from apps.core.management.commands.seed_scale import SCALE_EMAIL
+from apps.users.authentication import CachedJWTAuthentication, user_cache
+
+# (name, authentication class, empty the user cache before each call)
+MODES = (
+    ('simplejwt', JWTAuthentication, False),
+    ('cached-cold', CachedJWTAuthentication, True),
+    ('cached-warm', CachedJWTAuthentication, False),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le coût par requête de l'authentification JWT: résolution de l'utilisateur en base "
+        "(simplejwt) contre le cache d'utilisateurs, à froid et à chaud"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default=SCALE_EMAIL, help="Utilisateur porteur du jeton")
+        parser.add_argument('--requests', type=int, default=2000, help="Authentifications mesurées par mode")
+        parser.add_argument('--output', help="Fichier du rapport JSON")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"Utilisateur introuvable: {options['email']} (lancez d'abord seed_scale).")
+        request = RequestFactory().get('/api/farms/', HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+        results = {}
+        for name, auth_class, cold in MODES:
+            results[name] = self._measure(auth_class(), request, cold, options['requests'])
+            measured = results[name]
+            self.stdout.write(
+                f"{name:12} p50 {measured['p50_us']:8.1f} µs  p95 {measured['p95_us']:8.1f} µs  "
+                f"{measured['queries_per_call']:.0f} requête(s) SQL"
+            )
+
+        if options['output']:
+            report = {
+                'meta': {'date': timezone.now().isoformat(), 'vendor': connection.vendor, 'requests': options['requests']},
+                'modes': results,
+            }
+            Path(options['output']).write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {options['output']}"))
+
+    def _measure(self, auth, request, cold, count):
+        user_cache.clear()
+        auth.authenticate(Request(request))
+        timings = []
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            for _ in range(count):
+                if cold:
+                    user_cache.clear()
+                start = time.perf_counter()
+                auth.authenticate(Request(request))
+                timings.append((time.perf_counter() - start) * 1_000_000)
+        timings.sort()
+        return {
+            'p50_us': round(percentile(timings, 50), 1),
+            'p95_us': round(percentile(timings, 95), 1),
+            'queries_per_call': len(queries) / count,
+        }
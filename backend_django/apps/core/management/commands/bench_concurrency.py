@@ -0,0 +1,137 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.core import dashboard_cache, fanout
+from apps.core.management.commands.bench_api import percentile
+from apps.core.management.commands.seed_scale import SCALE_EMAIL
+from apps.core.models import Farm
+
+# (name, sync route, async route, query params from the farm)
+ENDPOINTS = (
+    ('dashboard-summary', 'dashboard-summary', 'async-dashboard-summary', lambda farm: {'farm_id': farm.id}),
+    (
+        'dashboard-enterprise-summary', 'dashboard-enterprise-summary', 'async-dashboard-enterprise-summary',
+        lambda farm: {'enterprise_id': farm.enterprise_id},
+    ),
+    ('lot-analytics', 'lot-analytics', 'async-lot-analytics', lambda farm: {'farm_id': farm.id}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sous charge concurrente les latences des endpoints tableau de bord et analytique: "
+        "vues synchrones servies en WSGI contre vues asynchrones servies en ASGI"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default=SCALE_EMAIL, help="Utilisateur dont les données sont interrogées")
+        parser.add_argument('--concurrency', type=int, default=8, help="Clients simultanés")
+        parser.add_argument('--requests', type=int, default=10, help="Requêtes par client et par endpoint")
+        parser.add_argument('--only', action='append', default=[], help="Ne mesurer que les endpoints contenant ce texte (répétable)")
+        parser.add_argument('--warm-cache', action='store_true', help="Garder le cache du tableau de bord entre les requêtes")
+        parser.add_argument('--output', default='bench_concurrency.json', help="Fichier du rapport JSON")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"Utilisateur introuvable: {options['email']} (lancez d'abord seed_scale).")
+        farm = Farm.objects.filter(enterprise__owner=user, is_deleted=False).order_by('enterprise__name', 'name').first()
+        if farm is None:
+            raise CommandError("Aucune ferme pour cet utilisateur (lancez d'abord seed_scale).")
+
+        self.headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        self.options = options
+        results = {}
+        for name, sync_route, async_route, params in ENDPOINTS:
+            if options['only'] and not any(text in name for text in options['only']):
+                continue
+            query = {key: str(value) for key, value in params(farm).items()}
+            results[name] = {
+                'wsgi': self._summary(*self._run_wsgi(reverse(sync_route), query)),
+                'asgi': self._summary(*asyncio.run(self._run_asgi(reverse(async_route), query))),
+            }
+            self._report_line(name, results[name])
+
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'warm_cache': options['warm_cache'],
+                'fanout_workers': fanout.workers(),
+            },
+            'endpoints': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+        self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {options['output']}"))
+
+    def _clear(self):
+        if not self.options['warm_cache']:
+            dashboard_cache.get_cache().clear()
+
+    def _run_wsgi(self, url, query):
+        def client_loop(_):
+            client = Client()
+            timings, failures = [], 0
+            try:
+                for _ in range(self.options['requests']):
+                    self._clear()
+                    start = time.perf_counter()
+                    failures += client.get(url, query, headers=self.headers).status_code != 200
+                    timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+            return timings, failures
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options['concurrency']) as pool:
+            loops = list(pool.map(client_loop, range(self.options['concurrency'])))
+        return loops, time.perf_counter() - start
+
+    async def _run_asgi(self, url, query):
+        async def client_loop():
+            client = AsyncClient()
+            timings, failures = [], 0
+            for _ in range(self.options['requests']):
+                self._clear()
+                start = time.perf_counter()
+                failures += (await client.get(url, query, headers=self.headers)).status_code != 200
+                timings.append((time.perf_counter() - start) * 1000)
+            return timings, failures
+
+        start = time.perf_counter()
+        loops = await asyncio.gather(*(client_loop() for _ in range(self.options['concurrency'])))
+        return loops, time.perf_counter() - start
+
+    def _summary(self, loops, elapsed):
+        timings = sorted(timing for loop_timings, _ in loops for timing in loop_timings)
+        return {
+            'failures': sum(failures for _, failures in loops),
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+        }
+
+    def _report_line(self, name, result):
+        for handler in ('wsgi', 'asgi'):
+            measured = result[handler]
+            line = (
+                f"{name:30} {handler}  p50 {measured['p50_ms']:8.1f} ms  p95 {measured['p95_ms']:8.1f} ms  "
+                f"p99 {measured['p99_ms']:8.1f} ms  {measured['throughput_rps']:7.1f} req/s"
+            )
+            self.stdout.write(self.style.WARNING(f"{line}  ({measured['failures']} échec(s))") if measured['failures'] else line)
@@ -0,0 +1,152 @@
+import statistics
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from apps.core import headcount
+from apps.core.models import BreedingType, Enterprise, Farm, Lot, LotDailyRecord, Species, Unit
+
+BENCH_EMAIL = 'bench-indexes@example.com'
+# --compare drops production indexes: only on databases whose name says they are disposable
+DISPOSABLE_DATABASE_MARKERS = ('test', 'bench')
+
+
+def is_disposable_database(connection):
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return True
+    name = Path(str(connection.settings_dict['NAME'])).name.lower()
+    return any(marker in name for marker in DISPOSABLE_DATABASE_MARKERS)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure plans d'exécution et latences des chemins d'accès de LotDailyRecord, "
+        "avec et sans les index composites. À lancer sur une base de test."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=0, help="Nombre d'enregistrements journaliers à générer (0 = données existantes)")
+        parser.add_argument('--enterprises', type=int, default=10)
+        parser.add_argument('--lots', type=int, default=500, help="Nombre total de lots générés")
+        parser.add_argument('--repeat', type=int, default=7)
+        parser.add_argument('--compare', action='store_true', help="Mesurer aussi sans les index (avant/après); base de test ou de benchmark uniquement")
+
+    def handle(self, *args, **options):
+        if options['compare'] and not is_disposable_database(connection):
+            raise CommandError(
+                f"--compare supprime les index: base « {connection.settings_dict['NAME']} » refusée "
+                "(son nom doit contenir « test » ou « bench »)."
+            )
+        if options['rows']:
+            self._seed(options['rows'], options['enterprises'], options['lots'])
+
+        sample = LotDailyRecord.objects.filter(is_deleted=False).values('enterprise_id', 'farm_id', 'lot_id', 'date').first()
+        if not sample:
+            self.stdout.write(self.style.ERROR("Aucun LotDailyRecord: utilisez --rows pour générer des données."))
+            return
+        total = LotDailyRecord.objects.count()
+        self.stdout.write(f"{total} lignes LotDailyRecord, moteur {connection.vendor}")
+
+        paths = self._access_paths(sample)
+        indexes = list(LotDailyRecord._meta.indexes)
+        before = None
+        if options['compare']:
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(LotDailyRecord, index)
+            try:
+                self._analyze()
+                before = self._measure(paths, options['repeat'])
+            finally:
+                # Even on an error or Ctrl-C, never leave the table without its indexes
+                with connection.schema_editor() as editor:
+                    for index in indexes:
+                        editor.add_index(LotDailyRecord, index)
+        self._analyze()
+        after = self._measure(paths, options['repeat'])
+
+        for label in paths:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            if before:
+                self._report('sans index', before[label])
+            self._report('avec index', after[label])
+
+    def _access_paths(self, sample):
+        since = sample['date'] - timedelta(days=7)
+        alive = LotDailyRecord.objects.filter(is_deleted=False)
+        return {
+            'lot-records: liste entreprise (-date, -created_at, -id)': alive.filter(
+                enterprise_id=sample['enterprise_id']
+            ).order_by('-date', '-created_at', '-id')[:20],
+            'lot-records: lot + plage de dates': alive.filter(
+                lot_id=sample['lot_id'], date__gte=since
+            ).order_by('-date'),
+            'dashboard: ferme sur 7 jours': alive.filter(
+                farm_id=sample['farm_id'], date__gte=since
+            ).values('farm_id').annotate(mortality=Sum('mortality')),
+        }
+
+    def _measure(self, paths, repeat):
+        results = {}
+        for label, queryset in paths.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = {'median_ms': statistics.median(timings), 'plan': queryset.explain()}
+        return results
+
+    def _report(self, title, result):
+        self.stdout.write(f"  {title}: {result['median_ms']:.2f} ms (médiane)")
+        for line in result['plan'].splitlines():
+            self.stdout.write(f"    {line}")
+
+    def _analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _seed(self, rows, enterprise_count, lot_count):
+        User = get_user_model()
+        user, created = User.objects.get_or_create(email=BENCH_EMAIL)
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        breeding_type, _ = BreedingType.objects.get_or_create(code='BENCH', defaults={'name': 'Benchmark'})
+        species, _ = Species.objects.get_or_create(code='BENCH', defaults={'name': 'Benchmark', 'breeding_type': breeding_type})
+
+        lots = []
+        lots_per_enterprise = max(lot_count // enterprise_count, 1)
+        for index in range(enterprise_count):
+            enterprise = Enterprise.objects.create(name=f'Bench {index}', owner=user)
+            farm = Farm.objects.create(name=f'Bench {index}', enterprise=enterprise)
+            unit = Unit.objects.create(name='Bench', farm=farm, breeding_type=breeding_type, capacity=lots_per_enterprise)
+            batch = Lot.objects.bulk_create([
+                Lot(unit=unit, species=species, code=f'B{index}-{lot}', entry_date=date(2020, 1, 1), initial_count=1000)
+                for lot in range(lots_per_enterprise)
+            ])
+            lots.extend((lot, farm.id, enterprise.id) for lot in batch)
+
+        days = max(rows // len(lots), 1)
+        first_day = date.today() - timedelta(days=days)
+        pending = []
+        created_rows = 0
+        for lot, farm_id, enterprise_id in lots:
+            for offset in range(days):
+                pending.append(LotDailyRecord(
+                    lot=lot, farm_id=farm_id, enterprise_id=enterprise_id, date=first_day + timedelta(days=offset),
+                    mortality=offset % 3, feed_intake_kg=100, avg_weight_kg=offset / 100,
+                ))
+            if len(pending) >= 20000:
+                LotDailyRecord.objects.bulk_create(pending, batch_size=5000)
+                created_rows += len(pending)
+                pending = []
+        LotDailyRecord.objects.bulk_create(pending, batch_size=5000)
+        created_rows += len(pending)
+        headcount.recount(farm_ids={farm_id for _, farm_id, _ in lots})
+        self.stdout.write(f"{created_rows} enregistrements générés sur {len(lots)} lots.")
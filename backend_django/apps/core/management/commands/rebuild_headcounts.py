@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import headcount
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'effectif courant et la mortalité cumulée des lots à partir des relevés journaliers et des archives"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm-id', action='append', dest='farm_ids', help="Limiter à une ferme (répétable)")
+        parser.add_argument('--check-only', action='store_true', help="Vérifier sans recalculer")
+
+    def handle(self, *args, **options):
+        farm_ids = options['farm_ids']
+        mismatches = headcount.diff(farm_ids=farm_ids)
+        for lot_id, stored, expected in mismatches[:20]:
+            self.stdout.write(self.style.WARNING(f"Écart: lot {lot_id} mortalité enregistrée {stored}, attendue {expected}"))
+
+        if options['check_only']:
+            if mismatches:
+                self.stdout.write(self.style.ERROR(f"{len(mismatches)} lot(s) avec un effectif incohérent."))
+            else:
+                self.stdout.write(self.style.SUCCESS("Effectifs cohérents avec les relevés."))
+            return
+
+        recounted = headcount.recount(farm_ids=farm_ids)
+        self.stdout.write(self.style.SUCCESS(f"{recounted} lot(s) recalculé(s), {len(mismatches)} écart(s) corrigé(s)."))
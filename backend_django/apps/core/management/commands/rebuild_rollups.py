@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import rollups
+from apps.core.models import Farm
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les rollups journaliers (DailyRollup) et les vérifie contre les tables brutes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm-id', action='append', dest='farm_ids', help="Limiter à une ferme (répétable)")
+        parser.add_argument('--check-only', action='store_true', help="Vérifier sans reconstruire")
+
+    def handle(self, *args, **options):
+        farm_ids = options['farm_ids'] or list(Farm.all_objects.values_list('id', flat=True))
+        check_only = options['check_only']
+
+        rebuilt = 0
+        mismatched = 0
+        for farm_id in farm_ids:
+            if not check_only:
+                rebuilt += rollups.rebuild(farm_ids=[farm_id])
+            mismatches = rollups.diff(farm_ids=[farm_id])
+            mismatched += len(mismatches)
+            for _, lot_id, day in mismatches[:20]:
+                self.stdout.write(self.style.WARNING(f"Écart: ferme {farm_id} lot {lot_id} date {day}"))
+
+        if not check_only:
+            self.stdout.write(f"{rebuilt} lignes de rollup reconstruites pour {len(farm_ids)} ferme(s).")
+        if mismatched:
+            self.stdout.write(self.style.ERROR(f"{mismatched} écart(s) entre rollups et tables brutes."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Rollups cohérents avec les tables brutes."))
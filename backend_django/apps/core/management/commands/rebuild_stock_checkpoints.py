@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import stock
+from apps.core.models import StockItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les points de contrôle mensuels des stocks depuis le registre des mouvements "
+        "et signale les écarts avec les quantités enregistrées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm-id', action='append', dest='farm_ids', help="Limiter à une ferme (répétable)")
+        parser.add_argument('--check-only', action='store_true', help="Vérifier sans réécrire")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Articles traités par lot")
+
+    def handle(self, *args, **options):
+        items = StockItem.all_objects.order_by('pk')
+        if options['farm_ids']:
+            items = items.filter(farm_id__in=options['farm_ids'])
+        check_only = options['check_only']
+        chunk_size = options['chunk_size']
+
+        processed = checkpoints = drifted = 0
+        last_pk = None
+        while True:
+            chunk = items if last_pk is None else items.filter(pk__gt=last_pk)
+            chunk = list(chunk.values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                break
+            for item_id in chunk:
+                drift, count = stock.rebuild_checkpoints(item_id, check_only=check_only)
+                processed += 1
+                checkpoints += count
+                if drift:
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(f"Écart: article {item_id} quantité enregistrée - registre = {drift}"))
+            last_pk = chunk[-1]
+
+        if not check_only:
+            self.stdout.write(f"{checkpoints} points de contrôle recalculés pour {processed} article(s).")
+        if drifted:
+            verb = "détecté(s)" if check_only else "corrigé(s)"
+            self.stdout.write(self.style.ERROR(f"{drifted} écart(s) de stock {verb}."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Stocks cohérents avec le registre des mouvements."))
@@ -0,0 +1,309 @@
+import io
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.utils import timezone
+
+from apps.core import headcount, rollups
+from apps.core.models import (
+    BreedingType, DailyRollup, Enterprise, Farm, FinancialEntry, HealthEvent, Lot, LotDailyRecord, Membership, ReproductionEvent,
+    Species, StockItem, StockMovement, Unit,
+)
+
+SCALE_EMAIL = 'scale@example.com'
+
+# Production profiles: headcount, survival, growth and yields per head and per day
+PROFILES = {
+    'POU-CHAIR': {
+        'breeding_type': ('CHICKEN', 'Poulet'), 'name': 'Poulet de chair', 'head': (2000, 8000), 'cycle': 45,
+        'mortality': 0.0015, 'weight': (0.045, 0.06, 2.8), 'feed_per_kg': 0.09, 'eggs': 0, 'milk': 0,
+        'feed_price': 0.45, 'sale_price': 2.1,
+    },
+    'POU-POND': {
+        'breeding_type': ('CHICKEN', 'Poulet'), 'name': 'Poulet pondeuse', 'head': (1000, 5000), 'cycle': 500,
+        'mortality': 0.0003, 'weight': (1.4, 0.002, 2.0), 'feed_per_kg': 0.065, 'eggs': 0.85, 'milk': 0,
+        'feed_price': 0.42, 'sale_price': 0.12,
+    },
+    'POR-CHAR': {
+        'breeding_type': ('POR', 'Porcin'), 'name': 'Porc charcutier', 'head': (80, 400), 'cycle': 160,
+        'mortality': 0.0002, 'weight': (25.0, 0.8, 120.0), 'feed_per_kg': 0.035, 'eggs': 0, 'milk': 0,
+        'feed_price': 0.32, 'sale_price': 1.7,
+    },
+    'BOV-LAIT': {
+        'breeding_type': ('BOV', 'Bovin'), 'name': 'Bovin laitier', 'head': (30, 150), 'cycle': 3650,
+        'mortality': 0.00005, 'weight': (600.0, 0.0, 650.0), 'feed_per_kg': 0.03, 'eggs': 0, 'milk': 24.0,
+        'feed_price': 0.25, 'sale_price': 0.4,
+    },
+}
+HEALTH_EVENTS = ('vaccination', 'treatment', 'disease')
+REPRODUCTION_EVENTS = ('insemination', 'gestation_check', 'mise_bas')
+
+
+class RowWriter:
+    """Batched inserts of plain column values.
+
+    ``bulk_create`` spends most of its time building model instances and
+    compiling every batch; here rows are tuples in column order and only keys,
+    dates and timestamps go through the backend adapters. PostgreSQL loads the
+    batches with COPY, other backends with ``executemany``.
+    """
+
+    def __init__(self, batch_size, using=DEFAULT_DB_ALIAS):
+        self.batch_size = batch_size
+        self.connection = connections[using]
+        self.now = timezone.now()
+        self.pending = {}
+        self.plans = {}
+        self.counts = {}
+        if self.connection.vendor == 'sqlite':
+            # Random UUID keys touch index pages all over the file; keep them in memory
+            with self.connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size = -262144')
+
+    def _plan(self, model):
+        if model not in self.plans:
+            fields = model._meta.concrete_fields
+            columns = []
+            for field in fields:
+                adapt = isinstance(field, (models.UUIDField, models.ForeignKey, models.DateField))
+                if field.primary_key:
+                    default = uuid.uuid4
+                elif isinstance(field, models.DateTimeField) and (field.auto_now or field.auto_now_add):
+                    default, adapt = field.get_db_prep_value(self.now, self.connection), False
+                else:
+                    default = field.get_default()
+                columns.append((field.attname, default, field.get_db_prep_value if adapt else None))
+            self.plans[model] = (columns, [field.column for field in fields])
+        return self.plans[model]
+
+    def add(self, model, values):
+        columns, _ = self._plan(model)
+        row = []
+        for attname, default, adapt in columns:
+            value = values[attname] if attname in values else (default() if callable(default) else default)
+            row.append(adapt(value, self.connection) if adapt and value is not None else value)
+        batch = self.pending.setdefault(model, [])
+        batch.append(row)
+        if len(batch) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for pending_model in [model] if model else list(self.pending):
+            rows = self.pending.pop(pending_model, [])
+            if rows:
+                self._insert(pending_model, rows)
+                self.counts[pending_model.__name__] = self.counts.get(pending_model.__name__, 0) + len(rows)
+
+    def _insert(self, model, rows):
+        _, column_names = self._plan(model)
+        quote = self.connection.ops.quote_name
+        target = f'{quote(model._meta.db_table)} ({", ".join(quote(name) for name in column_names)})'
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == 'postgresql':
+                cursor.copy_expert(f'COPY {target} FROM STDIN', io.StringIO(''.join(_copy_line(row) for row in rows)))
+            else:
+                cursor.executemany(f'INSERT INTO {target} VALUES ({", ".join(["%s"] * len(column_names))})', rows)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_line(row):
+    """One row in COPY text format."""
+    return '\t'.join(_copy_value(value) for value in row) + '\n'
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données volumineux et cohérent (entreprises, fermes, unités, lots, relevés "
+        "journaliers, évènements, finances, stocks) par insertion en masse (COPY sur PostgreSQL, executemany "
+        "ailleurs). À lancer sur une base de test."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enterprises', type=int, default=2)
+        parser.add_argument('--farms', type=int, default=2, help="Fermes par entreprise")
+        parser.add_argument('--units', type=int, default=4, help="Unités par ferme")
+        parser.add_argument('--lots-per-unit', type=int, default=3)
+        parser.add_argument('--days', type=int, default=365, help="Jours d'historique")
+        parser.add_argument('--events-per-lot', type=int, default=6, help="Évènements sanitaires (et de reproduction) par lot")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help="Graine aléatoire (même graine = mêmes données)")
+        parser.add_argument('--email', default=SCALE_EMAIL, help="Propriétaire des entreprises générées")
+        parser.add_argument('--skip-rollups', action='store_true', help="Ne pas reconstruire les rollups journaliers")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.writer = RowWriter(options['batch_size'])
+        self.today = date.today()
+        self.first_day = self.today - timedelta(days=options['days'])
+        start = time.perf_counter()
+
+        user = self._user(options['email'])
+        species = self._species()
+        farm_ids = []
+        for enterprise_index in range(options['enterprises']):
+            enterprise = Enterprise.objects.create(name=f'Scale {enterprise_index:03}', owner=user)
+            Membership.objects.create(user=user, enterprise=enterprise, role='owner')
+            for farm_index in range(options['farms']):
+                farm = Farm.objects.create(name=f'Ferme {enterprise_index:03}-{farm_index:02}', enterprise=enterprise)
+                with transaction.atomic():
+                    self._seed_farm(farm, species, options)
+                    self.writer.flush()
+                    # Neither bulk_create nor the row writer fires signals
+                    headcount.recount(farm_ids=[farm.id])
+                farm_ids.append(farm.id)
+                self._progress(start)
+
+        if not options['skip_rollups']:
+            # The farms are new, so computed rollups are only inserted, never replaced
+            for farm_id in farm_ids:
+                with transaction.atomic():
+                    for (rollup_farm_id, lot_id, day), values in rollups.compute(farm_ids=[farm_id]).items():
+                        self.writer.add(DailyRollup, {'farm_id': rollup_farm_id, 'lot_id': lot_id, 'date': day, **values})
+                    self.writer.flush()
+        total = sum(self.writer.counts.values())
+        elapsed = time.perf_counter() - start
+        for model, count in sorted(self.writer.counts.items()):
+            self.stdout.write(f"  {model}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} lignes générées en {elapsed:.1f} s ({total / max(elapsed, 0.001):.0f} lignes/s) pour {options['email']}."
+        ))
+
+    def _user(self, email):
+        user, created = get_user_model().objects.get_or_create(email=email)
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        return user
+
+    def _species(self):
+        species = {}
+        for code, profile in PROFILES.items():
+            breeding_code, breeding_name = profile['breeding_type']
+            breeding_type, _ = BreedingType.objects.get_or_create(code=breeding_code, defaults={'name': breeding_name})
+            species[code], _ = Species.objects.get_or_create(
+                code=code, defaults={'name': profile['name'], 'breeding_type': breeding_type}
+            )
+        return species
+
+    def _seed_farm(self, farm, species, options):
+        scope = {'farm_id': farm.id, 'enterprise_id': farm.enterprise_id}
+        feed = StockItem(farm=farm, name='Aliment', item_type='feed', unit='kg', alert_threshold=500)
+        meds = StockItem(farm=farm, name='Médicaments', item_type='med', unit='dose', alert_threshold=20)
+        StockItem.objects.bulk_create([feed, meds])
+        farm_feed = {}
+        med_doses = {}
+
+        codes = list(PROFILES)
+        units = Unit.objects.bulk_create([
+            Unit(
+                farm=farm, name=f'Bâtiment {index + 1}', species=species[codes[index % len(codes)]],
+                breeding_type_id=species[codes[index % len(codes)]].breeding_type_id, capacity=10000,
+            )
+            for index in range(options['units'])
+        ])
+        for unit in units:
+            profile = PROFILES[unit.species.code]
+            lots_per_unit = options['lots_per_unit']
+            spacing = max(options['days'] // lots_per_unit, 1)
+            for lot_index in range(lots_per_unit):
+                entry_date = self.first_day + timedelta(days=lot_index * spacing)
+                end_date = min(entry_date + timedelta(days=profile['cycle']), self.today)
+                closed = end_date < self.today
+                lot = Lot(
+                    unit=unit, species=unit.species, code=f'{unit.species.code}-{lot_index + 1:03}', entry_date=entry_date,
+                    initial_count=self.random.randint(*profile['head']),
+                    status='closed' if closed else 'active', destination='production',
+                    # bulk_create skips Lot.save, which stamps closed_at; archiving selects on it
+                    closed_at=timezone.make_aware(datetime.combine(end_date, datetime.min.time())) if closed else None,
+                )
+                Lot.objects.bulk_create([lot])
+                self.writer.counts['Lot'] = self.writer.counts.get('Lot', 0) + 1
+                self._seed_lot(lot, profile, end_date, scope, farm_feed, med_doses, options['events_per_lot'])
+
+        self._seed_stock(feed, farm_feed, 1000)
+        self._seed_stock(meds, med_doses, 50)
+
+    def _seed_lot(self, lot, profile, end_date, scope, farm_feed, med_doses, events_per_lot):
+        rnd = self.random
+        head = lot.initial_count
+        start_weight, daily_gain, max_weight = profile['weight']
+        days = (end_date - lot.entry_date).days
+        feed_cost = 0.0
+        produce = 0.0
+        for age in range(days):
+            day = lot.entry_date + timedelta(days=age)
+            expected = head * profile['mortality'] * rnd.uniform(0, 2)
+            mortality = min(int(expected) + (rnd.random() < expected % 1), head)
+            head -= mortality
+            weight = min(start_weight + daily_gain * age, max_weight) * rnd.uniform(0.97, 1.03)
+            feed = head * weight * profile['feed_per_kg'] * rnd.uniform(0.9, 1.1)
+            eggs = int(head * profile['eggs'] * rnd.uniform(0.9, 1.05))
+            milk = head * profile['milk'] * rnd.uniform(0.85, 1.1)
+            feed_cost += feed * profile['feed_price']
+            produce += eggs + milk
+            farm_feed[day] = farm_feed.get(day, 0.0) + feed
+            self.writer.add(LotDailyRecord, {
+                'lot_id': lot.id, 'date': day, 'mortality': mortality, 'feed_intake_kg': round(feed, 2), 'eggs_count': eggs,
+                'milk_production_l': round(milk, 2), 'avg_weight_kg': round(weight, 3) if age % 7 == 0 else 0, **scope,
+            })
+            # Monthly feed invoice
+            if day.day == 28 or age == days - 1:
+                self.writer.add(FinancialEntry, {
+                    'farm_id': scope['farm_id'], 'lot_id': lot.id, 'date': day, 'entry_type': 'cost', 'category': 'feed',
+                    'amount': round(feed_cost, 2),
+                })
+                feed_cost = 0.0
+
+        if days:
+            revenue = produce * profile['sale_price'] if produce else head * weight * profile['sale_price']
+            self.writer.add(FinancialEntry, {
+                'farm_id': scope['farm_id'], 'lot_id': lot.id, 'date': end_date - timedelta(days=1), 'entry_type': 'revenue',
+                'category': 'sale', 'amount': round(revenue, 2),
+            })
+        for _ in range(events_per_lot if days else 0):
+            day = lot.entry_date + timedelta(days=rnd.randrange(days))
+            event_type = rnd.choice(HEALTH_EVENTS)
+            self.writer.add(HealthEvent, {
+                'lot_id': lot.id, 'date': day, 'event_type': event_type,
+                'product': 'Vaccin' if event_type == 'vaccination' else 'Traitement', **scope,
+            })
+            med_doses[day] = med_doses.get(day, 0) + 1
+            self.writer.add(FinancialEntry, {
+                'farm_id': scope['farm_id'], 'lot_id': lot.id, 'date': day, 'entry_type': 'cost', 'category': 'vet',
+                'amount': rnd.randint(20, 200),
+            })
+            if profile['milk']:
+                self.writer.add(ReproductionEvent, {
+                    'lot_id': lot.id, 'date': day, 'event_type': rnd.choice(REPRODUCTION_EVENTS), 'born_alive': rnd.randint(0, 2),
+                    **scope,
+                })
+
+    def _seed_stock(self, item, consumption, delivery_days):
+        """Daily consumption outs plus deliveries whenever the projected balance runs low."""
+        scope = {'stock_item_id': item.id, 'farm_id': item.farm_id, 'enterprise_id': item.farm.enterprise_id}
+        balance = 0.0
+        for day in sorted(consumption):
+            used = round(consumption[day], 3)
+            if balance < used:
+                delivered = round(max(used * delivery_days, 1), 3)
+                self.writer.add(StockMovement, {'movement_type': 'in', 'quantity': delivered, 'date': day, 'reason': 'Livraison', **scope})
+                balance += delivered
+            self.writer.add(StockMovement, {'movement_type': 'out', 'quantity': used, 'date': day, 'reason': 'Consommation', **scope})
+            balance -= used
+        StockItem.objects.filter(pk=item.pk).update(quantity=round(balance, 3))
+
+    def _progress(self, start):
+        total = sum(self.writer.counts.values())
+        self.stdout.write(f"{total} lignes ({time.perf_counter() - start:.1f} s)")
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.11 on 2026-10-18
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+import uuid
+
+
+def backfill(apps, schema_editor):
+    LotDailyRecord = apps.get_model('core', 'LotDailyRecord')
+    FinancialEntry = apps.get_model('core', 'FinancialEntry')
+    DailyRollup = apps.get_model('core', 'DailyRollup')
+
+    def empty():
+        return {
+            'record_count': 0, 'mortality': 0, 'feed_intake_kg': Decimal('0'), 'milk_production_l': Decimal('0'),
+            'eggs_count': 0, 'avg_weight_kg': None, 'entry_count': 0, 'revenue': Decimal('0'), 'cost': Decimal('0'),
+        }
+
+    rows = {}
+    records = LotDailyRecord.objects.filter(is_deleted=False, lot__is_deleted=False).order_by().values_list(
+        'lot__unit__farm_id', 'lot_id', 'date', 'mortality', 'feed_intake_kg', 'milk_production_l', 'eggs_count', 'avg_weight_kg'
+    )
+    for farm_id, lot_id, day, mortality, feed, milk, eggs, weight in records.iterator(chunk_size=1000):
+        rows.setdefault((farm_id, lot_id, day), empty()).update(
+            record_count=1, mortality=mortality, feed_intake_kg=feed, milk_production_l=milk, eggs_count=eggs, avg_weight_kg=weight
+        )
+
+    entries = FinancialEntry.objects.filter(Q(lot__isnull=True) | Q(lot__is_deleted=False), is_deleted=False)
+    totals = entries.order_by().values('farm_id', 'lot_id', 'date').annotate(
+        entry_count=Count('id'),
+        revenue=Sum('amount', filter=Q(entry_type='revenue')),
+        cost=Sum('amount', filter=Q(entry_type='cost')),
+    )
+    for row in totals:
+        rows.setdefault((row['farm_id'], row['lot_id'], row['date']), empty()).update(
+            entry_count=row['entry_count'], revenue=row['revenue'] or Decimal('0'), cost=row['cost'] or Decimal('0')
+        )
+
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(id=uuid.uuid4(), farm_id=farm_id, lot_id=lot_id, date=day, **values) for (farm_id, lot_id, day), values in rows.items()],
+        batch_size=1000,
+    )
+
+
+def unfill(apps, schema_editor):
+    apps.get_model('core', 'DailyRollup').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_seed_breeding_species'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('mortality', models.PositiveIntegerField(default=0)),
+                ('feed_intake_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('milk_production_l', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('eggs_count', models.PositiveIntegerField(default=0)),
+                ('avg_weight_kg', models.DecimalField(blank=True, decimal_places=3, max_digits=10, null=True)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.farm')),
+                ('lot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.lot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['farm', 'date'], name='core_rollup_farm_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('farm', 'lot', 'date'), name='core_rollup_farm_lot_date_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('lot__isnull', True)), fields=('farm', 'date'), name='core_rollup_farm_date_nolot_uniq'),
+        ),
+        migrations.RunPython(backfill, unfill),
+    ]
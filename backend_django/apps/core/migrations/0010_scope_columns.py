@@ -0,0 +1,81 @@
+# Generated by Django 4.2.11 on 2026-10-18
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def _backfill(model, parent_model, fk, farm_path):
+    parent_ids = list(parent_model.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(parent_ids), BATCH_SIZE):
+        batch = parent_ids[start:start + BATCH_SIZE]
+        groups = defaultdict(list)
+        rows = parent_model.objects.filter(pk__in=batch).values_list('pk', f'{farm_path}_id', f'{farm_path}__enterprise_id')
+        for pk, farm_id, enterprise_id in rows:
+            groups[(farm_id, enterprise_id)].append(pk)
+        for (farm_id, enterprise_id), pks in groups.items():
+            model.objects.filter(**{f'{fk}_id__in': pks}).update(
+                farm_id=farm_id, enterprise_id=enterprise_id
+            )
+
+
+def forwards(apps, schema_editor):
+    Lot = apps.get_model('core', 'Lot')
+    StockItem = apps.get_model('core', 'StockItem')
+    for name in ('LotDailyRecord', 'HealthEvent', 'ReproductionEvent'):
+        _backfill(apps.get_model('core', name), Lot, 'lot', 'unit__farm')
+    _backfill(apps.get_model('core', 'StockMovement'), StockItem, 'stock_item', 'farm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lotdailyrecord',
+            name='farm',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.farm'),
+        ),
+        migrations.AddField(
+            model_name='lotdailyrecord',
+            name='enterprise',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.enterprise'),
+        ),
+        migrations.AddField(
+            model_name='healthevent',
+            name='farm',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.farm'),
+        ),
+        migrations.AddField(
+            model_name='healthevent',
+            name='enterprise',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.enterprise'),
+        ),
+        migrations.AddField(
+            model_name='reproductionevent',
+            name='farm',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.farm'),
+        ),
+        migrations.AddField(
+            model_name='reproductionevent',
+            name='enterprise',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.enterprise'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='farm',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.farm'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='enterprise',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.enterprise'),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_scope_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farm',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', 'name'], name='core_farm_ent_name_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='financialentry',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['farm', '-date', '-created_at'], name='core_fin_farm_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='financialentry',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['lot', '-date'], name='core_fin_lot_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='healthevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at'], name='core_hev_ent_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='healthevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['lot', '-date'], name='core_hev_lot_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['unit', 'status'], name='core_lot_unit_status_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at'], name='core_lot_created_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='lotdailyrecord',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at'], name='core_ldr_ent_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='lotdailyrecord',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['farm', 'date'], name='core_ldr_farm_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='reproductionevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at'], name='core_rev_ent_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='reproductionevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['lot', '-date', '-created_at'], name='core_rev_lot_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at'], name='core_smv_ent_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['farm', '-date'], name='core_smv_farm_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['stock_item', '-date'], name='core_smv_item_date_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['farm', 'name'], name='core_unit_farm_name_alive'),
+        ),
+    ]
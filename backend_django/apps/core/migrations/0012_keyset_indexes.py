@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='financialentry',
+            name='core_fin_farm_date_alive',
+        ),
+        migrations.RemoveIndex(
+            model_name='healthevent',
+            name='core_hev_ent_date_alive',
+        ),
+        migrations.RemoveIndex(
+            model_name='lotdailyrecord',
+            name='core_ldr_ent_date_alive',
+        ),
+        migrations.RemoveIndex(
+            model_name='reproductionevent',
+            name='core_rev_ent_date_alive',
+        ),
+        migrations.RemoveIndex(
+            model_name='stockmovement',
+            name='core_smv_ent_date_alive',
+        ),
+        migrations.AddIndex(
+            model_name='financialentry',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['farm', '-date', '-created_at', '-id'], name='core_fin_farm_keyset_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='healthevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at', '-id'], name='core_hev_ent_keyset_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='lotdailyrecord',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at', '-id'], name='core_ldr_ent_keyset_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='reproductionevent',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at', '-id'], name='core_rev_ent_keyset_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['enterprise', '-date', '-created_at', '-id'], name='core_smv_ent_keyset_alive'),
+        ),
+    ]
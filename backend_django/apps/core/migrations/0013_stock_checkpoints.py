@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(choices=[('opening', 'Opening'), ('month_end', 'Month end')], default='month_end', max_length=10)),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('stock_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='core.stockitem')),
+            ],
+            options={
+                'ordering': ['stock_item', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('stock_item', 'date'), name='core_stockcp_item_date_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'opening')), fields=('stock_item',), name='core_stockcp_item_opening_uniq'),
+        ),
+    ]
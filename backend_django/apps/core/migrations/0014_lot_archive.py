@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def forwards(apps, schema_editor):
+    # Best guess for lots closed before closed_at existed
+    Lot = apps.get_model('core', 'Lot')
+    Lot.objects.filter(status='closed', closed_at__isnull=True).update(closed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_stock_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lot',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='LotArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('data', models.BinaryField()),
+                ('row_counts', models.JSONField(default=dict)),
+                ('summary', models.JSONField(default=dict)),
+                ('lot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='core.lot')),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:10
+
+from django.db import migrations, models
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce
+
+
+def forwards(apps, schema_editor):
+    # Same computation as apps.core.headcount.recount, on the historical models
+    Lot = apps.get_model('core', 'Lot')
+    LotArchive = apps.get_model('core', 'LotArchive')
+    LotDailyRecord = apps.get_model('core', 'LotDailyRecord')
+    records = (
+        LotDailyRecord.objects.filter(lot_id=models.OuterRef('pk'), is_deleted=False)
+        .values('lot_id')
+        .annotate(total=models.Sum('mortality'))
+        .values('total')
+    )
+    archived = LotArchive.objects.filter(lot_id=models.OuterRef('pk')).values(
+        total=Cast(KT('summary__mortality'), models.IntegerField())
+    )
+    mortality = Coalesce(models.Subquery(records), 0) + Coalesce(models.Subquery(archived), 0)
+    Lot.objects.update(cumulative_mortality=mortality, current_count=models.F('initial_count') - mortality)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_lot_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lot',
+            name='cumulative_mortality',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lot',
+            name='current_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
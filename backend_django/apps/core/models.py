@@ -1,13 +1,18 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 
 from apps.common.models import UUIDModel, TimeStampedModel, SoftDeleteModel, SoftDeleteManager
 
+# Every API read filters on is_deleted=False; partial indexes skip soft-deleted rows
+ALIVE = models.Q(is_deleted=False)
+
 
 class Enterprise(UUIDModel, TimeStampedModel, SoftDeleteModel):
     name = models.CharField(max_length=255)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='owned_enterprises', on_delete=models.CASCADE)
 
+    soft_delete_cascade = ('farms', 'memberships')
     objects = SoftDeleteManager()
 
     def __str__(self):
@@ -19,8 +24,14 @@ class Farm(UUIDModel, TimeStampedModel, SoftDeleteModel):
     name = models.CharField(max_length=255)
     location = models.CharField(max_length=255, blank=True)
 
+    soft_delete_cascade = ('units', 'stock_items', 'financial_entries')
     objects = SoftDeleteManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['enterprise', 'name'], condition=ALIVE, name='core_farm_ent_name_alive'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -70,12 +81,69 @@ class Unit(UUIDModel, TimeStampedModel, SoftDeleteModel):
     capacity = models.PositiveIntegerField()
     conditions = models.JSONField(default=dict, blank=True)
 
+    soft_delete_cascade = ('lots',)
     objects = SoftDeleteManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['farm', 'name'], condition=ALIVE, name='core_unit_farm_name_alive'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class ScopedModel(models.Model):
+    """Leaf row carrying denormalized ``farm``/``enterprise`` ids.
+
+    The ids are copied from ``scope_parent`` (a Lot or a StockItem) on save and
+    by ``fill_scope`` for bulk paths, so scope filters need no join chain.
+    """
+
+    SCOPE_FARM_PATHS = {'lot': 'unit__farm', 'stock_item': 'farm'}
+    scope_parent = 'lot'
+
+    farm = models.ForeignKey('Farm', related_name='+', on_delete=models.CASCADE, null=True, editable=False)
+    enterprise = models.ForeignKey('Enterprise', related_name='+', on_delete=models.CASCADE, null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def scope_for(cls, parent_ids):
+        """Return {parent_id: (farm_id, enterprise_id)} in a single query."""
+        parent_model = cls._meta.get_field(cls.scope_parent).related_model
+        farm_path = cls.SCOPE_FARM_PATHS[cls.scope_parent]
+        rows = parent_model.all_objects.filter(pk__in=set(parent_ids)).values_list(
+            'pk', f'{farm_path}_id', f'{farm_path}__enterprise_id'
+        )
+        return {pk: (farm_id, enterprise_id) for pk, farm_id, enterprise_id in rows}
+
+    @classmethod
+    def fill_scope(cls, objs):
+        attname = f'{cls.scope_parent}_id'
+        scopes = cls.scope_for(getattr(obj, attname) for obj in objs)
+        for obj in objs:
+            obj._scope_parent_id = getattr(obj, attname)
+            obj.farm_id, obj.enterprise_id = scopes.get(obj._scope_parent_id, (None, None))
+        return objs
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._scope_parent_id = instance.__dict__.get(f'{cls.scope_parent}_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        parent_id = getattr(self, f'{self.scope_parent}_id')
+        if self.farm_id is None or parent_id != getattr(self, '_scope_parent_id', None):
+            self.fill_scope([self])
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'farm', 'enterprise'}
+        super().save(*args, **kwargs)
+
+
 class Lot(UUIDModel, TimeStampedModel, SoftDeleteModel):
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -89,17 +157,55 @@ class Lot(UUIDModel, TimeStampedModel, SoftDeleteModel):
     initial_count = models.PositiveIntegerField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     destination = models.CharField(max_length=100, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Maintained from the daily records by apps.core.headcount
+    cumulative_mortality = models.PositiveIntegerField(default=0, editable=False)
+    current_count = models.IntegerField(default=0, editable=False)
 
+    # Stock movements and financial entries only lose their lot (SET_NULL), so they are kept
+    soft_delete_cascade = ('daily_records', 'health_events', 'reproduction_events')
     objects = SoftDeleteManager()
 
     class Meta:
         unique_together = ('unit', 'code')
+        indexes = [
+            models.Index(fields=['unit', 'status'], condition=ALIVE, name='core_lot_unit_status_alive'),
+            models.Index(fields=['-created_at'], condition=ALIVE, name='core_lot_created_alive'),
+        ]
 
     def __str__(self):
         return self.code
 
-
-class LotDailyRecord(UUIDModel, TimeStampedModel, SoftDeleteModel):
+    def save(self, *args, **kwargs):
+        # closed_at follows status so archiving can pick lots closed long enough ago
+        closed_at = self.closed_at
+        if self.status == 'closed' and self.closed_at is None:
+            self.closed_at = timezone.now()
+        elif self.status != 'closed':
+            self.closed_at = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.closed_at != closed_at:
+            kwargs['update_fields'] = update_fields = {*update_fields, 'closed_at'}
+        if self._state.adding:
+            self.current_count = self.initial_count - self.cumulative_mortality
+            super().save(*args, **kwargs)
+            return
+
+        # The counters move with daily records through SQL updates: never write back a stale copy
+        if update_fields is None:
+            update_fields = {field.name for field in self._meta.concrete_fields if not field.primary_key}
+        update_fields = set(update_fields) - {'cumulative_mortality', 'current_count'}
+        recount = 'initial_count' in update_fields
+        if recount:
+            self.current_count = self.initial_count - models.F('cumulative_mortality')
+            update_fields.add('current_count')
+        kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        if recount:
+            self.refresh_from_db(fields=['cumulative_mortality', 'current_count'])
+
+
+class LotDailyRecord(UUIDModel, TimeStampedModel, SoftDeleteModel, ScopedModel):
     lot = models.ForeignKey(Lot, related_name='daily_records', on_delete=models.CASCADE)
     date = models.DateField()
     mortality = models.PositiveIntegerField(default=0)
@@ -114,12 +220,21 @@ class LotDailyRecord(UUIDModel, TimeStampedModel, SoftDeleteModel):
     class Meta:
         unique_together = ('lot', 'date')
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['enterprise', '-date', '-created_at', '-id'], condition=ALIVE, name='core_ldr_ent_keyset_alive'),
+            models.Index(fields=['farm', 'date'], condition=ALIVE, name='core_ldr_farm_date_alive'),
+        ]
 
     def __str__(self):
         return f"{self.lot.code} {self.date}"
 
+    def save(self, *args, **kwargs):
+        # The post_save signals move the lot's headcount: commit both or neither
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
-class HealthEvent(UUIDModel, TimeStampedModel, SoftDeleteModel):
+class HealthEvent(UUIDModel, TimeStampedModel, SoftDeleteModel, ScopedModel):
     EVENT_TYPES = (
         ('vaccination', 'Vaccination'),
         ('treatment', 'Treatment'),
@@ -138,12 +253,16 @@ class HealthEvent(UUIDModel, TimeStampedModel, SoftDeleteModel):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['enterprise', '-date', '-created_at', '-id'], condition=ALIVE, name='core_hev_ent_keyset_alive'),
+            models.Index(fields=['lot', '-date'], condition=ALIVE, name='core_hev_lot_date_alive'),
+        ]
 
     def __str__(self):
         return f"{self.event_type} {self.date}"
 
 
-class ReproductionEvent(UUIDModel, TimeStampedModel, SoftDeleteModel):
+class ReproductionEvent(UUIDModel, TimeStampedModel, SoftDeleteModel, ScopedModel):
     EVENT_TYPES = (
         ('insemination', 'Insémination'),
         ('saillie', 'Saillie'),
@@ -163,6 +282,10 @@ class ReproductionEvent(UUIDModel, TimeStampedModel, SoftDeleteModel):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['enterprise', '-date', '-created_at', '-id'], condition=ALIVE, name='core_rev_ent_keyset_alive'),
+            models.Index(fields=['lot', '-date', '-created_at'], condition=ALIVE, name='core_rev_lot_date_alive'),
+        ]
 
     def __str__(self):
         return f"{self.event_type} {self.date}"
@@ -194,6 +317,10 @@ class FinancialEntry(UUIDModel, TimeStampedModel, SoftDeleteModel):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['farm', '-date', '-created_at', '-id'], condition=ALIVE, name='core_fin_farm_keyset_alive'),
+            models.Index(fields=['lot', '-date'], condition=ALIVE, name='core_fin_lot_date_alive'),
+        ]
 
     def __str__(self):
         return f"{self.entry_type} {self.amount}"
@@ -213,6 +340,7 @@ class StockItem(UUIDModel, TimeStampedModel, SoftDeleteModel):
     unit = models.CharField(max_length=20, default='kg')
     alert_threshold = models.DecimalField(max_digits=12, decimal_places=3, default=0)
 
+    soft_delete_cascade = ('movements',)
     objects = SoftDeleteManager()
 
     class Meta:
@@ -222,12 +350,14 @@ class StockItem(UUIDModel, TimeStampedModel, SoftDeleteModel):
         return self.name
 
 
-class StockMovement(UUIDModel, TimeStampedModel, SoftDeleteModel):
+class StockMovement(UUIDModel, TimeStampedModel, SoftDeleteModel, ScopedModel):
     MOVEMENT_TYPES = (
         ('in', 'In'),
         ('out', 'Out'),
     )
 
+    scope_parent = 'stock_item'
+
     stock_item = models.ForeignKey(StockItem, related_name='movements', on_delete=models.CASCADE)
     movement_type = models.CharField(max_length=3, choices=MOVEMENT_TYPES)
     quantity = models.DecimalField(max_digits=12, decimal_places=3)
@@ -239,6 +369,98 @@ class StockMovement(UUIDModel, TimeStampedModel, SoftDeleteModel):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['enterprise', '-date', '-created_at', '-id'], condition=ALIVE, name='core_smv_ent_keyset_alive'),
+            models.Index(fields=['farm', '-date'], condition=ALIVE, name='core_smv_farm_date_alive'),
+            models.Index(fields=['stock_item', '-date'], condition=ALIVE, name='core_smv_item_date_alive'),
+        ]
 
     def __str__(self):
         return f"{self.movement_type} {self.quantity} {self.stock_item}"
+
+
+class DailyRollup(UUIDModel, TimeStampedModel):
+    """Per farm/lot/day totals derived from LotDailyRecord and FinancialEntry.
+
+    Rows are maintained by ``apps.core.rollups`` and only reflect alive rows of
+    alive lots. Farm-level financial entries are stored with ``lot=None``.
+    """
+
+    farm = models.ForeignKey(Farm, related_name='daily_rollups', on_delete=models.CASCADE)
+    lot = models.ForeignKey(Lot, related_name='daily_rollups', on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField()
+    record_count = models.PositiveIntegerField(default=0)
+    mortality = models.PositiveIntegerField(default=0)
+    feed_intake_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    milk_production_l = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    eggs_count = models.PositiveIntegerField(default=0)
+    avg_weight_kg = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
+    entry_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'lot', 'date'], name='core_rollup_farm_lot_date_uniq'),
+            models.UniqueConstraint(
+                fields=['farm', 'date'], condition=models.Q(lot__isnull=True), name='core_rollup_farm_date_nolot_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['farm', 'date'], name='core_rollup_farm_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.farm_id} {self.lot_id} {self.date}"
+
+
+class StockCheckpoint(UUIDModel, TimeStampedModel):
+    """Balance of a stock item at the end of ``date``.
+
+    The ``opening`` row anchors the ledger; ``month_end`` rows are written by the
+    movement paths as months close (``stock.close_months``), shifted by
+    back-dated movements and rebuilt by ``rebuild_stock_checkpoints``.
+    """
+
+    KINDS = (
+        ('opening', 'Opening'),
+        ('month_end', 'Month end'),
+    )
+
+    stock_item = models.ForeignKey(StockItem, related_name='checkpoints', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KINDS, default='month_end')
+    date = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=3)
+
+    class Meta:
+        ordering = ['stock_item', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['stock_item', 'date'], name='core_stockcp_item_date_uniq'),
+            models.UniqueConstraint(
+                fields=['stock_item'], condition=models.Q(kind='opening'), name='core_stockcp_item_opening_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_item_id} {self.date} {self.quantity}"
+
+
+class LotArchive(UUIDModel, TimeStampedModel):
+    """History of a closed lot moved out of the hot tables by ``archive_lots``.
+
+    ``data`` holds the lot's records and events as zlib-compressed columnar
+    JSON (see ``apps.core.archive``); ``summary`` keeps the lot's KPIs readable
+    without decoding it.
+    """
+
+    lot = models.OneToOneField(Lot, related_name='archive', on_delete=models.CASCADE)
+    data = models.BinaryField()
+    row_counts = models.JSONField(default=dict)
+    summary = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.lot_id} {self.created_at:%Y-%m-%d}"
+
+
+LOT_SCOPED_MODELS = (LotDailyRecord, HealthEvent, ReproductionEvent)
+SCOPED_MODELS = LOT_SCOPED_MODELS + (StockMovement,)
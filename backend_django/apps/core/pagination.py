@@ -0,0 +1,132 @@
+"""Pagination for time-ordered event endpoints.
+
+``KeysetPagination`` walks rows in ``(-date, -created_at, -id)`` order and
+encodes the boundary row in an opaque cursor, so deep pages cost the same as
+the first one and no COUNT(*) is issued. ``EventPagination`` keeps the default
+page-number behaviour unless the client opts in with ``?pagination=cursor`` or
+sends a ``cursor``.
+"""
+import base64
+import json
+import uuid
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+KEYSET_ORDERING = ('-date', '-created_at', '-id')
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Curseur invalide'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+
+        if position is None:
+            queryset = queryset.order_by(*KEYSET_ORDERING)
+        elif reverse:
+            queryset = queryset.filter(self._after(position)).order_by('date', 'created_at', 'id')
+        else:
+            queryset = queryset.filter(self._before(position)).order_by(*KEYSET_ORDERING)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            if has_more or reverse:
+                self.next_position = self._position(rows[-1])
+            if position is not None and (has_more or not reverse):
+                self.previous_position = self._position(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.next_position, reverse=False),
+            'previous': self.encode_cursor(self.previous_position, reverse=True),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def _position(obj):
+        return obj.date, obj.created_at, obj.id
+
+    @staticmethod
+    def _before(position):
+        day, created_at, pk = position
+        return Q(date__lte=day) & (
+            Q(date__lt=day) | Q(date=day, created_at__lt=created_at) | Q(date=day, created_at=created_at, id__lt=pk)
+        )
+
+    @staticmethod
+    def _after(position):
+        day, created_at, pk = position
+        return Q(date__gte=day) & (
+            Q(date__gt=day) | Q(date=day, created_at__gt=created_at) | Q(date=day, created_at=created_at, id__gt=pk)
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = (date.fromisoformat(payload['d']), datetime.fromisoformat(payload['c']), uuid.UUID(payload['i']))
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        if position is None:
+            return None
+        day, created_at, pk = position
+        payload = {'d': day.isoformat(), 'c': created_at.isoformat(), 'i': str(pk)}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class EventPagination(PageNumberPagination):
+    mode_query_param = 'pagination'
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,31 +1,34 @@
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
-from .models import Membership, Enterprise, Farm, Unit, Lot, StockItem
+from .models import Enterprise, Unit, Lot
+from .scoping import EnterpriseScope, get_enterprise_scope
 
 
-def get_enterprise_from_obj(obj):
-    if hasattr(obj, 'enterprise'):
-        return obj.enterprise
-    if isinstance(obj, Farm):
-        return obj.enterprise
+def get_enterprise_id_from_obj(obj):
+    # Denormalized leaf rows and farms carry enterprise_id directly
+    if isinstance(obj, Enterprise):
+        return obj.pk
+    if getattr(obj, 'enterprise_id', None):
+        return obj.enterprise_id
+    if getattr(obj, 'farm_id', None):
+        return obj.farm.enterprise_id
     if isinstance(obj, Unit):
-        return obj.farm.enterprise
+        return obj.farm.enterprise_id
     if isinstance(obj, Lot):
-        return obj.unit.farm.enterprise
-    if isinstance(obj, StockItem):
-        return obj.farm.enterprise
-    if hasattr(obj, 'lot') and hasattr(obj.lot, 'unit'):
-        return obj.lot.unit.farm.enterprise
+        return obj.unit.farm.enterprise_id
+    if getattr(obj, 'lot_id', None):
+        return obj.lot.unit.farm.enterprise_id
     return None
 
 
-def user_role_in_enterprise(user, enterprise):
+def user_role_in_enterprise(user, enterprise, scope=None):
     if not enterprise or not user.is_authenticated:
         return None
-    if enterprise.owner_id == user.id:
-        return 'owner'
-    membership = Membership.objects.filter(user=user, enterprise=enterprise, is_deleted=False).first()
-    return membership.role if membership else None
+    scope = scope or EnterpriseScope(user)
+    return scope.role(enterprise)
 
 
 class IsEnterpriseMember(permissions.BasePermission):
@@ -35,7 +38,16 @@ class IsEnterpriseMember(permissions.BasePermission):
         return request.user and request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        enterprise = get_enterprise_from_obj(obj)
-        if not enterprise:
+        enterprise_id = get_enterprise_id_from_obj(obj)
+        if not enterprise_id:
             return False
-        return user_role_in_enterprise(request.user, enterprise) is not None
+        return user_role_in_enterprise(request.user, enterprise_id, get_enterprise_scope(request)) is not None
+
+
+class HasMetricsToken(permissions.BasePermission):
+    """``Authorization: Bearer <METRICS_TOKEN>``; refused while no token is configured."""
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
@@ -0,0 +1,171 @@
+"""Maintenance of the DailyRollup table.
+
+Rollups are keyed by (farm, lot, date). A key is always recomputed from the raw
+rows rather than patched with deltas, so a refresh is idempotent and can be
+replayed safely from signals, bulk paths or the ``rebuild_rollups`` command.
+Archived lots (see ``apps.core.archive``) contribute their archived records.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from . import archive
+from .models import DailyRollup, FinancialEntry, Lot, LotArchive, LotDailyRecord
+
+RECORD_FIELDS = ('mortality', 'feed_intake_kg', 'milk_production_l', 'eggs_count', 'avg_weight_kg')
+COMPARED_FIELDS = RECORD_FIELDS + ('record_count', 'entry_count', 'revenue', 'cost')
+BATCH_SIZE = 1000
+
+
+def _empty_values():
+    return {
+        'record_count': 0,
+        'mortality': 0,
+        'feed_intake_kg': Decimal('0'),
+        'milk_production_l': Decimal('0'),
+        'eggs_count': 0,
+        'avg_weight_kg': None,
+        'entry_count': 0,
+        'revenue': Decimal('0'),
+        'cost': Decimal('0'),
+    }
+
+
+def _finance_aggregates():
+    return {
+        'entry_count': Count('id'),
+        'revenue': Sum('amount', filter=Q(entry_type='revenue')),
+        'cost': Sum('amount', filter=Q(entry_type='cost')),
+    }
+
+
+def lot_farm_id(lot_id):
+    return Lot.all_objects.filter(pk=lot_id).values_list('unit__farm_id', flat=True).first()
+
+
+def refresh_day(farm_id, lot_id, day):
+    """Recompute a single rollup row from the raw tables."""
+    if farm_id is None:
+        return
+    values = _empty_values()
+
+    if lot_id is not None:
+        record = LotDailyRecord.objects.filter(
+            lot_id=lot_id, date=day, lot__is_deleted=False, farm_id=farm_id
+        ).values(*RECORD_FIELDS).first()
+        if record is None:
+            record = _archived_record(farm_id, lot_id, day)
+        if record:
+            values.update(record, record_count=1)
+        entries = FinancialEntry.objects.filter(farm_id=farm_id, lot_id=lot_id, date=day)
+    else:
+        entries = FinancialEntry.objects.filter(farm_id=farm_id, lot__isnull=True, date=day)
+
+    totals = entries.aggregate(**_finance_aggregates())
+    values['entry_count'] = totals['entry_count']
+    values['revenue'] = totals['revenue'] or Decimal('0')
+    values['cost'] = totals['cost'] or Decimal('0')
+
+    if not values['record_count'] and not values['entry_count']:
+        DailyRollup.objects.filter(farm_id=farm_id, lot_id=lot_id, date=day).delete()
+        return
+    DailyRollup.objects.update_or_create(farm_id=farm_id, lot_id=lot_id, date=day, defaults=values)
+
+
+def _archived_records(farm_ids=None, lot_ids=None):
+    archives = LotArchive.objects.filter(lot__is_deleted=False)
+    if farm_ids is not None:
+        archives = archives.filter(lot__unit__farm_id__in=farm_ids)
+    if lot_ids is not None:
+        archives = archives.filter(lot_id__in=lot_ids)
+    for farm_id, data in archives.values_list('lot__unit__farm_id', 'data').iterator():
+        for record in archive.decode(data, 'daily_records'):
+            yield farm_id, record
+
+
+def _archived_record(farm_id, lot_id, day):
+    for _, record in _archived_records(farm_ids=[farm_id], lot_ids=[lot_id]):
+        if record.date == day:
+            return {field: getattr(record, field) for field in RECORD_FIELDS}
+    return None
+
+
+def refresh_record_keys(keys):
+    """Refresh rollups for an iterable of (lot_id, date) pairs."""
+    farm_by_lot = {}
+    for lot_id, day in set(keys):
+        if lot_id not in farm_by_lot:
+            farm_by_lot[lot_id] = lot_farm_id(lot_id)
+        refresh_day(farm_by_lot[lot_id], lot_id, day)
+
+
+def _in_scope(qs, farm_ids=None, lot_ids=None, date_range=None):
+    if farm_ids is not None:
+        qs = qs.filter(farm_id__in=farm_ids)
+    if lot_ids is not None:
+        qs = qs.filter(lot_id__in=lot_ids)
+    if date_range is not None:
+        qs = qs.filter(date__range=date_range)
+    return qs
+
+
+def compute(farm_ids=None, lot_ids=None, date_range=None):
+    """Return {(farm_id, lot_id, date): values} computed from the raw tables."""
+    records = _in_scope(LotDailyRecord.objects.filter(lot__is_deleted=False), farm_ids, lot_ids, date_range)
+    # Financial entries outlive a soft-deleted lot and keep counting in the farm's margins
+    entries = _in_scope(FinancialEntry.objects.all(), farm_ids, lot_ids, date_range)
+
+    rows = {}
+    # Archived first: a record written after archiving wins over its archived copy
+    for farm_id, record in _archived_records(farm_ids, lot_ids):
+        if date_range is None or date_range[0] <= record.date <= date_range[1]:
+            values = rows.setdefault((farm_id, record.lot_id, record.date), _empty_values())
+            values.update({field: getattr(record, field) for field in RECORD_FIELDS}, record_count=1)
+
+    record_rows = records.order_by().values_list('farm_id', 'lot_id', 'date', *RECORD_FIELDS)
+    for farm_id, lot_id, day, *measures in record_rows.iterator(chunk_size=BATCH_SIZE):
+        values = rows.setdefault((farm_id, lot_id, day), _empty_values())
+        values.update(zip(RECORD_FIELDS, measures), record_count=1)
+
+    finance_rows = entries.order_by().values('farm_id', 'lot_id', 'date').annotate(**_finance_aggregates())
+    for row in finance_rows:
+        values = rows.setdefault((row['farm_id'], row['lot_id'], row['date']), _empty_values())
+        values['entry_count'] = row['entry_count']
+        values['revenue'] = row['revenue'] or Decimal('0')
+        values['cost'] = row['cost'] or Decimal('0')
+    return rows
+
+
+def rebuild(farm_ids=None, lot_ids=None, date_range=None):
+    """Replace the rollups in scope (all when no scope is given). Returns the row count."""
+    rows = compute(farm_ids=farm_ids, lot_ids=lot_ids, date_range=date_range)
+    existing = _in_scope(DailyRollup.objects.all(), farm_ids, lot_ids, date_range)
+    with transaction.atomic():
+        existing.delete()
+        DailyRollup.objects.bulk_create(
+            [
+                DailyRollup(farm_id=farm_id, lot_id=lot_id, date=day, **values)
+                for (farm_id, lot_id, day), values in rows.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return len(rows)
+
+
+def diff(farm_ids=None):
+    """Compare stored rollups with the raw tables; returns a list of mismatched keys."""
+    expected = compute(farm_ids=farm_ids)
+    stored_qs = DailyRollup.objects.all()
+    if farm_ids is not None:
+        stored_qs = stored_qs.filter(farm_id__in=farm_ids)
+    stored = {
+        (row['farm_id'], row['lot_id'], row['date']): row
+        for row in stored_qs.values('farm_id', 'lot_id', 'date', *COMPARED_FIELDS)
+    }
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None or any(want[f] != have[f] for f in COMPARED_FIELDS):
+            mismatches.append(key)
+    return mismatches
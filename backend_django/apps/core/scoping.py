@@ -0,0 +1,57 @@
+"""Request-scoped enterprise access.
+
+``EnterpriseScope`` exposes the user's accessible enterprises as a lazy
+subquery, so scope filters compile to ``enterprise_id IN (SELECT ...)`` rather
+than a literal list, and memoizes role lookups for the lifetime of a request.
+"""
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from .models import Enterprise, Membership
+
+
+class EnterpriseScope:
+    def __init__(self, user):
+        self.user = user
+        self._roles = {}
+
+    @property
+    def enterprise_ids(self):
+        """Subquery of the ids of enterprises the user owns or is a member of."""
+        if not self.user.is_authenticated:
+            return Enterprise.objects.none().values('pk')
+        memberships = Membership.objects.filter(user=self.user, enterprise=OuterRef('pk'), is_deleted=False)
+        return Enterprise.objects.filter(Q(owner=self.user) | Exists(memberships)).values('pk')
+
+    def role(self, enterprise):
+        """Role of the user in ``enterprise`` (instance or id), or None."""
+        if enterprise is None or not self.user.is_authenticated:
+            return None
+        enterprise_id = getattr(enterprise, 'pk', enterprise)
+        if enterprise_id not in self._roles:
+            self._roles[enterprise_id] = self._lookup_role(enterprise)
+        return self._roles[enterprise_id]
+
+    def _lookup_role(self, enterprise):
+        memberships = Membership.objects.filter(user=self.user, is_deleted=False)
+        if isinstance(enterprise, Enterprise):
+            if enterprise.owner_id == self.user.id:
+                return 'owner'
+            return memberships.filter(enterprise=enterprise).values_list('role', flat=True).first()
+        row = (
+            Enterprise.all_objects.filter(pk=enterprise)
+            .annotate(member_role=Subquery(memberships.filter(enterprise=OuterRef('pk')).values('role')[:1]))
+            .values('owner_id', 'member_role')
+            .first()
+        )
+        if row is None:
+            return None
+        return 'owner' if row['owner_id'] == self.user.id else row['member_role']
+
+
+def get_enterprise_scope(request):
+    """Return the EnterpriseScope cached on ``request``, creating it on first use."""
+    scope = getattr(request, '_enterprise_scope', None)
+    if scope is None or scope.user != request.user:
+        scope = EnterpriseScope(request.user)
+        request._enterprise_scope = scope
+    return scope
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from . import stock
 from .models import (
     Enterprise,
     Farm,
@@ -59,13 +60,19 @@ class UnitSerializer(serializers.ModelSerializer):
 
 
 class LotSerializer(serializers.ModelSerializer):
+    archive_summary = serializers.SerializerMethodField()
+
     class Meta:
         model = Lot
         fields = [
-            'id', 'unit', 'species', 'code', 'entry_date', 'initial_count', 'status', 'destination',
-            'created_at', 'updated_at'
+            'id', 'unit', 'species', 'code', 'entry_date', 'initial_count', 'current_count', 'cumulative_mortality', 'status',
+            'destination', 'closed_at', 'archive_summary', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'current_count', 'cumulative_mortality', 'closed_at', 'created_at', 'updated_at']
+
+    def get_archive_summary(self, obj):
+        archive = getattr(obj, 'archive', None)
+        return archive.summary if archive else None
 
     def validate(self, attrs):
         unit = attrs.get('unit') or getattr(self.instance, 'unit', None)
@@ -123,11 +130,24 @@ class StockMovementSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def create(self, validated_data):
-        movement = super().create(validated_data)
-        stock = movement.stock_item
-        if movement.movement_type == 'in':
-            stock.quantity += movement.quantity
-        else:
-            stock.quantity -= movement.quantity
-        stock.save(update_fields=['quantity'])
-        return movement
+        return stock.record_movement(validated_data)
+
+
+class LotDailyRecordBulkItemSerializer(LotDailyRecordSerializer):
+    """One row of a bulk upsert: the lot is resolved in bulk and (lot, date) is upserted."""
+
+    lot = serializers.UUIDField()
+
+    class Meta(LotDailyRecordSerializer.Meta):
+        fields = ['lot', 'date', 'mortality', 'feed_intake_kg', 'milk_production_l', 'eggs_count', 'avg_weight_kg', 'notes']
+        validators = []
+
+
+class StockMovementBulkItemSerializer(StockMovementSerializer):
+    """One movement of a bulk batch: stock items and lots are resolved in bulk."""
+
+    stock_item = serializers.UUIDField()
+    lot = serializers.UUIDField(required=False, allow_null=True)
+
+    class Meta(StockMovementSerializer.Meta):
+        fields = ['stock_item', 'movement_type', 'quantity', 'date', 'lot', 'reason']
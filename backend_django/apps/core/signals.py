@@ -0,0 +1,195 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import dashboard_cache, headcount, rollups
+from .models import (
+    Enterprise, Farm, FinancialEntry, Lot, LotDailyRecord, StockItem, StockMovement, Unit, LOT_SCOPED_MODELS, SCOPED_MODELS,
+)
+
+
+def _previous_values(sender, instance, fields):
+    if instance._state.adding or instance.pk is None:
+        return None
+    return sender.all_objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=LotDailyRecord)
+def remember_record_key(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # LotDailyRecord.save runs in a transaction: hold the lots before reading the previous mortality
+        lots = Q(pk=instance.lot_id)
+        if not instance._state.adding:
+            lots |= Q(daily_records__pk=instance.pk)
+        headcount.lock(lots)
+    instance._rollup_previous = None if raw else _previous_values(
+        sender, instance, ('lot_id', 'date', 'farm_id', 'mortality', 'is_deleted')
+    )
+
+
+@receiver(post_save, sender=LotDailyRecord)
+@receiver(post_delete, sender=LotDailyRecord)
+def refresh_record_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = [(instance.lot_id, instance.date)]
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        keys.append((previous['lot_id'], previous['date']))
+    rollups.refresh_record_keys(keys)
+
+
+@receiver(post_save, sender=LotDailyRecord)
+def track_record_headcount(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {instance.lot_id: 0 if instance.is_deleted else instance.mortality}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous and not previous['is_deleted']:
+        deltas[previous['lot_id']] = deltas.get(previous['lot_id'], 0) - previous['mortality']
+    headcount.adjust(deltas)
+
+
+@receiver(post_delete, sender=LotDailyRecord)
+def untrack_record_headcount(sender, instance, **kwargs):
+    if not instance.is_deleted:
+        headcount.adjust({instance.lot_id: -instance.mortality})
+
+
+@receiver(pre_save, sender=FinancialEntry)
+def remember_entry_key(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None if raw else _previous_values(sender, instance, ('farm_id', 'lot_id', 'date'))
+
+
+@receiver(post_save, sender=FinancialEntry)
+@receiver(post_delete, sender=FinancialEntry)
+def refresh_entry_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {(instance.farm_id, instance.lot_id, instance.date)}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        keys.add((previous['farm_id'], previous['lot_id'], previous['date']))
+    for farm_id, lot_id, day in keys:
+        rollups.refresh_day(farm_id, lot_id, day)
+
+
+@receiver(pre_save, sender=Lot)
+def remember_lot_state(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None if raw else _previous_values(sender, instance, ('unit_id', 'is_deleted'))
+
+
+@receiver(post_save, sender=Lot)
+def sync_lot_children(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if raw or not previous:
+        return
+    moved = previous['unit_id'] != instance.unit_id
+    if moved:
+        farm_id, enterprise_id = LotDailyRecord.scope_for([instance.pk])[instance.pk]
+        for model in LOT_SCOPED_MODELS:
+            model.all_objects.filter(lot_id=instance.pk).update(farm_id=farm_id, enterprise_id=enterprise_id)
+    if moved or previous['is_deleted'] != instance.is_deleted:
+        rollups.rebuild(lot_ids=[instance.pk])
+    if previous['is_deleted'] != instance.is_deleted:
+        headcount.recount(lot_ids=[instance.pk])
+        instance.refresh_from_db(fields=['cumulative_mortality', 'current_count', 'updated_at'])
+
+
+@receiver(pre_save, sender=Unit)
+def remember_unit_farm(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None if raw else _previous_values(sender, instance, ('farm_id', 'is_deleted'))
+
+
+@receiver(post_save, sender=Unit)
+def sync_unit_children(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if raw or not previous:
+        return
+    moved = previous['farm_id'] != instance.farm_id
+    if not moved and previous['is_deleted'] == instance.is_deleted:
+        return
+    if moved:
+        enterprise_id = Farm.all_objects.filter(pk=instance.farm_id).values_list('enterprise_id', flat=True).first()
+        for model in LOT_SCOPED_MODELS:
+            model.all_objects.filter(lot__unit=instance).update(farm_id=instance.farm_id, enterprise_id=enterprise_id)
+    lot_ids = list(Lot.all_objects.filter(unit=instance).values_list('id', flat=True))
+    if lot_ids:
+        rollups.rebuild(lot_ids=lot_ids)
+        if previous['is_deleted'] != instance.is_deleted:
+            headcount.recount(lot_ids=lot_ids)
+    dashboard_cache.invalidate_farms([previous['farm_id'], instance.farm_id])
+
+
+@receiver(pre_save, sender=Farm)
+def remember_farm_enterprise(sender, instance, raw=False, **kwargs):
+    instance._scope_previous = None if raw else _previous_values(sender, instance, ('enterprise_id', 'is_deleted'))
+
+
+@receiver(post_save, sender=Farm)
+def sync_farm_children(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_scope_previous', None)
+    if raw or not previous:
+        return
+    if previous['enterprise_id'] != instance.enterprise_id:
+        for model in SCOPED_MODELS:
+            model.all_objects.filter(farm_id=instance.pk).update(enterprise_id=instance.enterprise_id)
+    if previous['is_deleted'] != instance.is_deleted:
+        # The soft-delete cascade went through queryset updates, which fire no signals
+        rollups.rebuild(farm_ids=[instance.pk])
+        headcount.recount(farm_ids=[instance.pk])
+        dashboard_cache.invalidate_farms([instance.pk])
+
+
+@receiver(pre_save, sender=Enterprise)
+def remember_enterprise_state(sender, instance, raw=False, **kwargs):
+    instance._scope_previous = None if raw else _previous_values(sender, instance, ('is_deleted',))
+
+
+@receiver(post_save, sender=Enterprise)
+def sync_enterprise_children(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_scope_previous', None)
+    if raw or not previous or previous['is_deleted'] == instance.is_deleted:
+        return
+    farm_ids = list(Farm.all_objects.filter(enterprise=instance).values_list('id', flat=True))
+    if farm_ids:
+        rollups.rebuild(farm_ids=farm_ids)
+        headcount.recount(farm_ids=farm_ids)
+        dashboard_cache.invalidate_farms(farm_ids)
+
+
+@receiver(pre_save, sender=StockItem)
+def remember_stock_item_farm(sender, instance, raw=False, **kwargs):
+    instance._scope_previous = None if raw else _previous_values(sender, instance, ('farm_id',))
+
+
+@receiver(post_save, sender=StockItem)
+def sync_stock_item_movements(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_scope_previous', None)
+    if raw or not previous or previous['farm_id'] == instance.farm_id:
+        return
+    farm_id, enterprise_id = StockMovement.scope_for([instance.pk])[instance.pk]
+    StockMovement.all_objects.filter(stock_item=instance).update(farm_id=farm_id, enterprise_id=enterprise_id)
+
+
+@receiver(post_save, sender=LotDailyRecord)
+@receiver(post_delete, sender=LotDailyRecord)
+@receiver(post_save, sender=FinancialEntry)
+@receiver(post_delete, sender=FinancialEntry)
+@receiver(post_save, sender=StockItem)
+@receiver(post_delete, sender=StockItem)
+def invalidate_farm_dashboard(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None) or getattr(instance, '_scope_previous', None) or {}
+    dashboard_cache.invalidate_farms([instance.farm_id, previous.get('farm_id')])
+
+
+@receiver(post_save, sender=Lot)
+@receiver(post_delete, sender=Lot)
+def invalidate_lot_dashboard(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None) or {}
+    unit_ids = {instance.unit_id, previous.get('unit_id')}
+    dashboard_cache.invalidate_farms(Unit.all_objects.filter(pk__in=unit_ids).values_list('farm_id', flat=True))
@@ -0,0 +1,297 @@
+"""Stock ledger writes.
+
+Quantities are never read into Python and written back: each movement is
+applied with a single ``UPDATE ... SET quantity = quantity + delta`` inside the
+transaction that inserts the movement, so concurrent feed-outs cannot overwrite
+each other. When ``STOCK_ALLOW_NEGATIVE`` is off the same UPDATE carries a
+``quantity >= -delta`` guard and a zero row count means the movement is refused.
+
+Point-in-time balances come from StockCheckpoint rows: the nearest checkpoint
+plus the movements between it and the requested date, so a lookup never
+replays more than about a month of movements. The movement paths write the
+checkpoints of months closed since the item's last one (``close_months``);
+``rebuild_checkpoints`` replays the whole ledger to repair drift.
+"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import dashboard_cache, serializers
+from .models import Lot, StockCheckpoint, StockItem, StockMovement
+
+WRITE_ROLES = ('owner', 'admin')
+BATCH_SIZE = 500
+REPLAY_CHUNK_SIZE = 2000
+
+
+class InsufficientStock(Exception):
+    def __init__(self, stock_item_id):
+        super().__init__(stock_item_id)
+        self.stock_item_id = stock_item_id
+
+
+def allow_negative():
+    return getattr(settings, 'STOCK_ALLOW_NEGATIVE', True)
+
+
+def signed_quantity(movement_type, quantity):
+    return quantity if movement_type == 'in' else -quantity
+
+
+def apply_delta(stock_item_id, delta, floor=None):
+    """Add ``delta`` to the item's quantity in one UPDATE.
+
+    ``floor`` is the lowest (negative) running change the caller needs to
+    absorb; it defaults to ``delta``. Raises InsufficientStock when negative
+    stock is refused and the guard does not match.
+    """
+    qs = StockItem.all_objects.filter(pk=stock_item_id)
+    floor = delta if floor is None else floor
+    if floor < 0 and not allow_negative():
+        qs = qs.filter(quantity__gte=-floor)
+    if not qs.update(quantity=F('quantity') + delta, updated_at=timezone.now()):
+        raise InsufficientStock(stock_item_id)
+
+
+def shift_checkpoints(stock_item_id, day, delta):
+    """A movement dated ``day`` changes every checkpoint taken on or after it."""
+    StockCheckpoint.objects.filter(stock_item_id=stock_item_id, date__gte=day).update(
+        quantity=F('quantity') + delta, updated_at=timezone.now()
+    )
+
+
+def record_movement(validated_data):
+    """Insert one movement and apply it to its stock item atomically."""
+    stock_item = validated_data['stock_item']
+    delta = signed_quantity(validated_data['movement_type'], validated_data['quantity'])
+    with transaction.atomic():
+        try:
+            apply_delta(stock_item.pk, delta)
+        except InsufficientStock:
+            raise ValidationError({'quantity': ['Stock insuffisant pour ce mouvement.']})
+        shift_checkpoints(stock_item.pk, validated_data['date'], delta)
+        dashboard_cache.invalidate_farms([stock_item.farm_id])
+        movement = StockMovement.objects.create(**validated_data)
+        close_months(stock_item.pk)
+        return movement
+
+
+def apply_movements(rows, scope):
+    """Validate and apply a batch of movements in one transaction.
+
+    The batch is all-or-nothing: any invalid row, missing permission or refused
+    negative balance rolls everything back. Movements on the same item are
+    summed into a single UPDATE per item.
+    """
+    errors = {}
+    valid = {}
+    child = serializers.StockMovementBulkItemSerializer()
+    for index, row in enumerate(rows):
+        try:
+            valid[index] = child.run_validation(row)
+        except ValidationError as exc:
+            errors[index] = exc.detail
+
+    item_ids = {data['stock_item'] for data in valid.values()}
+    item_scopes = {
+        pk: (farm_id, enterprise_id)
+        for pk, farm_id, enterprise_id in StockItem.objects.filter(pk__in=item_ids).values_list(
+            'pk', 'farm_id', 'farm__enterprise_id'
+        )
+    }
+    lot_ids = {data['lot'] for data in valid.values() if data.get('lot')}
+    lot_enterprises = dict(Lot.objects.filter(pk__in=lot_ids).values_list('pk', 'unit__farm__enterprise_id'))
+    roles = {enterprise_id: scope.role(enterprise_id) for _, enterprise_id in set(item_scopes.values())}
+
+    by_item = defaultdict(list)
+    for index, data in valid.items():
+        farm_id, enterprise_id = item_scopes.get(data['stock_item'], (None, None))
+        role = roles.get(enterprise_id)
+        if role is None:
+            errors[index] = {'stock_item': ['Article de stock introuvable.']}
+        elif role not in WRITE_ROLES:
+            errors[index] = {'non_field_errors': ['Permission requise: owner ou admin']}
+        elif data.get('lot') and lot_enterprises.get(data['lot']) != enterprise_id:
+            errors[index] = {'lot': ['Lot introuvable.']}
+        else:
+            by_item[data['stock_item']].append(index)
+
+    if errors:
+        return _report([], errors)
+
+    objs = []
+    try:
+        with transaction.atomic():
+            # Lock rows in a stable order so two batches touching the same items cannot deadlock
+            for item_id in sorted(by_item):
+                running = floor = Decimal('0')
+                for index in by_item[item_id]:
+                    data = valid[index]
+                    running += signed_quantity(data['movement_type'], data['quantity'])
+                    floor = min(floor, running)
+                    farm_id, enterprise_id = item_scopes[item_id]
+                    objs.append((index, StockMovement(
+                        id=uuid.uuid4(), stock_item_id=item_id, farm_id=farm_id, enterprise_id=enterprise_id,
+                        lot_id=data.get('lot'), movement_type=data['movement_type'], quantity=data['quantity'],
+                        date=data['date'], reason=data.get('reason', ''),
+                    )))
+                apply_delta(item_id, running, floor)
+            StockMovement.objects.bulk_create([obj for _, obj in objs], batch_size=BATCH_SIZE)
+            _shift_batch_checkpoints([obj for _, obj in objs])
+            for item_id in sorted(by_item):
+                close_months(item_id)
+            dashboard_cache.invalidate_farms(farm_id for farm_id, _ in item_scopes.values())
+    except InsufficientStock as exc:
+        for index in by_item[exc.stock_item_id]:
+            errors[index] = {'quantity': ['Stock insuffisant pour ce lot de mouvements.']}
+        return _report([], errors)
+
+    return _report([{'index': index, 'id': str(obj.id)} for index, obj in sorted(objs, key=lambda pair: pair[0])], errors)
+
+
+def _shift_batch_checkpoints(movements):
+    # Only back-dated batches touch checkpoints; fetch the affected ones once
+    min_date = min(movement.date for movement in movements)
+    affected = StockCheckpoint.objects.filter(
+        stock_item_id__in={movement.stock_item_id for movement in movements}, date__gte=min_date
+    ).values_list('pk', 'stock_item_id', 'date')
+    for pk, item_id, day in affected:
+        delta = sum(
+            signed_quantity(movement.movement_type, movement.quantity)
+            for movement in movements
+            if movement.stock_item_id == item_id and movement.date <= day
+        )
+        if delta:
+            StockCheckpoint.objects.filter(pk=pk).update(quantity=F('quantity') + delta, updated_at=timezone.now())
+
+
+def _report(results, errors):
+    return {
+        'created': len(results),
+        'results': results,
+        'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+    }
+
+
+def net_quantity(movements):
+    totals = movements.aggregate(
+        added=Sum('quantity', filter=Q(movement_type='in')),
+        removed=Sum('quantity', filter=Q(movement_type='out')),
+    )
+    return (totals['added'] or Decimal('0')) - (totals['removed'] or Decimal('0'))
+
+
+def quantity_as_of(stock_item, day):
+    """Return ``(quantity, checkpoint_date)`` at the end of ``day``.
+
+    Starts from the closest checkpoint on either side of ``day``; without any
+    checkpoint the current quantity is walked back instead.
+    """
+    movements = StockMovement.objects.filter(stock_item=stock_item)
+    checkpoints = StockCheckpoint.objects.filter(stock_item=stock_item)
+    before = checkpoints.filter(date__lte=day).order_by('-date').values_list('date', 'quantity').first()
+    if before:
+        checkpoint_date, quantity = before
+        return quantity + net_quantity(movements.filter(date__gt=checkpoint_date, date__lte=day)), checkpoint_date
+    after = checkpoints.filter(date__gt=day).order_by('date').values_list('date', 'quantity').first()
+    if after:
+        checkpoint_date, quantity = after
+        return quantity - net_quantity(movements.filter(date__gt=day, date__lte=checkpoint_date)), checkpoint_date
+    return stock_item.quantity - net_quantity(movements.filter(date__gt=day)), None
+
+
+def _month_end(day):
+    next_month = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def _last_closed(today):
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def _opening(item, movements, today):
+    """Unsaved opening checkpoint: the day before the item's first movement or creation."""
+    first_day = min(movements.order_by('date').values_list('date', flat=True).first() or today, item.created_at.date())
+    return StockCheckpoint(
+        stock_item=item, kind='opening', date=first_day - timedelta(days=1),
+        quantity=item.quantity - net_quantity(movements),
+    )
+
+
+def close_months(stock_item_id, today=None):
+    """Write the month-end checkpoints of the months closed since the item's last checkpoint.
+
+    Called by the movement paths once the item row is locked by its UPDATE, so
+    it usually finds nothing to do and closes one month at the turn of a month.
+    The first call on an item also creates its opening checkpoint.
+    """
+    today = today or timezone.now().date()
+    last_closed = _last_closed(today)
+    checkpoints = StockCheckpoint.objects.filter(stock_item_id=stock_item_id)
+    last = checkpoints.order_by('-date').values_list('date', 'quantity').first()
+    if last and last[0] >= last_closed:
+        return 0
+    movements = StockMovement.objects.filter(stock_item_id=stock_item_id)
+    if last is None:
+        opening = _opening(StockItem.all_objects.get(pk=stock_item_id), movements, today)
+        opening.save()
+        last = (opening.date, opening.quantity)
+
+    day, balance = last
+    created = []
+    month_end = _month_end(day + timedelta(days=1))
+    while month_end <= last_closed:
+        balance += net_quantity(movements.filter(date__gt=day, date__lte=month_end))
+        created.append(StockCheckpoint(stock_item_id=stock_item_id, date=month_end, quantity=balance))
+        day, month_end = month_end, _month_end(month_end + timedelta(days=1))
+    StockCheckpoint.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    return len(created)
+
+
+def rebuild_checkpoints(stock_item_id, today=None, check_only=False):
+    """Replay the item's ledger from its opening checkpoint.
+
+    Month-end checkpoints are rewritten up to the last closed month and the
+    stored quantity is reset to the ledger balance. Without an opening
+    checkpoint one is created from the current quantity, so that run never
+    reports drift. Returns ``(drift, checkpoint_count)`` where drift is stored
+    minus ledger.
+    """
+    today = today or timezone.now().date()
+    last_closed = _last_closed(today)
+    with transaction.atomic():
+        item = StockItem.all_objects.select_for_update().get(pk=stock_item_id)
+        movements = StockMovement.objects.filter(stock_item_id=stock_item_id)
+        opening = StockCheckpoint.objects.filter(stock_item_id=stock_item_id, kind='opening').first()
+        if opening is None:
+            opening = _opening(item, movements, today)
+        balance = opening.quantity
+        month_end = _month_end(opening.date + timedelta(days=1))
+        checkpoints = []
+        replay = movements.filter(date__gt=opening.date).order_by('date').values_list('date', 'movement_type', 'quantity')
+        for day, movement_type, quantity in replay.iterator(chunk_size=REPLAY_CHUNK_SIZE):
+            while month_end < day and month_end <= last_closed:
+                checkpoints.append(StockCheckpoint(stock_item=item, date=month_end, quantity=balance))
+                month_end = _month_end(month_end + timedelta(days=1))
+            balance += signed_quantity(movement_type, quantity)
+        while month_end <= last_closed:
+            checkpoints.append(StockCheckpoint(stock_item=item, date=month_end, quantity=balance))
+            month_end = _month_end(month_end + timedelta(days=1))
+
+        drift = item.quantity - balance
+        if not check_only:
+            if opening._state.adding:
+                opening.save()
+            StockCheckpoint.objects.filter(stock_item_id=stock_item_id, kind='month_end').delete()
+            StockCheckpoint.objects.bulk_create(checkpoints, batch_size=BATCH_SIZE)
+            if drift:
+                StockItem.all_objects.filter(pk=stock_item_id).update(quantity=balance, updated_at=timezone.now())
+                dashboard_cache.invalidate_farms([item.farm_id])
+    return drift, len(checkpoints)
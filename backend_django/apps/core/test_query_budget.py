@@ -0,0 +1,143 @@
+"""Query budgets for the API endpoints.
+
+Every endpoint is requested once with ``N`` rows per model and once with
+``10 * N``: the query count must not change with the data size and must stay
+within the budget recorded in ``query_budget.json``. Re-record the baseline
+after an intended change with::
+
+    QUERY_BUDGET_RECORD=1 python manage.py test apps.core.test_query_budget
+
+Wall times are recorded for information only; they are too noisy to fail on.
+"""
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.core import dashboard_cache
+from apps.core.models import (
+    BreedingType, Enterprise, Farm, FinancialEntry, HealthEvent, Lot, LotDailyRecord, Membership, ReproductionEvent,
+    Species, StockItem, StockMovement, Unit,
+)
+from apps.core.urls import router
+
+User = get_user_model()
+
+BASELINE_PATH = Path(__file__).with_name('query_budget.json')
+N = 3
+
+
+class QueryBudgetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='budget@example.com', password='password123')
+        cls.enterprise = Enterprise.objects.create(name='Budget', owner=cls.user)
+        Membership.objects.create(user=cls.user, enterprise=cls.enterprise, role='owner')
+        cls.farm = Farm.objects.create(name='Budget', enterprise=cls.enterprise)
+        cls.breeding_type = BreedingType.objects.create(code='BUDGET', name='Budget')
+        cls.species = Species.objects.create(code='budget', name='Budget', breeding_type=cls.breeding_type)
+        cls.unit = Unit.objects.create(name='Budget', farm=cls.farm, breeding_type=cls.breeding_type, capacity=1000)
+        cls.lot = Lot.objects.create(unit=cls.unit, species=cls.species, code='BUDGET', entry_date='2025-01-01', initial_count=100)
+        cls.stock_item = StockItem.objects.create(farm=cls.farm, name='Budget', item_type='feed', quantity=100)
+        cls.today = timezone.now().date()
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.seeded = 0
+
+    def _seed(self, count):
+        """Add ``count`` rows of every model reachable from the endpoints."""
+        for index in range(self.seeded, self.seeded + count):
+            day = self.today - timedelta(days=index)
+            breeding_type = BreedingType.objects.create(code=f'B{index}', name=f'Type {index}')
+            Species.objects.create(code=f's{index}', name=f'Espèce {index}', breeding_type=breeding_type)
+            enterprise = Enterprise.objects.create(name=f'Ent {index}', owner=self.user)
+            Farm.objects.create(name=f'Ferme {index}', enterprise=enterprise)
+            Farm.objects.create(name=f'Ferme {index}', enterprise=self.enterprise)
+            Unit.objects.create(name=f'Unité {index}', farm=self.farm, breeding_type=self.breeding_type, capacity=10)
+            lot = Lot.objects.create(unit=self.unit, species=self.species, code=f'L{index:04}', entry_date='2025-01-01', initial_count=50)
+            for target in (lot, self.lot):
+                LotDailyRecord.objects.create(lot=target, date=day, mortality=1, feed_intake_kg=2, avg_weight_kg=1 + index / 10)
+                HealthEvent.objects.create(lot=target, date=day, event_type='vaccination')
+                ReproductionEvent.objects.create(lot=target, date=day, event_type='saillie')
+                FinancialEntry.objects.create(farm=self.farm, lot=target, date=day, entry_type='cost', category='feed', amount=1)
+            StockItem.objects.create(farm=self.farm, name=f'Article {index}', item_type='feed', quantity=1, alert_threshold=5)
+            StockMovement.objects.create(stock_item=self.stock_item, lot=lot, movement_type='out', quantity=1, date=day)
+        self.seeded += count
+
+    def _endpoints(self):
+        """(name, url, query params) of every endpoint under budget."""
+        endpoints = []
+        for _, _, basename in router.registry:
+            endpoints.append((f'{basename}-list', reverse(f'{basename}-list'), {}))
+        detail_objects = {
+            'enterprise': self.enterprise, 'farm': self.farm, 'unit': self.unit, 'lot': self.lot,
+            'lot-record': LotDailyRecord.objects.filter(lot=self.lot).first(),
+            'health-event': HealthEvent.objects.filter(lot=self.lot).first(),
+            'reproduction-event': ReproductionEvent.objects.filter(lot=self.lot).first(),
+            'financial-entry': FinancialEntry.objects.filter(lot=self.lot).first(),
+            'stock-item': self.stock_item,
+            'stock-movement': StockMovement.objects.filter(stock_item=self.stock_item).first(),
+        }
+        for basename, obj in detail_objects.items():
+            endpoints.append((f'{basename}-detail', reverse(f'{basename}-detail', args=[obj.pk]), {}))
+        for basename in ('lot-record', 'financial-entry', 'stock-movement'):
+            endpoints.append((f'{basename}-export', reverse(f'{basename}-export'), {}))
+        endpoints += [
+            ('lot-record-list-cursor', reverse('lot-record-list'), {'pagination': 'cursor'}),
+            ('lot-analytics', reverse('lot-analytics'), {'farm_id': self.farm.id}),
+            ('lot-timeseries', reverse('lot-timeseries', args=[self.lot.pk]), {}),
+            ('stock-item-as-of', reverse('stock-item-as-of', args=[self.stock_item.pk]), {'date': self.today}),
+            ('dashboard-summary', reverse('dashboard-summary'), {'farm_id': self.farm.id}),
+            ('dashboard-enterprise-summary', reverse('dashboard-enterprise-summary'), {'enterprise_id': self.enterprise.id}),
+        ]
+        return endpoints
+
+    def _measure(self):
+        results = {}
+        for name, url, params in self._endpoints():
+            # Measure computed dashboards, not cache hits
+            dashboard_cache.get_cache().clear()
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(url, params)
+                if res.streaming:
+                    b''.join(res.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.assertEqual(res.status_code, 200, f'{name}: {res.status_code}')
+            results[name] = {'queries': len(ctx), 'ms': round(elapsed, 1)}
+        return results
+
+    def test_query_counts_do_not_grow_and_stay_within_budget(self):
+        self._seed(N)
+        small = self._measure()
+        self._seed(9 * N)
+        large = self._measure()
+
+        for name in small:
+            with self.subTest(name):
+                self.assertEqual(
+                    large[name]['queries'], small[name]['queries'],
+                    f'{name}: {small[name]["queries"]} requêtes pour {N} lignes, {large[name]["queries"]} pour {10 * N}',
+                )
+
+        if os.environ.get('QUERY_BUDGET_RECORD'):
+            BASELINE_PATH.write_text(json.dumps(large, indent=2, sort_keys=True) + '\n')
+            return
+
+        baseline = json.loads(BASELINE_PATH.read_text())
+        for name, measured in large.items():
+            with self.subTest(name):
+                self.assertIn(name, baseline, f'{name}: aucun budget enregistré')
+                self.assertLessEqual(
+                    measured['queries'], baseline[name]['queries'],
+                    f'{name}: {measured["queries"]} requêtes, budget {baseline[name]["queries"]}',
+                )
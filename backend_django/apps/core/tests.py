@@ -1,9 +1,49 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 
-from apps.core.models import Enterprise, Farm, Species, Unit, Lot, StockItem, Membership, HealthEvent, BreedingType
+from apps.common import instrumentation, metrics
+from apps.common.db import pool as db_pool
+from apps.common.db.postgresql_pool import base as pool_backend
+from apps.core import archive, bulk, dashboard, dashboard_cache, fanout, headcount, rollups, stock
+from apps.core.checks import caches_shared
+from apps.core.models import (
+    Enterprise, Farm, Species, Unit, Lot, StockItem, Membership, HealthEvent, BreedingType, LotDailyRecord, FinancialEntry,
+    DailyRollup, LotArchive, StockMovement,
+)
+from apps.core import views
+from apps.core.management.commands import bench_indexes
+from apps.core.permissions import IsEnterpriseMember
+from apps.core.scoping import EnterpriseScope
+from apps.users.authentication import CachedJWTAuthentication, user_cache
 
 User = get_user_model()
 
@@ -117,3 +157,1593 @@ class CoreApiTests(APITestCase):
         }
         res = self.client.post(url, payload, format='json')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DailyRollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='rollup@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.other_farm = Farm.objects.create(name='Farm 2', enterprise=self.enterprise)
+        self.breeding_type = BreedingType.objects.create(code='ROL', name='Volaille')
+        self.species = Species.objects.create(code='rollup_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, species=self.species, breeding_type=self.breeding_type, capacity=100)
+        self.lot = Lot.objects.create(unit=self.unit, species=self.species, code='LOT1', entry_date='2025-01-01', initial_count=100)
+        self.today = timezone.now().date()
+
+    def _record(self, days_ago, **fields):
+        return LotDailyRecord.objects.create(lot=self.lot, date=self.today - timedelta(days=days_ago), **fields)
+
+    def test_rollup_follows_record_edits_and_soft_delete(self):
+        record = self._record(1, mortality=3, feed_intake_kg=10, avg_weight_kg='1.5')
+        rollup = DailyRollup.objects.get(lot=self.lot, date=record.date)
+        self.assertEqual((rollup.mortality, rollup.record_count), (3, 1))
+
+        record.mortality = 5
+        record.save()
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.mortality, 5)
+
+        record.delete()
+        self.assertFalse(DailyRollup.objects.filter(lot=self.lot).exists())
+
+    def test_rollup_moves_with_lot_and_drops_records_on_lot_soft_delete(self):
+        self._record(1, mortality=1)
+        FinancialEntry.objects.create(farm=self.farm, lot=self.lot, date=self.today, entry_type='cost', category='feed', amount=40)
+        other_unit = Unit.objects.create(name='Unit 2', farm=self.other_farm, breeding_type=self.breeding_type, capacity=10)
+
+        self.lot.unit = other_unit
+        self.lot.save()
+        self.assertEqual(DailyRollup.objects.get(lot=self.lot, record_count=1).farm_id, self.other_farm.id)
+        self.assertEqual(DailyRollup.objects.get(lot=self.lot, entry_count=1).farm_id, self.farm.id)
+
+        self.lot.delete()
+        # The lot's finance entries are kept (SET_NULL relation) and still count, as they did before rollups
+        self.assertEqual(list(DailyRollup.objects.filter(lot=self.lot).values_list('record_count', 'entry_count')), [(0, 1)])
+        self.assertEqual(self.client.get(reverse('dashboard-summary'), {'farm_id': self.farm.id}).data['farm_margin_30d'], -40.0)
+        self.assertEqual(rollups.diff(), [])
+
+    def test_dashboard_reads_rollups(self):
+        self._record(3, mortality=2, feed_intake_kg=20, avg_weight_kg='1.0')
+        self._record(1, mortality=1, feed_intake_kg=10, avg_weight_kg='1.4')
+        self._record(20, mortality=50)
+        FinancialEntry.objects.create(farm=self.farm, lot=self.lot, date=self.today, entry_type='revenue', category='sale', amount=100)
+        FinancialEntry.objects.create(farm=self.farm, date=self.today, entry_type='cost', category='labor', amount=30)
+
+        res = self.client.get(reverse('dashboard-summary') + f'?farm_id={self.farm.id}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['mortality_7d'], 3)
+        self.assertEqual(res.data['feed_intake_kg_7d'], 30.0)
+        self.assertEqual(res.data['avg_daily_gain_kg'], 0.2)
+        # 30 kg of feed over a 0.4 kg gain on the 47 animals still alive
+        self.assertEqual(res.data['feed_conversion_ratio'], 1.596)
+        self.assertEqual(res.data['farm_margin_30d'], 70.0)
+        self.assertEqual(res.data['lot_margins_30d'], [{'lot_id': str(self.lot.id), 'lot_code': 'LOT1', 'margin': 100.0}])
+
+    def test_rebuild_command_restores_consistency(self):
+        self._record(1, mortality=4)
+        DailyRollup.objects.all().update(mortality=0)
+        self.assertEqual(len(rollups.diff()), 1)
+
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(rollups.diff(), [])
+        self.assertIn('cohérents', out.getvalue())
+
+
+class DashboardAggregationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='agg@example.com', password='password123')
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.breeding_type = BreedingType.objects.create(code='AGG', name='Volaille')
+        self.species = Species.objects.create(code='agg_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=self.breeding_type, capacity=1000)
+        self.stock = StockItem.objects.create(farm=self.farm, name='Maïs', item_type='feed', quantity=1, alert_threshold=5)
+        self.today = timezone.now().date()
+
+    def _seed_lots(self, count, offset=0):
+        for index in range(offset, offset + count):
+            lot = Lot.objects.create(unit=self.unit, species=self.species, code=f'L{index:03}', entry_date='2025-01-01', initial_count=10)
+            for days_ago, weight in ((4, '1.0'), (2, '1.2')):
+                LotDailyRecord.objects.create(
+                    lot=lot, date=self.today - timedelta(days=days_ago), mortality=1, feed_intake_kg=2, avg_weight_kg=weight
+                )
+            FinancialEntry.objects.create(farm=self.farm, lot=lot, date=self.today, entry_type='revenue', category='sale', amount=5)
+
+    def test_summary_values(self):
+        self._seed_lots(2)
+        summary = dashboard.farm_summary(self.farm.id, today=self.today)
+        self.assertEqual(summary['total_lots'], 2)
+        self.assertEqual(summary['mortality_7d'], 4)
+        self.assertEqual(summary['mortality_rate_percent_7d'], 20.0)
+        self.assertEqual(summary['feed_intake_kg_7d'], 8.0)
+        self.assertEqual(summary['avg_daily_gain_kg'], 0.1)
+        # Weight gain counted on the 8 survivors of each lot
+        self.assertEqual(summary['feed_conversion_ratio'], 2.5)
+        self.assertEqual(summary['farm_margin_30d'], 10.0)
+        self.assertEqual([row['lot_code'] for row in summary['lot_margins_30d']], ['L000', 'L001'])
+        self.assertEqual([alert['name'] for alert in summary['stock_alerts']], ['Maïs'])
+
+    def test_query_count_is_constant(self):
+        self._seed_lots(2)
+        with self.assertNumQueries(3):
+            dashboard.farm_summary(self.farm.id, today=self.today)
+        self._seed_lots(10, offset=2)
+        with self.assertNumQueries(3):
+            summary = dashboard.farm_summary(self.farm.id, today=self.today)
+        self.assertEqual(summary['total_lots'], 12)
+
+
+class EnterpriseScopeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='scope@example.com', password='password123')
+        self.owner = User.objects.create_user(email='owner@example.com', password='password123')
+        self.enterprises = [Enterprise.objects.create(name=f'Ent {i}', owner=self.owner) for i in range(30)]
+        for enterprise in self.enterprises:
+            Membership.objects.create(user=self.user, enterprise=enterprise, role='admin')
+            Farm.objects.create(name=f'Farm {enterprise.name}', enterprise=enterprise)
+        self.own = Enterprise.objects.create(name='Own', owner=self.user)
+        self.own_farm = Farm.objects.create(name='Own farm', enterprise=self.own)
+        self.hidden = Farm.objects.create(name='Hidden', enterprise=Enterprise.objects.create(name='Other', owner=self.owner))
+        self.client.force_authenticate(self.user)
+
+    def test_scope_is_a_subquery_not_an_id_list(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse('farm-list'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 31)
+        self.assertNotIn(self.hidden.id, [farm['id'] for farm in res.data['results']])
+        for query in ctx.captured_queries:
+            self.assertNotIn(self.enterprises[-1].id.hex, query['sql'])
+
+    def test_roles_are_resolved_once_per_scope(self):
+        scope = EnterpriseScope(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(scope.role(self.enterprises[0].id), 'admin')
+            self.assertEqual(scope.role(self.enterprises[0]), 'admin')
+        with self.assertNumQueries(0):
+            self.assertEqual(scope.role(self.own), 'owner')
+        self.assertIsNone(scope.role(self.hidden.enterprise_id))
+
+    def test_revoked_membership_loses_access(self):
+        Membership.objects.filter(user=self.user, enterprise=self.enterprises[0]).update(is_deleted=True)
+        farm = self.enterprises[0].farms.get()
+        res = self.client.get(reverse('farm-detail', args=[farm.id]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(reverse('dashboard-summary'), {'farm_id': str(farm.id)})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ObjectPermissionQueryTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='perm-owner@example.com', password='password123')
+        self.user = User.objects.create_user(email='perm-admin@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        enterprise = Enterprise.objects.create(name='Ent', owner=owner)
+        Membership.objects.create(user=self.user, enterprise=enterprise, role='admin')
+        farm = Farm.objects.create(name='Farm', enterprise=enterprise)
+        breeding_type = BreedingType.objects.create(code='PERM', name='Volaille')
+        species = Species.objects.create(code='perm_species', name='Volaille', breeding_type=breeding_type)
+        unit = Unit.objects.create(name='Unit', farm=farm, species=species, breeding_type=breeding_type, capacity=100)
+        lot = Lot.objects.create(unit=unit, species=species, code='LOT1', entry_date='2025-01-01', initial_count=100)
+        self.objects = {
+            'unit': (unit, {'name': 'Unit 2'}),
+            'lot': (lot, {'code': 'LOT2'}),
+            'lot-record': (LotDailyRecord.objects.create(lot=lot, date='2025-01-02', avg_weight_kg=1), {'mortality': 1}),
+            'stock-item': (StockItem.objects.create(farm=farm, name='Maïs', item_type='feed', quantity=10), {'name': 'Soja'}),
+            'financial-entry': (
+                FinancialEntry.objects.create(farm=farm, lot=lot, date='2025-01-02', entry_type='cost', category='feed', amount=1),
+                {'amount': '2'},
+            ),
+        }
+
+    def _permission_queries(self, method, url, **kwargs):
+        """Queries run by the object permission and write role checks of one request."""
+        counts = []
+
+        def counting(func):
+            def wrapper(*args, **kw):
+                with CaptureQueriesContext(connection) as ctx:
+                    result = func(*args, **kw)
+                counts.append(len(ctx))
+                return result
+            return wrapper
+
+        with mock.patch.object(IsEnterpriseMember, 'has_object_permission', counting(IsEnterpriseMember.has_object_permission)), \
+                mock.patch.object(views, 'get_enterprise_id_from_obj', counting(views.get_enterprise_id_from_obj)), \
+                mock.patch.object(views.BaseMemberViewSet, '_enterprise_from_serializer', counting(views.BaseMemberViewSet._enterprise_from_serializer)), \
+                mock.patch.object(views.BaseMemberViewSet, '_ensure_write_role', counting(views.BaseMemberViewSet._ensure_write_role)):
+            res = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(res.status_code, 300, res.data if hasattr(res, 'data') else res)
+        return sum(counts)
+
+    def test_detail_routes_cost_at_most_two_permission_queries(self):
+        for basename, (obj, patch) in self.objects.items():
+            url = reverse(f'{basename}-detail', args=[obj.pk])
+            with self.subTest(basename):
+                self.assertLessEqual(self._permission_queries('get', url), 2)
+                self.assertLessEqual(self._permission_queries('patch', url, data=patch, format='json'), 2)
+        # Leaves first: deleting a unit soft-deletes its lots and their records
+        for basename, (obj, _) in reversed(self.objects.items()):
+            with self.subTest(basename):
+                self.assertLessEqual(self._permission_queries('delete', reverse(f'{basename}-detail', args=[obj.pk])), 2)
+
+    def test_role_is_resolved_once_per_request(self):
+        # Object permission and write role share the request's scope
+        url = reverse('lot-detail', args=[self.objects['lot'][0].pk])
+        self.assertEqual(self._permission_queries('patch', url, data={'code': 'LOT3'}, format='json'), 1)
+
+    def test_moving_a_lot_checks_the_target_enterprise(self):
+        lot = self.objects['lot'][0]
+        other = Enterprise.objects.create(name='Other', owner=User.objects.create_user(email='perm-x@example.com', password='x'))
+        Membership.objects.create(user=self.user, enterprise=other, role='user')
+        other_unit = Unit.objects.create(
+            name='Other', farm=Farm.objects.create(name='Other', enterprise=other),
+            species=lot.species, breeding_type=lot.unit.breeding_type, capacity=10,
+        )
+        res = self.client.patch(reverse('lot-detail', args=[lot.pk]), {'unit': str(other_unit.pk)}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ScopeColumnTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='scopecols@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.other_enterprise = Enterprise.objects.create(name='Ent 2', owner=self.user)
+        self.other_farm = Farm.objects.create(name='Farm 2', enterprise=self.other_enterprise)
+        self.breeding_type = BreedingType.objects.create(code='SCO', name='Volaille')
+        self.species = Species.objects.create(code='scope_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=self.breeding_type, capacity=100)
+        self.lot = Lot.objects.create(unit=self.unit, species=self.species, code='LOT1', entry_date='2025-01-01', initial_count=100)
+        self.stock_item = StockItem.objects.create(farm=self.farm, name='Feed', item_type='feed', quantity=10)
+
+    def test_scope_filled_on_save_and_bulk(self):
+        record = LotDailyRecord.objects.create(lot=self.lot, date='2025-01-02')
+        movement = StockMovement.objects.create(stock_item=self.stock_item, movement_type='in', quantity=1, date='2025-01-02')
+        self.assertEqual((record.farm_id, record.enterprise_id), (self.farm.id, self.enterprise.id))
+        self.assertEqual((movement.farm_id, movement.enterprise_id), (self.farm.id, self.enterprise.id))
+
+        events = HealthEvent.fill_scope([HealthEvent(lot=self.lot, date='2025-01-03', event_type='treatment') for _ in range(3)])
+        HealthEvent.objects.bulk_create(events)
+        self.assertEqual(HealthEvent.objects.filter(farm=self.farm, enterprise=self.enterprise).count(), 3)
+
+    def test_scope_follows_lot_unit_and_farm_moves(self):
+        record = LotDailyRecord.objects.create(lot=self.lot, date='2025-01-02')
+        other_unit = Unit.objects.create(name='Unit 2', farm=self.other_farm, breeding_type=self.breeding_type, capacity=10)
+        self.lot.unit = other_unit
+        self.lot.save()
+        record.refresh_from_db()
+        self.assertEqual((record.farm_id, record.enterprise_id), (self.other_farm.id, self.other_enterprise.id))
+
+        self.other_farm.enterprise = self.enterprise
+        self.other_farm.save()
+        record.refresh_from_db()
+        self.assertEqual(record.enterprise_id, self.enterprise.id)
+
+    def test_leaf_list_filters_without_joins(self):
+        LotDailyRecord.objects.create(lot=self.lot, date='2025-01-02')
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse('lot-record-list'))
+        self.assertEqual(res.data['count'], 1)
+        list_sql = [q['sql'] for q in ctx.captured_queries if 'core_lotdailyrecord' in q['sql']]
+        self.assertTrue(list_sql)
+        for sql in list_sql:
+            self.assertNotIn('JOIN', sql)
+
+    def test_enterprise_detail_is_reachable(self):
+        res = self.client.get(reverse('enterprise-detail', args=[self.enterprise.id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class LotDailyRecordBulkTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='bulk@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.breeding_type = BreedingType.objects.create(code='BLK', name='Volaille')
+        self.species = Species.objects.create(code='bulk_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=self.breeding_type, capacity=100)
+        self.lots = [
+            Lot.objects.create(unit=self.unit, species=self.species, code=f'LOT{i}', entry_date='2025-01-01', initial_count=100)
+            for i in range(3)
+        ]
+        self.url = reverse('lot-record-bulk')
+
+    def _rows(self, days):
+        return [
+            {'lot': str(lot.id), 'date': str(date(2025, 2, 1) + timedelta(days=day)), 'mortality': 1, 'feed_intake_kg': '2.5'}
+            for lot in self.lots for day in range(days)
+        ]
+
+    def test_upsert_reports_per_row(self):
+        existing = LotDailyRecord.objects.create(lot=self.lots[0], date='2025-02-01', mortality=9)
+        existing.delete()
+        rows = self._rows(2) + [
+            {'lot': str(self.lots[0].id), 'date': 'not-a-date'},
+            {'lot': '00000000-0000-0000-0000-000000000000', 'date': '2025-02-01'},
+        ]
+        res = self.client.post(self.url, rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['created'], res.data['updated']), (5, 1))
+        self.assertEqual([error['index'] for error in res.data['errors']], [6, 7])
+        self.assertIn('date', res.data['errors'][0]['errors'])
+
+        existing.refresh_from_db()
+        self.assertFalse(existing.is_deleted)
+        self.assertEqual(existing.mortality, 1)
+        self.assertEqual(existing.farm_id, self.farm.id)
+        self.assertEqual(DailyRollup.objects.filter(record_count=1).count(), 6)
+
+    def test_user_role_rows_are_rejected(self):
+        member = User.objects.create_user(email='bulk-member@example.com', password='password123')
+        Membership.objects.create(user=member, enterprise=self.enterprise, role='user')
+        self.client.force_authenticate(member)
+        res = self.client.post(self.url, self._rows(1), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['errors']), 3)
+        self.assertFalse(LotDailyRecord.objects.exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self._rows(2), format='json')
+        # Stay within one insert batch: SQLite caps the number of bound parameters per statement
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self._rows(10), format='json')
+        self.assertEqual(LotDailyRecord.objects.count(), 30)
+        self.assertEqual(len(small), len(large))
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='keyset@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.breeding_type = BreedingType.objects.create(code='KEY', name='Volaille')
+        self.species = Species.objects.create(code='keyset_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=self.breeding_type, capacity=100)
+        self.lot = Lot.objects.create(unit=self.unit, species=self.species, code='LOT1', entry_date='2025-01-01', initial_count=100)
+        # Several events share a date so the (created_at, id) tie-breakers are exercised
+        for index in range(45):
+            HealthEvent.objects.create(lot=self.lot, date=date(2025, 1, 1) + timedelta(days=index // 4), event_type='treatment')
+        self.expected = [
+            str(pk) for pk in HealthEvent.objects.order_by('-date', '-created_at', '-id').values_list('id', flat=True)
+        ]
+
+    def test_walks_all_rows_without_count(self):
+        seen = []
+        url = reverse('health-event-list') + '?pagination=cursor'
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                res = self.client.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertNotIn('count', res.data)
+                seen.extend(str(row['id']) for row in res.data['results'])
+                url = res.data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in ctx.captured_queries))
+
+    def test_previous_cursor_returns_previous_page(self):
+        first = self.client.get(reverse('health-event-list'), {'pagination': 'cursor'})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([row['id'] for row in back.data['results']], [row['id'] for row in first.data['results']])
+        self.assertIsNone(back.data['previous'])
+
+    def test_page_number_mode_is_default(self):
+        res = self.client.get(reverse('health-event-list'), {'page': 2})
+        self.assertEqual(res.data['count'], 45)
+        self.assertEqual([str(row['id']) for row in res.data['results']], self.expected[20:40])
+
+    def test_invalid_cursor(self):
+        res = self.client.get(reverse('health-event-list'), {'cursor': 'garbage'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='export@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        other = Enterprise.objects.create(name='Other', owner=User.objects.create_user(email='other-export@example.com'))
+        self.other_farm = Farm.objects.create(name='Other farm', enterprise=other)
+        for day in range(1, 4):
+            FinancialEntry.objects.create(farm=self.farm, date=f'2025-03-0{day}', entry_type='cost', category='feed', amount=day)
+        FinancialEntry.objects.create(farm=self.other_farm, date='2025-03-01', entry_type='cost', category='feed', amount=99)
+
+    def _content(self, res):
+        return b''.join(res.streaming_content)
+
+    def test_csv_export_is_scoped_and_filtered(self):
+        res = self.client.get(reverse('financial-entry-export'), {'farm_id': str(self.farm.id)})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertIn('attachment;', res['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(self._content(res).decode('utf-8'))))
+        self.assertEqual(rows[0][:4], ['id', 'farm', 'lot', 'date'])
+        self.assertEqual([row[3] for row in rows[1:]], ['2025-03-03', '2025-03-02', '2025-03-01'])
+
+    def test_gzipped_ndjson_export(self):
+        res = self.client.get(reverse('financial-entry-export'), {'output': 'ndjson', 'compress': 'gzip'})
+        self.assertEqual(res['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(self._content(res)).decode('utf-8').splitlines()
+        amounts = [json.loads(line)['amount'] for line in lines]
+        self.assertEqual(amounts, ['3.00', '2.00', '1.00'])
+
+    def test_unknown_output(self):
+        res = self.client.get(reverse('lot-record-export'), {'output': 'xlsx'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StockLedgerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='stock@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.feed = StockItem.objects.create(farm=self.farm, name='Feed', item_type='feed', quantity=10)
+        self.meds = StockItem.objects.create(farm=self.farm, name='Meds', item_type='med', quantity=2)
+        self.url = reverse('stock-movement-bulk')
+
+    def _movement(self, item, movement_type, quantity):
+        return {'stock_item': str(item.id), 'movement_type': movement_type, 'quantity': quantity, 'date': '2025-03-01'}
+
+    def test_bulk_applies_net_quantity_per_item(self):
+        rows = [
+            self._movement(self.feed, 'out', '4'),
+            self._movement(self.meds, 'in', '1.5'),
+            self._movement(self.feed, 'in', '20'),
+            self._movement(self.feed, 'out', '1'),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(self.url, {'movements': rows}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 4)
+        self.feed.refresh_from_db()
+        self.meds.refresh_from_db()
+        self.assertEqual(self.feed.quantity, Decimal('25'))
+        self.assertEqual(self.meds.quantity, Decimal('3.5'))
+        self.assertEqual(StockMovement.objects.filter(farm=self.farm, enterprise=self.enterprise).count(), 4)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_stockitem"')]
+        self.assertEqual(len(updates), 2)
+
+    def test_bulk_is_all_or_nothing(self):
+        rows = [self._movement(self.feed, 'out', '1'), self._movement(self.meds, 'sideways', '1')]
+        res = self.client.post(self.url, rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in res.data['errors']], [1])
+        self.feed.refresh_from_db()
+        self.assertEqual(self.feed.quantity, Decimal('10'))
+        self.assertFalse(StockMovement.objects.exists())
+
+    @override_settings(STOCK_ALLOW_NEGATIVE=False)
+    def test_negative_stock_is_refused(self):
+        res = self.client.post(reverse('stock-movement-list'), self._movement(self.meds, 'out', '3'), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quantity', res.data)
+
+        # The running balance matters, not only the net change: -3 then +5 dips below zero first
+        rows = [self._movement(self.meds, 'out', '3'), self._movement(self.meds, 'in', '5')]
+        res = self.client.post(self.url, rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(self.url, list(reversed(rows)), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.meds.refresh_from_db()
+        self.assertEqual(self.meds.quantity, Decimal('4'))
+        self.assertEqual(StockMovement.objects.count(), 2)
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    workers = 8
+    movements_per_worker = 25
+
+    def setUp(self):
+        owner = User.objects.create_user(email='stock-race@example.com', password='password123')
+        farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=owner))
+        self.item = StockItem.objects.create(farm=farm, name='Feed', item_type='feed', quantity=1000)
+
+    def _feed_out(self, barrier, failures):
+        try:
+            barrier.wait()
+            for _ in range(self.movements_per_worker):
+                data = {'stock_item': self.item, 'movement_type': 'out', 'quantity': Decimal('1.5'), 'date': date(2025, 3, 1)}
+                while True:
+                    try:
+                        stock.record_movement(data)
+                        break
+                    except OperationalError:
+                        # SQLite reports write contention instead of waiting; PostgreSQL blocks on the row lock
+                        time.sleep(0.001)
+        except Exception as exc:  # surfaced in the main thread
+            failures.append(exc)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_movements_lose_no_updates(self):
+        barrier = threading.Barrier(self.workers)
+        failures = []
+        threads = [threading.Thread(target=self._feed_out, args=(barrier, failures)) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+        total = self.workers * self.movements_per_worker
+        self.item.refresh_from_db()
+        self.assertEqual(StockMovement.objects.count(), total)
+        self.assertEqual(self.item.quantity, Decimal('1000') - Decimal('1.5') * total)
+
+
+class StockCheckpointTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='checkpoint@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=self.user))
+        self.item = StockItem.objects.create(farm=farm, name='Maïs', item_type='feed', quantity=100)
+        for day, movement_type, quantity in (('2025-01-10', 'in', 50), ('2025-02-05', 'out', 20), ('2025-03-03', 'out', 10)):
+            stock.record_movement({
+                'stock_item': self.item, 'movement_type': movement_type, 'quantity': Decimal(quantity),
+                'date': date.fromisoformat(day),
+            })
+        stock.rebuild_checkpoints(self.item.id, today=date(2025, 4, 15))
+
+    def _as_of(self, day):
+        return self.client.get(reverse('stock-item-as-of', args=[self.item.id]), {'date': day})
+
+    def test_as_of_starts_from_nearest_checkpoint(self):
+        self.assertEqual(
+            list(self.item.checkpoints.values_list('kind', 'date', 'quantity')),
+            [
+                ('opening', date(2025, 1, 9), Decimal('100')),
+                ('month_end', date(2025, 1, 31), Decimal('150')),
+                ('month_end', date(2025, 2, 28), Decimal('130')),
+                ('month_end', date(2025, 3, 31), Decimal('120')),
+            ],
+        )
+        res = self._as_of('2025-02-10')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['quantity'], res.data['checkpoint_date']), ('130.000', date(2025, 1, 31)))
+        self.assertEqual(self._as_of('2025-01-05').data['quantity'], '100.000')
+        self.assertEqual(self._as_of('2025-13-01').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_back_dated_movement_shifts_later_checkpoints(self):
+        movement = {'stock_item': str(self.item.id), 'movement_type': 'out', 'quantity': '5', 'date': '2025-02-01'}
+        self.client.post(reverse('stock-movement-list'), movement, format='json')
+        self.assertEqual(self._as_of('2025-03-15').data['quantity'], '115.000')
+        self.assertEqual(self.item.checkpoints.get(date=date(2025, 1, 31)).quantity, Decimal('150'))
+        self.assertEqual(self.item.checkpoints.get(date=date(2025, 2, 28)).quantity, Decimal('125'))
+
+    def test_repair_command_flags_and_fixes_drift(self):
+        StockItem.objects.filter(pk=self.item.pk).update(quantity=999)
+        out = StringIO()
+        call_command('rebuild_stock_checkpoints', '--check-only', stdout=out)
+        self.assertIn(str(self.item.id), out.getvalue())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('999'))
+
+        call_command('rebuild_stock_checkpoints', stdout=StringIO())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('120'))
+        self.assertEqual(self.item.checkpoints.get(date=date(2025, 3, 31)).quantity, Decimal('120'))
+
+    def test_movements_close_the_previous_months(self):
+        item = StockItem.objects.create(farm=self.item.farm, name='Soja', item_type='feed', quantity=0)
+
+        def move(now, movement_type, quantity, day):
+            with mock.patch('apps.core.stock.timezone.now', return_value=timezone.make_aware(now)):
+                stock.record_movement({
+                    'stock_item': item, 'movement_type': movement_type, 'quantity': Decimal(quantity), 'date': day,
+                })
+
+        move(datetime(2025, 5, 20), 'in', 40, date(2025, 5, 10))
+        move(datetime(2025, 7, 2), 'out', 15, date(2025, 7, 1))
+        move(datetime(2025, 7, 3), 'out', 5, date(2025, 7, 2))
+        self.assertEqual(
+            list(item.checkpoints.values_list('kind', 'date', 'quantity')),
+            [
+                ('opening', date(2025, 5, 9), Decimal('0')),
+                ('month_end', date(2025, 5, 31), Decimal('40')),
+                ('month_end', date(2025, 6, 30), Decimal('40')),
+            ],
+        )
+        res = self.client.get(reverse('stock-item-as-of', args=[item.id]), {'date': '2025-07-01'})
+        self.assertEqual((res.data['quantity'], res.data['checkpoint_date']), ('25.000', date(2025, 6, 30)))
+        drift, _ = stock.rebuild_checkpoints(item.id, today=date(2025, 7, 3))
+        self.assertEqual((drift, item.checkpoints.count()), (0, 3))
+
+
+class DashboardCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dashcache@example.com', password='password123', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=self.user))
+        self.stock_item = StockItem.objects.create(farm=self.farm, name='Maïs', item_type='feed', quantity=10, alert_threshold=5)
+        self.url = reverse('dashboard-summary')
+
+    def _get(self, **headers):
+        return self.client.get(self.url, {'farm_id': str(self.farm.id)}, **headers)
+
+    def test_hit_and_not_modified(self):
+        before = self.client.get(reverse('dashboard-cache-stats')).data
+        first = self._get()
+        with CaptureQueriesContext(connection) as queries:
+            second = self._get()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(queries), 1)  # access check only
+
+        res = self._get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        after = self.client.get(reverse('dashboard-cache-stats')).data
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+    def test_writes_invalidate_the_farm(self):
+        first = self._get()
+        self.assertEqual(first.data['stock_alerts'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.record_movement({
+                'stock_item': self.stock_item, 'movement_type': 'out', 'quantity': Decimal('8'), 'date': date(2025, 3, 1),
+            })
+        res = self._get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], first['ETag'])
+        self.assertEqual([alert['name'] for alert in res.data['stock_alerts']], ['Maïs'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FinancialEntry.objects.create(farm=self.farm, date=timezone.now().date(), entry_type='cost', category='feed', amount=3)
+        self.assertEqual(self._get().data['farm_margin_30d'], -3.0)
+
+
+    @override_settings(DASHBOARD_CACHE_VERSION_TTL=30)
+    def test_version_token_expires(self):
+        # Another worker's invalidation never reaches this process: its own token has to run out
+        dashboard_cache.get_cache().delete(dashboard_cache._version_key(self.farm.id))
+        version = dashboard_cache.farm_version(self.farm.id)
+        self.assertEqual(dashboard_cache.farm_version(self.farm.id), version)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 31):
+            self.assertNotEqual(dashboard_cache.farm_version(self.farm.id), version)
+
+    def test_check_warns_on_process_local_caches_with_several_workers(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '2'}):
+            self.assertEqual([warning.id for warning in caches_shared(None)], ['core.W001', 'core.W002'])
+            redis = {
+                alias: {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': f'redis://cache:6379/{db}'}
+                for alias, db in (('dashboard', 1), ('auth', 2))
+            }
+            with override_settings(CACHES=redis):
+                self.assertEqual(caches_shared(None), [])
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '1'}):
+            self.assertEqual(caches_shared(None), [])
+
+class EnterpriseDashboardTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='entdash@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.url = reverse('dashboard-enterprise-summary')
+
+    def _add_farm(self, name, cost):
+        farm = Farm.objects.create(name=name, enterprise=self.enterprise)
+        StockItem.objects.create(farm=farm, name='Maïs', item_type='feed', quantity=1, alert_threshold=5)
+        FinancialEntry.objects.create(farm=farm, date=timezone.now().date(), entry_type='cost', category='feed', amount=cost)
+        return farm
+
+    def _get(self, **headers):
+        return self.client.get(self.url, {'enterprise_id': str(self.enterprise.id)}, **headers)
+
+    def test_per_farm_rows_and_totals(self):
+        self._add_farm('B', 2)
+        self._add_farm('A', 3)
+        res = self._get()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['farm_name'] for row in res.data['farms']], ['A', 'B'])
+        self.assertEqual([row['farm_margin_30d'] for row in res.data['farms']], [-3.0, -2.0])
+        self.assertEqual(res.data['totals']['farm_margin_30d'], -5.0)
+        self.assertEqual(res.data['totals']['stock_alerts_count'], 2)
+
+        not_modified = self._get(HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_query_count_does_not_grow_with_farms(self):
+        self._add_farm('A', 1)
+        with CaptureQueriesContext(connection) as one_farm:
+            self._get()
+        for index in range(3):
+            self._add_farm(f'F{index}', 1)
+        with CaptureQueriesContext(connection) as four_farms:
+            res = self._get()
+        self.assertEqual(len(res.data['farms']), 4)
+        self.assertEqual(len(four_farms), len(one_farm))
+
+    def test_foreign_enterprise_is_refused(self):
+        other = User.objects.create_user(email='entdash-other@example.com', password='password123')
+        foreign = Enterprise.objects.create(name='Other', owner=other)
+        Farm.objects.create(name='Hidden', enterprise=foreign)
+        res = self.client.get(self.url, {'enterprise_id': str(foreign.id)})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='etag@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=self.user))
+        self.items = [
+            StockItem.objects.create(farm=self.farm, name=name, item_type='feed', quantity=10) for name in ('Maïs', 'Soja')
+        ]
+        self.url = reverse('stock-item-list')
+
+    def test_unchanged_list_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+        self.assertNotEqual(self.client.get(self.url, {'farm_id': str(self.farm.id)})['ETag'], first['ETag'])
+
+    def test_updates_and_soft_deletes_change_the_validator(self):
+        etag = self.client.get(self.url)['ETag']
+        StockItem.objects.filter(pk=self.items[0].pk).update(name='Blé', updated_at=timezone.now() + timedelta(seconds=5))
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res['ETag']
+        StockItem.objects.filter(pk=self.items[1].pk).delete()
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 1)
+
+    def test_detail_last_modified(self):
+        url = reverse('stock-item-detail', args=[self.items[0].id])
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.get(reverse('species-list'))
+        self.assertIn('ETag', res)
+
+
+class LotTimeseriesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='series@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=self.user))
+        breeding_type = BreedingType.objects.create(code='TS', name='Volaille')
+        species = Species.objects.create(code='ts_broiler', name='Poulet', breeding_type=breeding_type)
+        unit = Unit.objects.create(name='Unit', farm=farm, breeding_type=breeding_type, capacity=100)
+        self.lot = Lot.objects.create(unit=unit, species=species, code='TS1', entry_date='2025-01-01', initial_count=100)
+        self.start = date(2025, 1, 6)  # a Monday
+        LotDailyRecord.objects.bulk_create([
+            LotDailyRecord(
+                lot=self.lot, date=self.start + timedelta(days=day), mortality=1, feed_intake_kg=2,
+                avg_weight_kg=Decimal('1.0') + Decimal(day) / 10,
+            )
+            for day in range(28)
+        ])
+        self.url = reverse('lot-timeseries', args=[self.lot.id])
+
+    def test_budget_coarsens_buckets(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['bucket'], len(res.data['buckets'])), ('day', 28))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.url, {'max_points': 10, 'metrics': 'mortality,avg_weight_kg:last,avg_weight_kg'})
+        self.assertEqual(sum('core_lotdailyrecord' in query['sql'] for query in queries.captured_queries), 2)
+        self.assertEqual(res.data['bucket'], 'week')
+        self.assertEqual(res.data['buckets'][0], self.start)
+        self.assertEqual(res.data['records'], [7, 7, 7, 7])
+        self.assertEqual(res.data['series']['mortality'], [7.0, 7.0, 7.0, 7.0])
+        self.assertEqual(res.data['series']['avg_weight_kg'], [1.6, 2.3, 3.0, 3.7])
+
+    def test_explicit_bucket_and_aggregations(self):
+        res = self.client.get(self.url, {'bucket': 'month', 'metrics': 'feed_intake_kg:max,avg_weight_kg:min'})
+        self.assertEqual(res.data['buckets'], [date(2025, 1, 1), date(2025, 2, 1)])
+        self.assertEqual(res.data['series'], {'feed_intake_kg': [2.0, 2.0], 'avg_weight_kg': [1.0, 3.6]})
+        self.assertEqual(self.client.get(self.url, {'metrics': 'weight:sum'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LotAnalyticsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='analytics@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=self.user))
+        breeding_type = BreedingType.objects.create(code='AN', name='Volaille')
+        species = Species.objects.create(code='an_broiler', name='Poulet', breeding_type=breeding_type)
+        unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=breeding_type, capacity=100)
+        self.broilers = Lot.objects.create(unit=unit, species=species, code='A', entry_date='2025-01-01', initial_count=100)
+        self.layers = Lot.objects.create(unit=unit, species=species, code='B', entry_date='2025-01-01', initial_count=10)
+        self.empty = Lot.objects.create(unit=unit, species=species, code='C', entry_date='2025-01-01', initial_count=10)
+        for day, mortality, feed, weight in ((1, 2, 10, '1.0'), (2, 0, 10, '0'), (3, 3, 12, '1.4')):
+            LotDailyRecord.objects.create(
+                lot=self.broilers, date=date(2025, 1, day), mortality=mortality, feed_intake_kg=feed, avg_weight_kg=weight
+            )
+        for day, eggs in ((1, 8), (2, 9)):
+            LotDailyRecord.objects.create(lot=self.layers, date=date(2025, 1, day), eggs_count=eggs)
+        self.url = reverse('lot-analytics')
+
+    def test_per_lot_metrics(self):
+        res = self.client.get(self.url, {'farm_id': str(self.farm.id)})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lots = {row['lot_code']: row for row in res.data['lots']}
+        broilers = lots['A']
+        self.assertEqual((broilers['mortality'], broilers['current_headcount']), (5, 95))
+        self.assertEqual(broilers['mortality_rate_percent'], 5.0)
+        self.assertEqual(broilers['adg_kg'], 0.2)
+        self.assertEqual(broilers['fcr'], round(22 / 35, 4))
+        self.assertEqual(broilers['last_date'], date(2025, 1, 3))
+        self.assertEqual(lots['B']['laying_rate_percent'], 85.0)
+        self.assertIsNone(lots['B']['adg_kg'])
+        self.assertEqual(lots['C']['record_days'], 0)
+        self.assertNotIn('mortality_curve', broilers)
+
+    def test_curves_and_required_scope(self):
+        res = self.client.get(self.url, {'farm_id': str(self.farm.id), 'curves': 'true'})
+        curve = next(row for row in res.data['lots'] if row['lot_code'] == 'A')['mortality_curve']
+        self.assertEqual(curve, {'dates': ['2025-01-01', '2025-01-02', '2025-01-03'], 'rate_percent': [2.0, 2.0, 5.0]})
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ScaleCommandTests(APITestCase):
+    def test_seed_scale_data_is_consistent_and_benchmarkable(self):
+        call_command(
+            'seed_scale', '--enterprises', '1', '--farms', '2', '--units', '4', '--lots-per-unit', '2', '--days', '60',
+            '--events-per-lot', '2', '--email', 'scale-test@example.com', stdout=StringIO(),
+        )
+        user = User.objects.get(email='scale-test@example.com')
+        self.assertEqual(Farm.objects.filter(enterprise__owner=user).count(), 2)
+        self.assertEqual(Lot.objects.filter(unit__farm__enterprise__owner=user).count(), 16)
+        self.assertGreater(LotDailyRecord.objects.count(), 500)
+        # Lots never lose more animals than they started with
+        for lot in Lot.objects.all():
+            dead = lot.daily_records.aggregate(total=Sum('mortality'))['total'] or 0
+            self.assertLessEqual(dead, lot.initial_count)
+        self.assertEqual(rollups.diff(), [])
+        closed = Lot.objects.filter(status='closed')
+        self.assertTrue(closed.exists())
+        self.assertFalse(closed.filter(closed_at__isnull=True).exists())
+        for item in StockItem.objects.filter(farm__enterprise__owner=user):
+            self.assertEqual(item.quantity, stock.net_quantity(item.movements.all()))
+            self.assertGreaterEqual(item.quantity, 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'bench.json'
+            call_command(
+                'bench_api', '--email', 'scale-test@example.com', '--requests', '2', '--warmup', '1',
+                '--output', str(output), stdout=StringIO(),
+            )
+            report = json.loads(output.read_text())
+        self.assertEqual(report['meta']['rows']['Farm'], 2)
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+
+class BenchIndexesCommandTests(TransactionTestCase):
+    def _index_names(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, LotDailyRecord._meta.db_table)
+        return {name for name, info in constraints.items() if info['index']}
+
+    def test_compare_restores_indexes_when_measurement_is_interrupted(self):
+        expected = {index.name for index in LotDailyRecord._meta.indexes}
+        self.assertLessEqual(expected, self._index_names())
+        with mock.patch.object(bench_indexes.Command, '_measure', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('bench_indexes', '--rows', '20', '--enterprises', '1', '--lots', '2', '--compare', stdout=StringIO())
+        self.assertLessEqual(expected, self._index_names())
+
+    def test_compare_refused_on_a_regular_database(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': '/srv/agritrack/db.sqlite3'}), \
+                mock.patch.object(connection, 'is_in_memory_db', return_value=False):
+            with self.assertRaises(CommandError):
+                call_command('bench_indexes', '--compare', stdout=StringIO())
+        self.assertTrue(bench_indexes.is_disposable_database(connection))
+
+
+class SoftDeleteCascadeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='cascade@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        Membership.objects.create(user=self.user, enterprise=self.enterprise, role='owner')
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.breeding_type = BreedingType.objects.create(code='CAS', name='Volaille')
+        self.species = Species.objects.create(code='cascade_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=self.breeding_type, capacity=100)
+        self.stock_item = StockItem.objects.create(farm=self.farm, name='Feed', item_type='feed', quantity=10)
+        self.today = timezone.now().date()
+        self.lots = [self._lot(index) for index in range(2)]
+
+    def _lot(self, index):
+        lot = Lot.objects.create(unit=self.unit, species=self.species, code=f'LOT{index}', entry_date='2025-01-01', initial_count=100)
+        LotDailyRecord.objects.create(lot=lot, date=self.today, mortality=1)
+        HealthEvent.objects.create(lot=lot, date=self.today, event_type='vaccination')
+        FinancialEntry.objects.create(farm=self.farm, lot=lot, date=self.today, entry_type='cost', category='feed', amount=10)
+        return lot
+
+    def _delete_farm_updates(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.delete(reverse('farm-detail', args=[self.farm.id]))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        return sorted(query['sql'].split()[1].strip('"') for query in ctx.captured_queries if query['sql'].startswith('UPDATE'))
+
+    def test_farm_delete_cascades_with_one_update_per_table(self):
+        updates = self._delete_farm_updates()
+        self.assertEqual(updates, sorted([
+            'core_farm', 'core_unit', 'core_lot', 'core_lotdailyrecord', 'core_healthevent', 'core_reproductionevent',
+            'core_stockitem', 'core_stockmovement', 'core_financialentry',
+            # Headcount recount of the farm's lots
+            'core_lot',
+        ]))
+        self.assertFalse(Lot.objects.exists())
+        self.assertFalse(LotDailyRecord.objects.exists())
+        self.assertFalse(FinancialEntry.objects.exists())
+        self.assertFalse(DailyRollup.objects.filter(farm=self.farm).exists())
+        stamps = {lot.deleted_at for lot in Lot.all_objects.all()} | {Farm.all_objects.get(pk=self.farm.pk).deleted_at}
+        self.assertEqual(len(stamps), 1)
+
+        Farm.all_objects.filter(pk=self.farm.pk).restore()
+        self.lots += [self._lot(index) for index in range(2, 12)]
+        self.assertEqual(self._delete_farm_updates(), updates)
+
+    def test_restore_brings_back_only_cascaded_rows(self):
+        deleted_before = self.lots[0]
+        deleted_before.delete()
+        self.client.delete(reverse('unit-detail', args=[self.unit.id]))
+        self.assertFalse(Lot.objects.exists())
+
+        res = self.client.post(reverse('unit-restore', args=[self.unit.id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Lot.objects.values_list('id', flat=True)), [self.lots[1].id])
+        self.assertEqual(LotDailyRecord.objects.get().lot_id, self.lots[1].id)
+        self.assertTrue(LotDailyRecord.all_objects.get(lot=deleted_before).is_deleted)
+        self.assertEqual(DailyRollup.objects.filter(record_count=1).values_list('lot_id', flat=True).get(), self.lots[1].id)
+        # Only the records leave the rollups of a deleted lot: its finance entry still counts
+        self.assertEqual(DailyRollup.objects.filter(lot=deleted_before).values_list('entry_count', flat=True).get(), 1)
+
+    def test_restore_is_refused_under_a_deleted_parent(self):
+        self.client.delete(reverse('farm-detail', args=[self.farm.id]))
+        res = self.client.post(reverse('unit-restore', args=[self.unit.id]))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.delete(reverse('enterprise-detail', args=[self.enterprise.id]))
+        res = self.client.post(reverse('enterprise-restore', args=[self.enterprise.id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # The farm was deleted before the enterprise, so it stays deleted
+        self.assertFalse(Farm.objects.exists())
+        self.assertTrue(Membership.objects.filter(enterprise=self.enterprise).exists())
+
+        self.assertEqual(self.client.post(reverse('farm-restore', args=[self.farm.id])).status_code, status.HTTP_200_OK)
+        self.assertEqual(Lot.objects.count(), 2)
+        self.assertEqual(rollups.diff(), [])
+
+    def test_user_role_cannot_restore(self):
+        member = User.objects.create_user(email='cascade-member@example.com', password='password123')
+        Membership.objects.create(user=member, enterprise=self.enterprise, role='user')
+        self.lots[0].delete()
+        self.client.force_authenticate(member)
+        res = self.client.post(reverse('lot-restore', args=[self.lots[0].id]))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Lot.objects.filter(pk=self.lots[0].pk).exists())
+
+
+class LotArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='archive@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        self.breeding_type = BreedingType.objects.create(code='ARC', name='Volaille')
+        self.species = Species.objects.create(code='archive_broiler', name='Poulet', breeding_type=self.breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=self.breeding_type, capacity=100)
+        self.lot = Lot.objects.create(unit=self.unit, species=self.species, code='OLD', entry_date='2024-01-01', initial_count=100)
+        for day in range(1, 6):
+            LotDailyRecord.objects.create(
+                lot=self.lot, date=date(2024, 1, day), mortality=day, feed_intake_kg='2.5', avg_weight_kg=Decimal(day) / 10
+            )
+        LotDailyRecord.objects.create(lot=self.lot, date=date(2024, 1, 9), mortality=50).delete()
+        HealthEvent.objects.create(lot=self.lot, date=date(2024, 1, 2), event_type='vaccination', product='Gumboro')
+        FinancialEntry.objects.create(farm=self.farm, lot=self.lot, date=date(2024, 1, 3), entry_type='cost', category='feed', amount=20)
+        self.lot.status = 'closed'
+        self.lot.save()
+        Lot.objects.filter(pk=self.lot.pk).update(closed_at=timezone.now() - timedelta(days=400))
+
+    def _archive(self):
+        out = StringIO()
+        call_command('archive_lots', '--months', '6', stdout=out)
+        self.assertIn('1 lot(s) archivé(s)', out.getvalue())
+
+    def test_closed_at_follows_status(self):
+        lot = Lot.objects.create(unit=self.unit, species=self.species, code='NEW', entry_date='2025-01-01', initial_count=10)
+        self.assertIsNone(lot.closed_at)
+        lot.status = 'closed'
+        lot.save(update_fields=['status'])
+        lot.refresh_from_db()
+        self.assertIsNotNone(lot.closed_at)
+        self.assertFalse(archive.eligible_lots(6).filter(pk=lot.pk).exists())
+
+    def test_history_moves_to_the_archive_and_rollups_stay(self):
+        rollups_before = list(DailyRollup.objects.order_by('date').values_list('date', 'mortality', 'cost'))
+        self._archive()
+
+        self.assertFalse(LotDailyRecord.all_objects.filter(lot=self.lot).exists())
+        self.assertFalse(HealthEvent.all_objects.filter(lot=self.lot).exists())
+        lot_archive = LotArchive.objects.get(lot=self.lot)
+        self.assertEqual(lot_archive.row_counts, {'daily_records': 5, 'health_events': 1, 'reproduction_events': 0})
+        self.assertEqual(lot_archive.summary['mortality'], 15)
+        self.assertEqual(lot_archive.summary['feed_intake_kg'], 12.5)
+        self.assertEqual(lot_archive.summary['final_avg_weight_kg'], 0.5)
+        self.assertEqual(lot_archive.summary['last_date'], '2024-01-05')
+
+        self.assertEqual(list(DailyRollup.objects.order_by('date').values_list('date', 'mortality', 'cost')), rollups_before)
+        self.assertEqual(rollups.diff(), [])
+        # A finance edit on the archived lot recomputes its day from the archive
+        FinancialEntry.objects.filter(lot=self.lot).get().delete()
+        self.assertEqual(DailyRollup.objects.get(lot=self.lot, date=date(2024, 1, 3)).mortality, 3)
+
+        res = self.client.get(reverse('lot-detail', args=[self.lot.id]))
+        self.assertEqual(res.data['archive_summary']['record_count'], 5)
+
+        # Nothing left to archive
+        out = StringIO()
+        call_command('archive_lots', '--dry-run', stdout=out)
+        self.assertIn('0 lot(s) à archiver', out.getvalue())
+
+    def test_lot_lists_fall_back_to_the_archive(self):
+        url = reverse('lot-record-list')
+        before = self.client.get(url, {'lot_id': self.lot.id}).data
+        self._archive()
+        self.assertFalse(self.client.get(url).data['results'])
+
+        after = self.client.get(url, {'lot_id': self.lot.id}).data
+        self.assertEqual(after['count'], 5)
+        self.assertEqual(after['results'], before['results'])
+
+        res = self.client.get(url, {'lot_id': self.lot.id, 'date_from': '2024-01-04', 'pagination': 'cursor'})
+        self.assertEqual([row['date'] for row in res.data['results']], ['2024-01-05', '2024-01-04'])
+        self.assertIsNone(res.data['next'])
+
+        res = self.client.get(reverse('health-event-list'), {'lot_id': self.lot.id})
+        self.assertEqual([row['product'] for row in res.data['results']], ['Gumboro'])
+
+        # A deleted lot takes its archived history with it
+        self.lot.delete()
+        self.assertEqual(self.client.get(url, {'lot_id': self.lot.id}).data['count'], 0)
+        self.lot.restore()
+        self.assertEqual(self.client.get(url, {'lot_id': self.lot.id}).data['count'], 5)
+
+        outsider = User.objects.create_user(email='archive-outsider@example.com', password='password123')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(url, {'lot_id': self.lot.id}).data['count'], 0)
+
+    def test_archiving_changes_the_lot_etag(self):
+        url = reverse('lot-detail', args=[self.lot.id])
+        etag = self.client.get(url)['ETag']
+        self._archive()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['archive_summary']['record_count'], 5)
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='async@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=self.enterprise)
+        breeding_type = BreedingType.objects.create(code='ASY', name='Volaille')
+        species = Species.objects.create(code='async_broiler', name='Poulet', breeding_type=breeding_type)
+        unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=breeding_type, capacity=100)
+        lot = Lot.objects.create(unit=unit, species=species, code='A', entry_date='2025-01-01', initial_count=100)
+        today = timezone.now().date()
+        for days_ago, weight in ((3, '1.0'), (1, '1.4')):
+            LotDailyRecord.objects.create(lot=lot, date=today - timedelta(days=days_ago), mortality=1, feed_intake_kg=10, avg_weight_kg=weight)
+        FinancialEntry.objects.create(farm=self.farm, lot=lot, date=today, entry_type='revenue', category='sale', amount=50)
+        StockItem.objects.create(farm=self.farm, name='Maïs', item_type='feed', quantity=1, alert_threshold=5)
+
+    def test_async_endpoints_answer_like_the_sync_ones(self):
+        cases = (
+            ('dashboard-summary', 'async-dashboard-summary', {'farm_id': str(self.farm.id)}),
+            ('dashboard-enterprise-summary', 'async-dashboard-enterprise-summary', {'enterprise_id': str(self.enterprise.id)}),
+            ('lot-analytics', 'async-lot-analytics', {'farm_id': str(self.farm.id), 'curves': 'true'}),
+        )
+        for sync_name, async_name, params in cases:
+            with self.subTest(async_name):
+                expected = self.client.get(reverse(sync_name), params)
+                res = self.client.get(reverse(async_name), params)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res.json(), expected.json())
+                self.assertEqual(res.get('ETag'), expected.get('ETag'))
+                if res.get('ETag'):
+                    not_modified = self.client.get(reverse(async_name), params, HTTP_IF_NONE_MATCH=res['ETag'])
+                    self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_async_endpoints_check_authentication_and_scope(self):
+        url = reverse('async-dashboard-summary')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('async-lot-analytics')).status_code, status.HTTP_400_BAD_REQUEST)
+        foreign = Farm.objects.create(
+            name='Other', enterprise=Enterprise.objects.create(name='Other', owner=User.objects.create_user(email='async-x@example.com'))
+        )
+        self.assertEqual(self.client.get(url, {'farm_id': str(foreign.id)}).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(None)
+        res = self.client.get(url, {'farm_id': str(self.farm.id)})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', res['WWW-Authenticate'])
+        token = RefreshToken.for_user(self.user).access_token
+        res = self.client.get(url, {'farm_id': str(self.farm.id)}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(QUERY_FANOUT_WORKERS=4)
+class QueryFanoutTests(TransactionTestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='fanout@example.com', password='password123')
+        self.farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=owner))
+        StockItem.objects.create(farm=self.farm, name='Maïs', item_type='feed', quantity=1, alert_threshold=5)
+
+    def test_independent_queries_run_on_the_pool_outside_transactions(self):
+        names = fanout.gather(lambda: threading.current_thread().name, lambda: Farm.objects.count())
+        self.assertTrue(names[0].startswith('query-fanout'))
+        self.assertEqual(names[1], 1)
+        with transaction.atomic():
+            self.assertEqual(fanout.gather(lambda: threading.current_thread().name), [threading.current_thread().name])
+
+        summary = dashboard.farm_summary(self.farm.id)
+        self.assertEqual(len(summary['stock_alerts']), 1)
+        self.assertEqual(async_to_sync(dashboard.afarm_summary)(self.farm.id), summary)
+
+    def test_queries_on_the_pool_count_for_the_request(self):
+        request_metrics = instrumentation.RequestMetrics()
+        token = instrumentation._current.set(request_metrics)
+        try:
+            fanout.gather(lambda: Farm.objects.count(), lambda: StockItem.objects.count())
+        finally:
+            instrumentation._current.reset(token)
+        self.assertEqual(request_metrics.queries, 2)
+
+
+class FakeConnection:
+    def __init__(self, transaction_status=0, rollback_fails=False):
+        self.closed = 0
+        self.transaction_status = transaction_status
+        self.rollback_fails = rollback_fails
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def rollback(self):
+        if self.rollback_fails:
+            raise pool_backend.base.Database.OperationalError('server closed the connection')
+        self.transaction_status = 0
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_released_connections_are_reused_and_overflow_is_closed(self):
+        pool = db_pool.ConnectionPool(size=1, max_overflow=1, timeout=0.05)
+        first = pool.acquire(FakeConnection)
+        extra = pool.acquire(FakeConnection)
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.acquire(FakeConnection)
+        pool.release(extra)
+        pool.release(first)
+        self.assertTrue(extra.closed)
+        self.assertIs(pool.acquire(FakeConnection), first)
+
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['in_use'], stats['idle']), (1, 1, 0))
+        self.assertEqual((stats['connects'], stats['checkouts'], stats['timeouts']), (2, 3, 1))
+
+    def test_waiting_checkout_gets_the_next_release(self):
+        pool = db_pool.ConnectionPool(size=1, max_overflow=0, timeout=5)
+        held = pool.acquire(FakeConnection)
+        threading.Timer(0.05, pool.release, args=(held,)).start()
+        self.assertIs(pool.acquire(FakeConnection), held)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['waiting']), (1, 0))
+        self.assertGreater(stats['wait_time_max_ms'], 0)
+
+    def test_stale_broken_and_aged_connections_are_replaced(self):
+        def ping(conn):
+            if conn.closed:
+                raise OperationalError('connection lost')
+
+        pool = db_pool.ConnectionPool(size=2, ping=ping, ping_after=0, recycle=0.05)
+        broken = pool.acquire(FakeConnection)
+        pool.release(broken)
+        broken.closed = 1
+        fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, broken)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+        time.sleep(0.06)
+        pool.release(fresh)
+        self.assertTrue(fresh.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['idle'], stats['discarded']), (0, 0, 2))
+
+    def test_backend_hands_connections_back_to_the_pool(self):
+        wrapper = pool_backend.DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': 'pool_test', 'USER': '', 'HOST': '', 'PORT': '', 'POOL': {'size': 1}},
+            alias='pool-test',
+        )
+        self.addCleanup(db_pool._pools.pop, wrapper._pool_key(), None)
+        opened = [FakeConnection(), FakeConnection()]
+        with mock.patch.object(pool_backend.base.DatabaseWrapper, 'get_new_connection', side_effect=opened):
+            wrapper.connection = wrapper.get_new_connection({})
+            wrapper._close()
+            self.assertIs(wrapper.get_new_connection({}), opened[0])
+            # Left mid-transaction with a dead server: closed, not pooled
+            opened[0].transaction_status, opened[0].rollback_fails = 3, True
+            wrapper._close()
+            self.assertIs(wrapper.get_new_connection({}), opened[1])
+        self.assertTrue(opened[0].closed)
+        self.assertEqual(wrapper._pool().stats()['connects'], 2)
+
+    def test_pool_stats_endpoint_is_staff_only(self):
+        key = ('pool-stats', 'db', '', '', '')
+        db_pool.get_pool(key, lambda: db_pool.ConnectionPool(alias='pool-stats', database='db'))
+        self.addCleanup(db_pool._pools.pop, key, None)
+        client = APIClient()
+        client.force_authenticate(User(email='staff@example.com', is_staff=True))
+        response = client.get(reverse('db-pool-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('pool-stats', [stats['alias'] for stats in response.data['pools']])
+
+        client.force_authenticate(User(email='user@example.com'))
+        self.assertEqual(client.get(reverse('db-pool-stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='metrics@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        Membership.objects.create(user=self.user, enterprise=enterprise, role='owner')
+        self.farm = Farm.objects.create(name='Farm', enterprise=enterprise)
+
+    def _middleware(self, view):
+        return instrumentation.RequestInstrumentationMiddleware(view)(RequestFactory().get('/api/farms/'))
+
+    def test_server_timing_header_and_route_histograms(self):
+        response = self.client.get(reverse('farm-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'db', 'serialize', 'app', 'total'})
+        self.assertNotIn('"0 queries"', timing['db'])
+
+        self.assertIn(('GET', 'farm-list'), instrumentation.QUERIES._values)
+        self.assertGreaterEqual(instrumentation.REQUESTS._values[('GET', 'farm-list', '200')], 1)
+
+    @override_settings(DUPLICATE_QUERY_THRESHOLD=3, SLOW_REQUEST_MS=0)
+    def test_slow_requests_and_repeated_queries_are_logged_with_their_origin(self):
+        def view(request):
+            for _ in range(3):
+                Farm.objects.filter(pk=self.farm.pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs('apps.common.instrumentation', 'WARNING') as logs:
+            self._middleware(view)
+        self.assertIn('Requête lente GET /api/farms/', logs.output[0])
+        self.assertIn('répétée 3 fois', logs.output[1])
+        self.assertIn('apps/core/tests.py', logs.output[1])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('demo_seconds', 'Demo.', ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(('a',), value)
+        self.assertEqual(list(histogram.samples()), [
+            'demo_seconds_bucket{route="a",le="0.1"} 1',
+            'demo_seconds_bucket{route="a",le="1"} 2',
+            'demo_seconds_bucket{route="a",le="+Inf"} 3',
+            'demo_seconds_sum{route="a"} 5.55',
+            'demo_seconds_count{route="a"} 3',
+        ])
+
+    def test_metrics_endpoint_requires_the_configured_token(self):
+        self.client.get(reverse('farm-list'))
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(METRICS_TOKEN='scrape-secret'):
+            denied = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(denied.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_db_queries_count{method="GET",route="farm-list"}', body)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(email='jwt@example.com', password='password123', first_name='Ana')
+        self.request = RequestFactory().get(
+            '/api/farms/', HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        )
+
+    def _authenticate(self):
+        return CachedJWTAuthentication().authenticate(Request(self.request))[0]
+
+    def test_warm_cache_authenticates_without_queries(self):
+        with self.assertNumQueries(1):
+            first = self._authenticate()
+        with self.assertNumQueries(0):
+            second = self._authenticate()
+        self.assertEqual((second.pk, second.email, second.first_name), (self.user.pk, 'jwt@example.com', 'Ana'))
+        # Each request gets its own instance
+        self.assertIsNot(second, first)
+
+        response = self.client.get(reverse('farm-list'), HTTP_AUTHORIZATION=self.request.headers['Authorization'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_saved_or_deactivated_users_are_reloaded(self):
+        self._authenticate()
+        self.user.first_name = 'Bea'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._authenticate().first_name, 'Bea')
+
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+        self.assertIsNone(user_cache.get(str(self.user.pk)))
+
+    def test_entries_expire(self):
+        with self.settings(AUTH_USER_CACHE_TTL=60):
+            self._authenticate()
+            with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 61):
+                with self.assertNumQueries(1):
+                    self._authenticate()
+
+    def test_invalidation_reaches_entries_shared_with_other_workers(self):
+        # Another worker's save only bumps the version kept in the shared cache
+        self._authenticate()
+        with mock.patch('apps.users.signals.invalidate_user'):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+        self.assertIsNotNone(user_cache.get(str(self.user.pk)))
+        user_cache.invalidate(str(self.user.pk))
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+    def test_rows_read_before_an_invalidation_are_not_cached(self):
+        version = user_cache.version(str(self.user.pk))
+        user_cache.invalidate(str(self.user.pk))
+        user_cache.set(str(self.user.pk), ('stale',), version)
+        self.assertIsNone(user_cache.get(str(self.user.pk)))
+
+
+class LotHeadcountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='headcount@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        enterprise = Enterprise.objects.create(name='Ent', owner=self.user)
+        self.farm = Farm.objects.create(name='Farm', enterprise=enterprise)
+        breeding_type = BreedingType.objects.create(code='HDC', name='Volaille')
+        self.species = Species.objects.create(code='headcount_layer', name='Pondeuse', breeding_type=breeding_type)
+        self.unit = Unit.objects.create(name='Unit', farm=self.farm, breeding_type=breeding_type, capacity=1000)
+        self.lot = self._lot('LOT1', 100)
+        self.today = timezone.now().date()
+
+    def _lot(self, code, initial_count):
+        return Lot.objects.create(unit=self.unit, species=self.species, code=code, entry_date='2025-01-01', initial_count=initial_count)
+
+    def _counts(self, lot=None):
+        lot = lot or self.lot
+        return tuple(Lot.all_objects.filter(pk=lot.pk).values_list('current_count', 'cumulative_mortality').get())
+
+    def _record(self, days_ago, mortality, lot=None):
+        return LotDailyRecord.objects.create(lot=lot or self.lot, date=self.today - timedelta(days=days_ago), mortality=mortality)
+
+    def test_counts_follow_record_create_update_move_and_soft_delete(self):
+        self.assertEqual(self._counts(), (100, 0))
+        record = self._record(2, 3)
+        self._record(1, 2)
+        self.assertEqual(self._counts(), (95, 5))
+
+        record.mortality = 6
+        record.save()
+        self.assertEqual(self._counts(), (92, 8))
+
+        other = self._lot('LOT2', 50)
+        record.lot = other
+        record.save()
+        self.assertEqual((self._counts(), self._counts(other)), ((98, 2), (44, 6)))
+
+        record.delete()
+        self.assertEqual(self._counts(other), (50, 0))
+        record.restore()
+        self.assertEqual(self._counts(other), (44, 6))
+        self.assertEqual(headcount.diff(), [])
+
+    def test_api_exposes_read_only_counts_and_follows_initial_count(self):
+        self._record(1, 4)
+        url = reverse('lot-detail', args=[self.lot.id])
+        res = self.client.patch(url, {'initial_count': 120, 'current_count': 1, 'cumulative_mortality': 0}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['current_count'], res.data['cumulative_mortality']), (116, 4))
+
+        # A stale instance saved later does not write back old counters
+        stale = Lot.objects.get(pk=self.lot.pk)
+        self._record(2, 6)
+        stale.destination = 'abattoir'
+        stale.save()
+        self.assertEqual((stale.current_count, self._counts()), (110, (110, 10)))
+
+    def test_bulk_upsert_and_lot_soft_delete(self):
+        self._record(1, 5)
+        rows = [
+            {'lot': str(self.lot.id), 'date': str(self.today - timedelta(days=1)), 'mortality': 2},
+            {'lot': str(self.lot.id), 'date': str(self.today), 'mortality': 1},
+        ]
+        res = self.client.post(reverse('lot-record-bulk'), rows, format='json')
+        self.assertEqual((res.data['created'], res.data['updated']), (1, 1))
+        self.assertEqual(self._counts(), (97, 3))
+
+        self.lot.delete()
+        self.lot.restore()
+        self.assertEqual((self.lot.current_count, self._counts()), (97, (97, 3)))
+
+    def test_archive_keeps_counts_and_repair_command(self):
+        self._record(1, 7)
+        self.lot.status = 'closed'
+        self.lot.save()
+        archive.archive_lot(self.lot)
+        self.assertEqual(self._counts(), (93, 7))
+
+        Lot.all_objects.filter(pk=self.lot.pk).update(current_count=0, cumulative_mortality=0)
+        self.assertEqual(len(headcount.diff()), 1)
+        out = StringIO()
+        call_command('rebuild_headcounts', '--check-only', stdout=out)
+        self.assertEqual(self._counts(), (0, 0))
+        call_command('rebuild_headcounts', stdout=out)
+        self.assertEqual(self._counts(), (93, 7))
+        self.assertIn('1 écart(s) corrigé(s)', out.getvalue())
+
+    def test_dashboard_uses_live_headcount(self):
+        layers = self._lot('LOT2', 20)
+        self._record(30, 40)
+        for days_ago in range(1, 8):
+            LotDailyRecord.objects.create(lot=layers, date=self.today - timedelta(days=days_ago), eggs_count=14)
+        self._record(1, 6)
+        summary = dashboard.farm_summary(self.farm.id, today=self.today)
+        # 54 + 20 alive now, 6 deaths this week
+        self.assertEqual(summary['mortality_rate_percent_7d'], 7.5)
+        self.assertEqual(summary['eggs_per_hen_per_day'], round(98 / (77 * 7), 3))
+
+    def test_counter_moves_change_the_lot_etags(self):
+        detail = self.client.get(reverse('lot-detail', args=[self.lot.id]))
+        listing = self.client.get(reverse('lot-list'))
+        self._record(1, 7)
+        res = self.client.get(reverse('lot-detail', args=[self.lot.id]), HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual((res.status_code, res.data['current_count']), (status.HTTP_200_OK, 93))
+        res = self.client.get(reverse('lot-list'), HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        # A recount that finds nothing to fix leaves the ETag alone
+        etag = res['ETag']
+        headcount.recount(lot_ids=[self.lot.id])
+        res = self.client.get(reverse('lot-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        Lot.all_objects.filter(pk=self.lot.pk).update(cumulative_mortality=0)
+        headcount.recount(lot_ids=[self.lot.id])
+        res = self.client.get(reverse('lot-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_closed_lots_keep_their_survivors_in_the_mortality_base(self):
+        big = self._lot('BIG', 1000)
+        LotDailyRecord.objects.create(lot=big, date=self.today - timedelta(days=1), mortality=10)
+        big.status = 'closed'
+        big.save()
+        summary = dashboard.farm_summary(self.farm.id, today=self.today)
+        # (1000 + 100) alive at the start of the week, 10 deaths
+        self.assertEqual(summary['mortality_rate_percent_7d'], round(10 / 1100 * 100, 2))
+        self.assertEqual(summary['active_lots'], 1)
+
+
+class HeadcountConcurrencyTests(TransactionTestCase):
+    workers = 6
+    rounds = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='headcount-race@example.com', password='password123')
+        farm = Farm.objects.create(name='Farm', enterprise=Enterprise.objects.create(name='Ent', owner=self.user))
+        breeding_type = BreedingType.objects.create(code='HDR', name='Volaille')
+        species = Species.objects.create(code='headcount_race', name='Pondeuse', breeding_type=breeding_type)
+        unit = Unit.objects.create(name='Unit', farm=farm, breeding_type=breeding_type, capacity=1000)
+        self.lot = Lot.objects.create(unit=unit, species=species, code='RACE', entry_date='2025-01-01', initial_count=10000)
+        self.days = [date(2025, 3, day) for day in (1, 2)]
+
+    def _write(self, worker, barrier, failures):
+        try:
+            scope = EnterpriseScope(self.user)
+            barrier.wait()
+            for round_ in range(self.rounds):
+                mortality = worker + round_ % 3
+                while True:
+                    try:
+                        if worker % 2:
+                            rows = [{'lot': str(self.lot.id), 'date': str(day), 'mortality': mortality} for day in self.days]
+                            bulk.upsert_daily_records(rows, scope)
+                        else:
+                            record = LotDailyRecord.all_objects.filter(lot=self.lot, date=self.days[0]).first()
+                            record = record or LotDailyRecord(lot=self.lot, date=self.days[0])
+                            record.mortality = mortality
+                            record.save()
+                        break
+                    except (OperationalError, IntegrityError):
+                        # SQLite reports write contention instead of waiting; PostgreSQL blocks on the row locks
+                        time.sleep(0.001)
+        except Exception as exc:  # surfaced in the main thread
+            failures.append(exc)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_upserts_and_saves_keep_the_counters_exact(self):
+        barrier = threading.Barrier(self.workers)
+        failures = []
+        threads = [threading.Thread(target=self._write, args=(worker, barrier, failures)) for worker in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+        self.assertEqual(headcount.diff(), [])
+
+
+class DataMigrationTests(TransactionTestCase):
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('core', target)])
+        return executor.loader.project_state([('core', target)]).apps
+
+    def _seed(self, apps):
+        owner = apps.get_model('users', 'User').objects.create(email='migration@example.com', password='x')
+        enterprise = apps.get_model('core', 'Enterprise').objects.create(name='Ent', owner=owner)
+        farm = apps.get_model('core', 'Farm').objects.create(name='Farm', enterprise=enterprise)
+        breeding_type = apps.get_model('core', 'BreedingType').objects.create(code='MIG', name='Volaille')
+        species = apps.get_model('core', 'Species').objects.create(code='migration_broiler', name='Poulet', breeding_type=breeding_type)
+        unit = apps.get_model('core', 'Unit').objects.create(name='Unit', farm=farm, breeding_type=breeding_type, capacity=10)
+        lot = apps.get_model('core', 'Lot').objects.create(
+            unit=unit, species=species, code='L1', entry_date=date(2024, 1, 1), initial_count=10, status='closed',
+        )
+        apps.get_model('core', 'LotDailyRecord').objects.create(lot=lot, date=date(2024, 1, 2), mortality=1)
+        item = apps.get_model('core', 'StockItem').objects.create(farm=farm, name='Feed', item_type='feed', quantity=5)
+        apps.get_model('core', 'StockMovement').objects.create(stock_item=item, movement_type='in', quantity=5, date=date(2024, 1, 2))
+        return farm, enterprise
+
+    def tearDown(self):
+        self._migrate(MigrationLoader(connection).graph.leaf_nodes('core')[0][1])
+
+    def test_scope_columns_are_backfilled_on_existing_rows(self):
+        farm, enterprise = self._seed(self._migrate('0009_daily_rollup'))
+        apps = self._migrate('0010_scope_columns')
+        for name in ('LotDailyRecord', 'StockMovement'):
+            scopes = list(apps.get_model('core', name).objects.values_list('farm_id', 'enterprise_id'))
+            self.assertEqual(scopes, [(farm.pk, enterprise.pk)], name)
+
+    def test_lots_closed_before_closed_at_existed_get_one(self):
+        self._seed(self._migrate('0013_stock_checkpoints'))
+        apps = self._migrate('0014_lot_archive')
+        lot = apps.get_model('core', 'Lot').objects.get()
+        self.assertEqual(lot.closed_at, lot.updated_at)
@@ -0,0 +1,130 @@
+"""Bucketed lot time series for charts.
+
+Records are grouped by a truncated date in SQL (day, week or month). The bucket
+is coarsened until the lot's date span fits in the point budget, so a payload
+stays small whatever the lot's age. Each metric picks its aggregation; ``last``
+is the value recorded on the latest day of the bucket.
+"""
+import math
+
+from django.db.models import Avg, Count, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ParseError
+
+from .models import LotDailyRecord
+
+METRICS = ('mortality', 'feed_intake_kg', 'milk_production_l', 'eggs_count', 'avg_weight_kg')
+AGGREGATIONS = {'sum': Sum, 'avg': Avg, 'min': Min, 'max': Max}
+DEFAULT_AGGREGATIONS = {
+    'mortality': 'sum',
+    'feed_intake_kg': 'sum',
+    'milk_production_l': 'sum',
+    'eggs_count': 'sum',
+    'avg_weight_kg': 'last',
+}
+BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+DEFAULT_MAX_POINTS = 120
+MAX_POINTS_LIMIT = 1000
+
+
+def _bucket_count(bucket, first, last):
+    days = (last - first).days + 1
+    if bucket == 'day':
+        return days
+    if bucket == 'week':
+        return math.ceil(days / 7) + 1
+    return (last.year - first.year) * 12 + last.month - first.month + 1
+
+
+def choose_bucket(requested, first, last, max_points):
+    """Finest bucket no finer than ``requested`` whose point count fits the budget."""
+    names = list(BUCKETS)
+    candidates = names if requested == 'auto' else names[names.index(requested):]
+    for bucket in candidates:
+        if _bucket_count(bucket, first, last) <= max_points:
+            return bucket
+    return candidates[-1]
+
+
+def parse_params(params):
+    bucket = params.get('bucket', 'auto')
+    if bucket != 'auto' and bucket not in BUCKETS:
+        raise ParseError(f"bucket doit être l'un de: auto, {', '.join(BUCKETS)}")
+
+    try:
+        max_points = int(params.get('max_points', DEFAULT_MAX_POINTS))
+    except ValueError:
+        raise ParseError('max_points doit être un entier')
+    if not 1 <= max_points <= MAX_POINTS_LIMIT:
+        raise ParseError(f'max_points doit être compris entre 1 et {MAX_POINTS_LIMIT}')
+
+    aggregations = dict(DEFAULT_AGGREGATIONS)
+    if params.get('metrics'):
+        aggregations = {}
+        for item in params['metrics'].split(','):
+            metric, _, aggregation = item.strip().partition(':')
+            aggregation = aggregation or DEFAULT_AGGREGATIONS.get(metric)
+            if metric not in METRICS:
+                raise ParseError(f'Métrique inconnue: {metric}')
+            if aggregation != 'last' and aggregation not in AGGREGATIONS:
+                raise ParseError(f'Agrégation inconnue pour {metric}: {aggregation}')
+            aggregations[metric] = aggregation
+
+    date_range = []
+    for name in ('date_from', 'date_to'):
+        try:
+            value = parse_date(params.get(name) or '')
+        except ValueError:
+            value = None
+        if params.get(name) and value is None:
+            raise ParseError(f'{name} doit être une date AAAA-MM-JJ')
+        date_range.append(value)
+    return bucket, max_points, aggregations, date_range
+
+
+def lot_series(lot_id, params):
+    bucket, max_points, aggregations, (date_from, date_to) = parse_params(params)
+    records = LotDailyRecord.objects.filter(lot_id=lot_id)
+    if date_from:
+        records = records.filter(date__gte=date_from)
+    if date_to:
+        records = records.filter(date__lte=date_to)
+
+    span = records.aggregate(first=Min('date'), last=Max('date'))
+    if span['first'] is None:
+        return {'lot': str(lot_id), 'bucket': None, 'aggregations': aggregations, 'buckets': [], 'records': [], 'series': {}}
+    bucket = choose_bucket(bucket, span['first'], span['last'], max_points)
+
+    trunc = BUCKETS[bucket]
+    latest_first = records.annotate(bucket=trunc('date')).filter(bucket=OuterRef('bucket')).order_by('-date')
+    annotations = {'records': Count('id')}
+    for metric, aggregation in aggregations.items():
+        if aggregation == 'last':
+            annotations[metric] = Subquery(latest_first.values(metric)[:1])
+        else:
+            annotations[metric] = AGGREGATIONS[aggregation](metric)
+
+    rows = (
+        records.annotate(bucket=trunc('date'))
+        .values('bucket')
+        .annotate(**annotations)
+        .order_by('bucket')
+    )
+
+    buckets, counts = [], []
+    series = {metric: [] for metric in aggregations}
+    for row in rows:
+        buckets.append(row['bucket'])
+        counts.append(row['records'])
+        for metric in aggregations:
+            value = row[metric]
+            series[metric].append(None if value is None else round(float(value), 3))
+    return {
+        'lot': str(lot_id),
+        'bucket': bucket,
+        'aggregations': aggregations,
+        'buckets': buckets,
+        'records': counts,
+        'series': series,
+    }
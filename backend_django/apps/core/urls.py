@@ -1,10 +1,11 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
 
+from .async_views import AsyncDashboardEnterpriseSummaryView, AsyncDashboardSummaryView, AsyncLotAnalyticsView
 from .views import (
     EnterpriseViewSet, FarmViewSet, BreedingTypeViewSet, SpeciesViewSet, UnitViewSet, LotViewSet,
     LotDailyRecordViewSet, HealthEventViewSet, ReproductionEventViewSet, FinancialEntryViewSet, StockItemViewSet, StockMovementViewSet,
-    DashboardSummaryView
+    DashboardSummaryView, DashboardEnterpriseSummaryView, DashboardCacheStatsView, DatabasePoolStatsView, MetricsView,
 )
 
 router = DefaultRouter()
@@ -24,4 +25,15 @@ router.register('stock-movements', StockMovementViewSet, basename='stock-movemen
 urlpatterns = [
     path('', include(router.urls)),
     path('dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('dashboard/enterprise-summary/', DashboardEnterpriseSummaryView.as_view(), name='dashboard-enterprise-summary'),
+    path('dashboard/cache-stats/', DashboardCacheStatsView.as_view(), name='dashboard-cache-stats'),
+    path('internal/db-pool/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('internal/metrics/', MetricsView.as_view(), name='metrics'),
+    # Async variants for ASGI servers
+    path('async/dashboard/summary/', AsyncDashboardSummaryView.as_view(), name='async-dashboard-summary'),
+    path(
+        'async/dashboard/enterprise-summary/', AsyncDashboardEnterpriseSummaryView.as_view(),
+        name='async-dashboard-enterprise-summary',
+    ),
+    path('async/lots/analytics/', AsyncLotAnalyticsView.as_view(), name='async-lot-analytics'),
 ]
@@ -1,42 +1,112 @@
-from collections import defaultdict
-from datetime import timedelta
+import hashlib
+import os
 
-from django.db.models import Sum, F, Q
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
 from rest_framework import viewsets, permissions, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import PermissionDenied
 
+from apps.common import metrics
+from apps.common.db import pool as db_pool
+
 from .models import (
-    Enterprise, Farm, BreedingType, Species, Unit, Lot, LotDailyRecord, HealthEvent, ReproductionEvent, FinancialEntry, StockItem, StockMovement, Membership
+    Enterprise, Farm, BreedingType, Species, Unit, Lot, LotArchive, LotDailyRecord, HealthEvent, ReproductionEvent, FinancialEntry,
+    StockItem, StockMovement,
 )
 from .serializers import (
     EnterpriseSerializer, FarmSerializer, BreedingTypeSerializer, SpeciesSerializer, UnitSerializer, LotSerializer,
     LotDailyRecordSerializer, HealthEventSerializer, ReproductionEventSerializer, FinancialEntrySerializer, StockItemSerializer, StockMovementSerializer,
 )
-from .permissions import IsEnterpriseMember, get_enterprise_from_obj, user_role_in_enterprise
+from . import analytics, archive, bulk, dashboard_cache, exports, stock, timeseries
+from .pagination import EventPagination, KEYSET_ORDERING
+from .permissions import HasMetricsToken, IsEnterpriseMember, get_enterprise_id_from_obj, user_role_in_enterprise
+from .scoping import get_enterprise_scope
+
+
+OWNER_ENTERPRISE_PATHS = {
+    'farm': 'enterprise_id',
+    'unit': 'farm__enterprise_id',
+    'lot': 'unit__farm__enterprise_id',
+    'stock_item': 'farm__enterprise_id',
+}
+
+
+class ConditionalListMixin:
+    """Answers unchanged list requests with 304 before anything is serialized.
+
+    The ETag comes from COUNT and MAX(updated_at) over the filtered queryset plus
+    the query string, so a soft delete (which drops a row from the queryset)
+    changes it too. Lists carry no Last-Modified: it would miss deletions.
+    """
+
+    def _etag(self, request, *parts):
+        raw = ':'.join(str(part) for part in (request.user.pk, request.get_full_path(), *parts))
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def _conditional(self, request, etag, last_modified=None, call=None):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = call()
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def conditional_list_enabled(self, request):
+        # Keyset pages deliberately avoid COUNT(*) and are already cheap to serve
+        use_keyset = getattr(self.paginator, 'use_keyset', None)
+        return not (use_keyset and use_keyset(request))
+
+    def list(self, request, *args, **kwargs):
+        if not self.conditional_list_enabled(request):
+            return super().list(request, *args, **kwargs)
+        state = self.filter_queryset(self.get_queryset()).aggregate(count=Count('pk'), last=Max('updated_at'))
+        etag = self._etag(request, state['count'], state['last'])
+        return self._conditional(request, etag, call=lambda: super(ConditionalListMixin, self).list(request, *args, **kwargs))
+
+
+class ConditionalGetMixin(ConditionalListMixin):
+    """Adds ETag / Last-Modified from the object's ``updated_at`` to detail reads."""
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self._etag(request, instance.pk, instance.updated_at)
+        return self._conditional(
+            request, etag, instance.updated_at, call=lambda: Response(self.get_serializer(instance).data)
+        )
 
 
-class BaseMemberViewSet(viewsets.ModelViewSet):
+class BaseMemberViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsEnterpriseMember]
+    # Relations up to the row carrying enterprise_id, joined on detail routes
+    ownership_related = ()
+
+    @property
+    def enterprise_scope(self):
+        return get_enterprise_scope(self.request)
 
     def get_queryset(self):
         qs = super().get_queryset()
-        user = self.request.user
-        # Scope to enterprises where user is member or owner
-        member_ids = Membership.objects.filter(user=user, is_deleted=False).values_list('enterprise_id', flat=True)
-        owner_ids = Enterprise.objects.filter(owner=user).values_list('id', flat=True)
-        enterprise_ids = list(member_ids) + list(owner_ids)
-        qs = qs.filter(self.scope_filter(enterprise_ids))
-        return qs
+        if self.action == 'restore':
+            qs = qs.model.all_objects.filter(is_deleted=True)
+        if self.detail and self.ownership_related:
+            qs = qs.select_related(*self.ownership_related)
+        # Scope to enterprises where user is member or owner (compiled as a subquery)
+        return qs.filter(self.scope_filter(self.enterprise_scope.enterprise_ids))
 
     def scope_filter(self, enterprise_ids):
         return Q()
 
     def _ensure_write_role(self, enterprise):
-        role = user_role_in_enterprise(self.request.user, enterprise)
+        role = user_role_in_enterprise(self.request.user, enterprise, self.enterprise_scope)
         if role in ('owner', 'admin'):
             return
         raise PermissionDenied('Permission requise: owner ou admin')
@@ -48,41 +118,113 @@ class BaseMemberViewSet(viewsets.ModelViewSet):
         serializer.save()
 
     def perform_update(self, serializer):
-        enterprise = self._enterprise_from_serializer(serializer.validated_data) or get_enterprise_from_obj(self.get_object())
+        # The instance was fetched and permission-checked by get_object() already
+        enterprise = self._enterprise_from_serializer(serializer.validated_data) or get_enterprise_id_from_obj(serializer.instance)
         if enterprise:
             self._ensure_write_role(enterprise)
         serializer.save()
 
     def perform_destroy(self, instance):
-        enterprise = get_enterprise_from_obj(instance)
+        enterprise = get_enterprise_id_from_obj(instance)
         if enterprise:
             self._ensure_write_role(enterprise)
         instance.delete()
 
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        instance = self.get_object()
+        enterprise = get_enterprise_id_from_obj(instance)
+        if enterprise:
+            self._ensure_write_role(enterprise)
+        if self._has_deleted_parent(instance):
+            return Response(
+                {'detail': "L'élément parent est supprimé: restaurez-le d'abord."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        instance.restore()
+        return Response(self.get_serializer(instance).data)
+
+    def _has_deleted_parent(self, instance):
+        # Only parents whose soft delete cascades to this model can hold it back
+        model = type(instance)
+        paths = [
+            f'{field.name}__is_deleted' for field in model._meta.concrete_fields
+            if field.is_relation and field.remote_field.get_accessor_name()
+            in getattr(field.related_model, 'soft_delete_cascade', ())
+        ]
+        if not paths:
+            return False
+        row = model.all_objects.filter(pk=instance.pk).values_list(*paths).first()
+        return any(row or ())
+
     def _enterprise_from_serializer(self, validated_data):
         if 'enterprise' in validated_data:
             return validated_data.get('enterprise')
-        if 'farm' in validated_data:
-            return validated_data.get('farm').enterprise
-        if 'unit' in validated_data:
-            return validated_data.get('unit').farm.enterprise
-        if 'lot' in validated_data:
-            return validated_data.get('lot').unit.farm.enterprise
-        if 'stock_item' in validated_data:
-            return validated_data.get('stock_item').farm.enterprise
+        for field, path in OWNER_ENTERPRISE_PATHS.items():
+            obj = validated_data.get(field)
+            if obj is None:
+                continue
+            if path == 'enterprise_id':
+                return obj.enterprise_id
+            # One query for the whole chain instead of a lazy load per level
+            return type(obj).all_objects.filter(pk=obj.pk).values_list(path, flat=True).first()
         return None
 
 
+class ExportMixin:
+    """Adds a streaming ``export/`` action using the viewset's filters and scoping."""
+
+    def get_export_fields(self):
+        return self.get_serializer_class().Meta.fields
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in exports.FORMATS:
+            return Response({'detail': f"output doit être l'un de: {', '.join(exports.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('compress') == 'gzip'
+        queryset = self.filter_queryset(self.get_queryset())
+        return exports.export_response(queryset, self.get_export_fields(), self.basename, output, compress)
+
+
+class ArchiveFallbackMixin:
+    """Lists filtered on an archived lot also serve the rows kept in its LotArchive."""
+
+    archive_table = None
+
+    def list(self, request, *args, **kwargs):
+        lot_id = request.query_params.get('lot_id')
+        data = lot_id and LotArchive.objects.filter(
+            lot_id=lot_id, lot__is_deleted=False, lot__unit__farm__enterprise_id__in=self.enterprise_scope.enterprise_ids
+        ).values_list('data', flat=True).first()
+        if not data:
+            return super().list(request, *args, **kwargs)
+
+        rows = self.filter_archived(archive.decode(data, self.archive_table))
+        rows += self.filter_queryset(self.get_queryset())
+        rows.sort(key=lambda row: (row.date, row.created_at, row.id), reverse=True)
+        if self.paginator.use_keyset(request):
+            # A closed lot's history is bounded: a single page, no cursor
+            return Response({'next': None, 'previous': None, 'results': self.get_serializer(rows, many=True).data})
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def filter_archived(self, rows):
+        return rows
+
+
 class EnterpriseViewSet(BaseMemberViewSet):
     serializer_class = EnterpriseSerializer
     queryset = Enterprise.objects.filter(is_deleted=False)
 
-    def get_queryset(self):
+    def scope_filter(self, enterprise_ids):
+        if self.action == 'restore':
+            # A deleted enterprise has left the scope subquery: only its owner can bring it back
+            return Q(owner=self.request.user)
         # Allow owner-owned enterprises as well
-        qs = Enterprise.objects.filter(is_deleted=False).filter(
-            Q(owner=self.request.user) | Q(memberships__user=self.request.user, memberships__is_deleted=False)
-        ).distinct()
-        return qs
+        return Q(id__in=enterprise_ids)
+
+    def get_queryset(self):
+        return super().get_queryset().order_by('name')
 
 
 class FarmViewSet(BaseMemberViewSet):
@@ -100,13 +242,13 @@ class FarmViewSet(BaseMemberViewSet):
         return qs.order_by('name')
 
 
-class BreedingTypeViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+class BreedingTypeViewSet(ConditionalListMixin, mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = BreedingTypeSerializer
     queryset = BreedingType.objects.all().order_by('code')
     permission_classes = [permissions.IsAuthenticated]
 
 
-class SpeciesViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+class SpeciesViewSet(ConditionalListMixin, mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = SpeciesSerializer
     queryset = Species.objects.all().order_by('code')
     permission_classes = [permissions.IsAuthenticated]
@@ -122,6 +264,7 @@ class SpeciesViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.Ge
 class UnitViewSet(BaseMemberViewSet):
     serializer_class = UnitSerializer
     queryset = Unit.objects.filter(is_deleted=False)
+    ownership_related = ('farm',)
 
     def scope_filter(self, enterprise_ids):
         return Q(farm__enterprise_id__in=enterprise_ids)
@@ -140,6 +283,7 @@ class UnitViewSet(BaseMemberViewSet):
 class LotViewSet(BaseMemberViewSet):
     serializer_class = LotSerializer
     queryset = Lot.objects.filter(is_deleted=False)
+    ownership_related = ('unit__farm',)
 
     def scope_filter(self, enterprise_ids):
         return Q(unit__farm__enterprise_id__in=enterprise_ids)
@@ -148,25 +292,54 @@ class LotViewSet(BaseMemberViewSet):
         qs = super().get_queryset()
         unit_id = self.request.query_params.get('unit_id')
         farm_id = self.request.query_params.get('farm_id')
+        enterprise_id = self.request.query_params.get('enterprise_id')
         species = self.request.query_params.get('species')
         status_param = self.request.query_params.get('status')
         if unit_id:
             qs = qs.filter(unit_id=unit_id)
         if farm_id:
             qs = qs.filter(unit__farm_id=farm_id)
+        if enterprise_id:
+            qs = qs.filter(unit__farm__enterprise_id=enterprise_id)
         if species:
             qs = qs.filter(species__code=species)
         if status_param:
             qs = qs.filter(status=status_param)
-        return qs.order_by('-created_at')
+        # Archive summaries are serialized with the lot; the history blob is not needed
+        return qs.select_related('archive').defer('archive__data').order_by('-created_at')
+
+    analytics_scope_error = 'farm_id, enterprise_id ou unit_id requis'
+
+    def analytics_lots(self):
+        """Lots of an analytics request, or None when it names no farm, enterprise or unit."""
+        params = self.request.query_params
+        if not (params.get('farm_id') or params.get('enterprise_id') or params.get('unit_id')):
+            return None
+        return self.filter_queryset(self.get_queryset())
 
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        lots = self.analytics_lots()
+        if lots is None:
+            return Response({'detail': self.analytics_scope_error}, status=status.HTTP_400_BAD_REQUEST)
+        curves = request.query_params.get('curves') in ('1', 'true')
+        return Response({'lots': analytics.lot_analytics(lots, curves=curves)})
 
-class LotDailyRecordViewSet(BaseMemberViewSet):
+    @action(detail=True, methods=['get'])
+    def timeseries(self, request, pk=None):
+        lot = self.get_object()
+        return Response(timeseries.lot_series(lot.pk, request.query_params))
+
+
+class LotDailyRecordViewSet(ArchiveFallbackMixin, ExportMixin, BaseMemberViewSet):
     serializer_class = LotDailyRecordSerializer
     queryset = LotDailyRecord.objects.filter(is_deleted=False)
+    pagination_class = EventPagination
+    archive_table = 'daily_records'
+    bulk_max_rows = 10000
 
     def scope_filter(self, enterprise_ids):
-        return Q(lot__unit__farm__enterprise_id__in=enterprise_ids)
+        return Q(enterprise_id__in=enterprise_ids)
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -179,42 +352,70 @@ class LotDailyRecordViewSet(BaseMemberViewSet):
             qs = qs.filter(date__gte=date_from)
         if date_to:
             qs = qs.filter(date__lte=date_to)
-        return qs.order_by('-date')
-
-
-class HealthEventViewSet(BaseMemberViewSet):
+        return qs.order_by(*KEYSET_ORDERING)
+
+    def filter_archived(self, rows):
+        date_from = parse_date(self.request.query_params.get('date_from') or '')
+        date_to = parse_date(self.request.query_params.get('date_to') or '')
+        return [
+            row for row in rows
+            if (date_from is None or row.date >= date_from) and (date_to is None or row.date <= date_to)
+        ]
+
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    def bulk_upsert(self, request):
+        rows = request.data.get('records') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({'detail': 'Liste d\'enregistrements requise'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.bulk_max_rows:
+            return Response(
+                {'detail': f'Maximum {self.bulk_max_rows} enregistrements par requête'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        report = bulk.upsert_daily_records(rows, self.enterprise_scope)
+        written = report['created'] + report['updated']
+        return Response(report, status=status.HTTP_200_OK if written or not report['errors'] else status.HTTP_400_BAD_REQUEST)
+
+
+class HealthEventViewSet(ArchiveFallbackMixin, BaseMemberViewSet):
     serializer_class = HealthEventSerializer
     queryset = HealthEvent.objects.filter(is_deleted=False)
+    pagination_class = EventPagination
+    archive_table = 'health_events'
 
     def scope_filter(self, enterprise_ids):
-        return Q(lot__unit__farm__enterprise_id__in=enterprise_ids)
+        return Q(enterprise_id__in=enterprise_ids)
 
     def get_queryset(self):
         qs = super().get_queryset()
         lot_id = self.request.query_params.get('lot_id')
         if lot_id:
             qs = qs.filter(lot_id=lot_id)
-        return qs.order_by('-date')
+        return qs.order_by(*KEYSET_ORDERING)
 
 
-class ReproductionEventViewSet(BaseMemberViewSet):
+class ReproductionEventViewSet(ArchiveFallbackMixin, BaseMemberViewSet):
     serializer_class = ReproductionEventSerializer
     queryset = ReproductionEvent.objects.filter(is_deleted=False)
+    pagination_class = EventPagination
+    archive_table = 'reproduction_events'
 
     def scope_filter(self, enterprise_ids):
-        return Q(lot__unit__farm__enterprise_id__in=enterprise_ids)
+        return Q(enterprise_id__in=enterprise_ids)
 
     def get_queryset(self):
         qs = super().get_queryset()
         lot_id = self.request.query_params.get('lot_id')
         if lot_id:
             qs = qs.filter(lot_id=lot_id)
-        return qs.order_by('-date', '-created_at')
+        return qs.order_by(*KEYSET_ORDERING)
 
 
-class FinancialEntryViewSet(BaseMemberViewSet):
+class FinancialEntryViewSet(ExportMixin, BaseMemberViewSet):
     serializer_class = FinancialEntrySerializer
     queryset = FinancialEntry.objects.filter(is_deleted=False)
+    ownership_related = ('farm',)
+    pagination_class = EventPagination
 
     def scope_filter(self, enterprise_ids):
         return Q(farm__enterprise_id__in=enterprise_ids)
@@ -227,12 +428,13 @@ class FinancialEntryViewSet(BaseMemberViewSet):
             qs = qs.filter(farm_id=farm_id)
         if lot_id:
             qs = qs.filter(lot_id=lot_id)
-        return qs.order_by('-date', '-created_at')
+        return qs.order_by(*KEYSET_ORDERING)
 
 
 class StockItemViewSet(BaseMemberViewSet):
     serializer_class = StockItemSerializer
     queryset = StockItem.objects.filter(is_deleted=False)
+    ownership_related = ('farm',)
 
     def scope_filter(self, enterprise_ids):
         return Q(farm__enterprise_id__in=enterprise_ids)
@@ -244,13 +446,33 @@ class StockItemViewSet(BaseMemberViewSet):
             qs = qs.filter(farm_id=farm_id)
         return qs.order_by('name')
 
-
-class StockMovementViewSet(BaseMemberViewSet):
+    @action(detail=True, methods=['get'], url_path='as-of', url_name='as-of')
+    def as_of(self, request, pk=None):
+        try:
+            day = parse_date(request.query_params.get('date', ''))
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({'detail': 'date requise (AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+        item = self.get_object()
+        quantity, checkpoint_date = stock.quantity_as_of(item, day)
+        return Response({
+            'stock_item': str(item.id),
+            'date': day,
+            'quantity': str(quantity),
+            'unit': item.unit,
+            'checkpoint_date': checkpoint_date,
+        })
+
+
+class StockMovementViewSet(ExportMixin, BaseMemberViewSet):
     serializer_class = StockMovementSerializer
     queryset = StockMovement.objects.filter(is_deleted=False)
+    pagination_class = EventPagination
+    bulk_max_rows = 5000
 
     def scope_filter(self, enterprise_ids):
-        return Q(stock_item__farm__enterprise_id__in=enterprise_ids)
+        return Q(enterprise_id__in=enterprise_ids)
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -259,8 +481,50 @@ class StockMovementViewSet(BaseMemberViewSet):
         if stock_item_id:
             qs = qs.filter(stock_item_id=stock_item_id)
         if farm_id:
-            qs = qs.filter(stock_item__farm_id=farm_id)
-        return qs.order_by('-date', '-created_at')
+            qs = qs.filter(farm_id=farm_id)
+        return qs.order_by(*KEYSET_ORDERING)
+
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    def bulk_apply(self, request):
+        rows = request.data.get('movements') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({'detail': 'Liste de mouvements requise'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.bulk_max_rows:
+            return Response(
+                {'detail': f'Maximum {self.bulk_max_rows} mouvements par requête'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        report = stock.apply_movements(rows, self.enterprise_scope)
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if report['errors'] else status.HTTP_201_CREATED)
+
+
+def accessible_farm(farm_id, enterprise_ids):
+    return Farm.objects.filter(id=farm_id, is_deleted=False, enterprise_id__in=enterprise_ids)
+
+
+def enterprise_farms(enterprise_id, enterprise_ids):
+    return (
+        Farm.objects.filter(enterprise_id=enterprise_id, is_deleted=False, enterprise_id__in=enterprise_ids)
+        .order_by('name')
+        .values_list('id', 'name')
+    )
+
+
+def visible_enterprise(enterprise_id, enterprise_ids):
+    return Enterprise.objects.filter(id=enterprise_id, is_deleted=False, id__in=enterprise_ids)
+
+
+def enterprise_payload(enterprise_id, farms, data):
+    return {
+        'enterprise_id': enterprise_id,
+        'farms': [{'farm_id': str(farm_id), 'farm_name': name, **data['farms'][farm_id]} for farm_id, name in farms],
+        'totals': data['totals'],
+    }
+
+
+def etag_matches(request, etag):
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in if_none_match or '*' in if_none_match
 
 
 class DashboardSummaryView(APIView):
@@ -272,93 +536,70 @@ class DashboardSummaryView(APIView):
             return Response({'detail': 'farm_id requis'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Ensure user has access
-        has_access = Farm.objects.filter(
-            Q(enterprise__owner=request.user) |
-            Q(enterprise__memberships__user=request.user, enterprise__memberships__is_deleted=False),
-            id=farm_id,
-            is_deleted=False,
-        ).exists()
-        if not has_access:
+        if not accessible_farm(farm_id, get_enterprise_scope(request).enterprise_ids).exists():
             return Response({'detail': 'Accès refusé'}, status=status.HTTP_403_FORBIDDEN)
 
-        now = timezone.now().date()
-        last_7 = now - timedelta(days=7)
-        last_30 = now - timedelta(days=30)
-
-        lots_qs = Lot.objects.filter(unit__farm_id=farm_id, is_deleted=False)
-        records_qs = LotDailyRecord.objects.filter(
-            lot__unit__farm_id=farm_id, is_deleted=False, date__gte=last_7
-        ).select_related('lot')
-        stock_qs = StockItem.objects.filter(farm_id=farm_id, is_deleted=False)
-        entries_qs = FinancialEntry.objects.filter(
-            farm_id=farm_id, is_deleted=False, date__gte=last_30
-        ).select_related('lot')
-
-        total_lots = lots_qs.count()
-        active_lots = lots_qs.filter(status='active').count()
-        start_population = lots_qs.aggregate(total=Sum('initial_count'))['total'] or 0
-
-        mortality = records_qs.aggregate(total=Sum('mortality'))['total'] or 0
-        feed_intake = records_qs.aggregate(total=Sum('feed_intake_kg'))['total'] or 0
-        milk = records_qs.aggregate(total=Sum('milk_production_l'))['total'] or 0
-        eggs = records_qs.aggregate(total=Sum('eggs_count'))['total'] or 0
-
-        mortality_rate_percent = round((mortality / start_population) * 100, 2) if start_population else 0.0
-        hen_days = start_population * 7
-        eggs_per_hen_per_day = round(eggs / hen_days, 3) if hen_days else 0.0
-
-        records_by_lot = defaultdict(list)
-        for rec in records_qs.order_by('lot_id', 'date'):
-            records_by_lot[rec.lot_id].append(rec)
-
-        total_weight_gain = 0.0
-        avg_daily_gain_sum = 0.0
-        gain_lot_count = 0
-        for lot_records in records_by_lot.values():
-            if len(lot_records) < 2:
-                continue
-            first = lot_records[0]
-            last = lot_records[-1]
-            days = max((last.date - first.date).days, 1)
-            gain_per_animal = float(last.avg_weight_kg - first.avg_weight_kg)
-            avg_daily_gain_sum += gain_per_animal / days
-            gain_lot_count += 1
-            headcount = first.lot.initial_count
-            if gain_per_animal > 0 and headcount:
-                total_weight_gain += gain_per_animal * headcount
-
-        avg_daily_gain = round(avg_daily_gain_sum / gain_lot_count, 3) if gain_lot_count else 0.0
-        feed_conversion_ratio = round(float(feed_intake) / total_weight_gain, 3) if total_weight_gain > 0 else None
-
-        farm_margin_30d = 0.0
-        lot_margin_map = defaultdict(lambda: {'lot_id': '', 'lot_code': '', 'margin': 0.0})
-        for entry in entries_qs:
-            signed_amount = float(entry.amount) if entry.entry_type == 'revenue' else -float(entry.amount)
-            farm_margin_30d += signed_amount
-            if entry.lot_id:
-                lot_data = lot_margin_map[entry.lot_id]
-                lot_data['lot_id'] = str(entry.lot_id)
-                lot_data['lot_code'] = entry.lot.code if entry.lot else ''
-                lot_data['margin'] += signed_amount
-        lot_margins_30d = list(lot_margin_map.values())
-
-        stock_alerts = list(
-            stock_qs.filter(quantity__lt=F('alert_threshold')).values('id', 'name', 'quantity', 'unit', 'alert_threshold')
+        today = timezone.now().date()
+        version = dashboard_cache.farm_version(farm_id)
+        etag = dashboard_cache.summary_etag(farm_id, today, version)
+        return _cached_dashboard_response(
+            request, etag, lambda: dashboard_cache.farm_summary(farm_id, today=today, version=version)
         )
 
-        data = {
-            'total_lots': total_lots,
-            'active_lots': active_lots,
-            'mortality_7d': mortality,
-            'mortality_rate_percent_7d': mortality_rate_percent,
-            'feed_intake_kg_7d': float(feed_intake),
-            'milk_production_l_7d': float(milk),
-            'eggs_count_7d': eggs,
-            'eggs_per_hen_per_day': eggs_per_hen_per_day,
-            'avg_daily_gain_kg': avg_daily_gain,
-            'feed_conversion_ratio': feed_conversion_ratio,
-            'farm_margin_30d': round(farm_margin_30d, 2),
-            'lot_margins_30d': lot_margins_30d,
-            'stock_alerts': stock_alerts,
-        }
-        return Response(data)
+
+class DashboardEnterpriseSummaryView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        enterprise_id = request.query_params.get('enterprise_id')
+        if not enterprise_id:
+            return Response({'detail': 'enterprise_id requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+        enterprise_ids = get_enterprise_scope(request).enterprise_ids
+        farms = list(enterprise_farms(enterprise_id, enterprise_ids))
+        # Without farms, tell an empty enterprise apart from one the user cannot see
+        if not farms and not visible_enterprise(enterprise_id, enterprise_ids).exists():
+            return Response({'detail': 'Accès refusé'}, status=status.HTTP_403_FORBIDDEN)
+
+        today = timezone.now().date()
+        versions = dashboard_cache.farm_versions([farm_id for farm_id, _ in farms])
+        etag = dashboard_cache.enterprise_etag(enterprise_id, today, versions)
+        return _cached_dashboard_response(
+            request, etag,
+            lambda: enterprise_payload(enterprise_id, farms, dashboard_cache.enterprise_summary(enterprise_id, today, versions)),
+        )
+
+
+def _cached_dashboard_response(request, etag, payload):
+    if etag_matches(request, etag):
+        dashboard_cache.record_hit()
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(payload())
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class DashboardCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(dashboard_cache.stats())
+
+
+class DatabasePoolStatsView(APIView):
+    """Connection pool statistics of the process serving the request."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pools': db_pool.stats()})
+
+
+class MetricsView(APIView):
+    """Per-route request histograms and pool gauges in the Prometheus text format."""
+    authentication_classes = []
+    permission_classes = [HasMetricsToken]
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,92 @@
+"""JWT authentication resolving users from a shared cache.
+
+``JWTAuthentication`` validates the token without the database but then loads
+the user row on every request. ``CachedJWTAuthentication`` keeps the row's
+field values in the ``auth`` cache for ``AUTH_USER_CACHE_TTL`` seconds and
+builds a fresh ``User`` from them, so a warm request authenticates without any
+query and requests never share a user instance.
+
+Every entry is stamped with the user's version, also kept in the ``auth``
+cache. Saving or deleting a user bumps it (``apps.users.signals``), which
+disowns the entry in every process sharing the cache; inactive users are
+never cached. With the default in-process backend other workers only see a
+change when the entry expires, and so do changes made with
+``QuerySet.update()``, whatever the backend.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+CACHE_ALIAS = 'auth'
+
+
+class UserCache:
+    def _cache(self):
+        return caches[CACHE_ALIAS]
+
+    def _keys(self, user_id):
+        return f'auth:user:{user_id}', f'auth:user-version:{user_id}'
+
+    def version(self, user_id):
+        return self._cache().get(self._keys(user_id)[1], 0)
+
+    def get(self, user_id):
+        entry_key, version_key = self._keys(user_id)
+        found = self._cache().get_many([entry_key, version_key])
+        entry = found.get(entry_key)
+        # A row read before the last invalidation is stamped with an older version
+        if entry is None or entry[0] != found.get(version_key, 0):
+            return None
+        return entry[1]
+
+    def set(self, user_id, values, version):
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+        self._cache().set(self._keys(user_id)[0], (version, values), timeout=timeout)
+
+    def invalidate(self, user_id):
+        cache = self._cache()
+        entry_key, version_key = self._keys(user_id)
+        if not cache.add(version_key, 1, timeout=None):
+            cache.incr(version_key)
+        cache.delete(entry_key)
+
+    def clear(self):
+        self._cache().clear()
+
+
+user_cache = UserCache()
+
+
+def _cache_key(user_id):
+    # Token claims carry the id as a string, signals the model's value
+    return str(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            key = _cache_key(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        attnames = [field.attname for field in self.user_model._meta.concrete_fields]
+        values = user_cache.get(key)
+        if values is None:
+            version = user_cache.version(key)
+            user = super().get_user(validated_token)
+            user_cache.set(key, tuple(getattr(user, attname) for attname in attnames), version)
+            return user
+
+        user = self.user_model.from_db(self.user_model.objects.db, attnames, values)
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+def invalidate_user(user_id):
+    user_cache.invalidate(_cache_key(user_id))
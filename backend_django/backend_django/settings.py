@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total covers the other middleware
+    'apps.common.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -71,8 +73,25 @@ if DB_ENGINE == 'postgres':
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
             'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
             'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Seconds a connection is kept between requests (0 = one connection per request)
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+            'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
         }
     }
+    # Production mode: connections are borrowed from a per-process pool and handed back after each request
+    if os.getenv('DB_POOL', 'false').lower() == 'true':
+        DATABASES['default'].update({
+            'ENGINE': 'apps.common.db.postgresql_pool',
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'size': int(os.getenv('DB_POOL_SIZE', '10')),
+                'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', '5')),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                'recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+                'health_check': os.getenv('DB_POOL_HEALTH_CHECK', 'true').lower() == 'true',
+                'ping_after': float(os.getenv('DB_POOL_PING_AFTER', '30')),
+            },
+        })
 else:
     DATABASES = {
         'default': {
@@ -81,18 +100,53 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Dashboard payloads; point it at Redis/Memcached to share entries between workers
+    'dashboard': {
+        'BACKEND': os.getenv('DASHBOARD_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DASHBOARD_CACHE_LOCATION', 'dashboard'),
+        'TIMEOUT': int(os.getenv('DASHBOARD_CACHE_TIMEOUT', '300')),
+    },
+}
+# Seconds before a farm's dashboard version token is renewed (0 = never). With a per-process cache,
+# other workers only see an invalidation once their token expires.
+DASHBOARD_CACHE_VERSION_TTL = int(os.getenv('DASHBOARD_CACHE_VERSION_TTL', '60'))
+
+# Threads running independent dashboard/analytics queries concurrently (each holds its own DB connection).
+# Off on SQLite, which serializes them anyway.
+QUERY_FANOUT_WORKERS = int(os.getenv('QUERY_FANOUT_WORKERS', '4' if DB_ENGINE == 'postgres' else '0'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.common.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Users resolved from JWTs are cached in the 'auth' cache: seconds before the row is read again, and max
+# entries of the in-process default. Point AUTH_CACHE_BACKEND/AUTH_CACHE_LOCATION at Redis/Memcached so a
+# deactivation or password change reaches every worker at once; otherwise other workers see it after the TTL.
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+CACHES['auth'] = {
+    'BACKEND': os.getenv('AUTH_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': os.getenv('AUTH_CACHE_LOCATION', 'auth'),
+}
+if CACHES['auth']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    CACHES['auth']['OPTIONS'] = {'MAX_ENTRIES': AUTH_USER_CACHE_SIZE}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -121,3 +175,23 @@ CORS_ALLOW_ALL_ORIGINS = os.getenv('CORS_ALLOW_ALL', 'true').lower() == 'true'
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '').split(',') if not CORS_ALLOW_ALL_ORIGINS else []
 
 AUTH_USER_MODEL = 'users.User'
+
+# Per-request SQL/timing instrumentation (Server-Timing header, /api/internal/metrics/)
+REQUEST_INSTRUMENTATION = os.getenv('REQUEST_INSTRUMENTATION', 'true').lower() == 'true'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+# Same SQL statement run this many times in one request is logged as an N+1 pattern
+DUPLICATE_QUERY_THRESHOLD = int(os.getenv('DUPLICATE_QUERY_THRESHOLD', '10'))
+# Bearer token expected by the Prometheus scrape endpoint (endpoint closed when empty)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'apps': {'handlers': ['console'], 'level': os.getenv('APPS_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Refuse stock movements that would take an item below zero
+STOCK_ALLOW_NEGATIVE = os.getenv('STOCK_ALLOW_NEGATIVE', 'true').lower() == 'true'